@@ -148,6 +148,8 @@ public class ExampleServer
    *    - handlers for each supported packet
    *    - handler for exceptions
    *    - run in an infinite loop with default thread pool (10) and listen on default port
+   *
+   * Option --framed keeps client connections open for length-prefixed requests.
    */
   public static void main(String argv[])
   throws Exception
@@ -159,6 +161,7 @@ public class ExampleServer
         .onReceive(CalcSum.class, pk -> calculateSum((CalcSum) pk))
         .onReceive(CalcMean.class, pk -> calculateMean((CalcMean) pk))
         .onError(ExampleServer::errorHandler)
+        .setFramed(argv.length > 0 && "--framed".equals(argv[0]))
         .run();
   }
 }
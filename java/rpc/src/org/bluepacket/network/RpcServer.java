@@ -35,6 +35,7 @@ public class RpcServer
   protected List<RpcServerThread> threadPool_;
   protected Map<Class<? extends BluePacket>, UnaryOperator<BluePacket>> dispatchHandler_ = new HashMap<>();
   protected Function<Exception, BluePacket> errorHandler_ = null;
+  protected boolean framed_ = false;
 
   protected final BluePacketRegistry registry_;
 
@@ -204,6 +205,27 @@ public class RpcServer
     return this;
   }
 
+  /**
+   * Use length-prefixed frames instead of one request per connection
+   *
+   * Each frame is a 4-byte payload length, a 1-byte flags field, then the payload.
+   * A connection then carries many request/response pairs until the client closes it.
+   *
+   * @param framed true to keep connections open and read framed requests
+   * @return this (builder pattern)
+   */
+  public RpcServer setFramed(boolean framed) {
+    framed_ = framed;
+    return this;
+  }
+
+  /**
+   * @return true if connections carry length-prefixed frames
+   */
+  public boolean isFramed() {
+    return framed_;
+  }
+
   /**
    * Declaration of the function that will handle one packet class
    *
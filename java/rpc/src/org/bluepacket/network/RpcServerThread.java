@@ -13,6 +13,9 @@ import org.bluepacket.BluePacket;
 public class RpcServerThread
 extends Thread
 {
+  /** Frame flag of a handshake, answered with an empty feature list */
+  private static final int FLAG_HELLO = 0x04;
+
   private final RpcServer server_;
 
   /**
@@ -32,12 +35,8 @@ extends Thread
    *
    * If job is null (termination signal), do nothing and exit the infinite loop.
    *
-   * If job is a socket, execute the request:
-   * - deserialize the incoming packet
-   * - execute the associated function to get a result
-   * - if there's an exception:
-   *   - execute the exception handler and use that as a result
-   * - serialize the result and send it back as response
+   * If job is a socket, execute the request (or every framed request
+   * until the client closes the connection in framed mode), then close it.
    */
   public void run()
   {
@@ -49,33 +48,118 @@ extends Thread
         return;
       }
 
-      BluePacket response = null;
-      try {
-        BluePacket request = server_.deserialize(s.getInputStream());
-        response = server_.execute(request);
-        if (response != null) {
-          response.serialize(s.getOutputStream());
+      if (server_.isFramed()) {
+        runFramed(s);
+      }
+      else {
+        runOneShot(s);
+      }
+
+      if (!s.isClosed()) {
+        try {
+          s.close();
         }
+        catch(Throwable t) {}
+      }
+    }
+  }
+
+  /**
+   * Execute one request, the response is delimited by closing the connection
+   *
+   * - deserialize the incoming packet
+   * - execute the associated function to get a result
+   * - if there's an exception:
+   *   - execute the exception handler and use that as a result
+   * - serialize the result and send it back as response
+   *
+   * @param s the client connection
+   */
+  private void runOneShot(Socket s)
+  {
+    BluePacket response = null;
+    try {
+      BluePacket request = server_.deserialize(s.getInputStream());
+      response = server_.execute(request);
+      if (response != null) {
+        response.serialize(s.getOutputStream());
+      }
+    }
+    catch (Exception ex) {
+      response = server_.executeError(ex);
+    }
+
+    if (response != null) {
+      try {
+        response.serialize(s.getOutputStream());
       }
       catch (Exception ex) {
-        response = server_.executeError(ex);
+        ex.printStackTrace();
       }
+    }
+  }
 
-      if (response != null) {
+  /**
+   * Execute framed requests until the client closes the connection
+   *
+   * Each request and response is a 4-byte payload length, a 1-byte flags
+   * field, then the serialized packet. An empty response payload means the
+   * handler returned no packet.
+   *
+   * Only plain frames (flags 0) are executed. A handshake is answered with
+   * no features, so the client falls back to plain frames; any other flag
+   * (request id, batch, compression, one-way, stream...) is not implemented
+   * here and closes the connection rather than sending a response the
+   * client would misread.
+   *
+   * @param s the client connection
+   */
+  private void runFramed(Socket s)
+  {
+    try {
+      DataInputStream in = new DataInputStream(new BufferedInputStream(s.getInputStream()));
+      DataOutputStream out = new DataOutputStream(new BufferedOutputStream(s.getOutputStream()));
+      while (true) {
+        int length;
         try {
-          response.serialize(s.getOutputStream());
+          length = in.readInt();
         }
-        catch (Exception ex) {
-          ex.printStackTrace();
+        catch (EOFException eof) {
+          return;
         }
-      }
+        int flags = in.readUnsignedByte();
+        byte[] payload = new byte[length];
+        in.readFully(payload);
 
-      if (!s.isClosed()) {
+        if (flags == FLAG_HELLO) {
+          out.writeInt(0);
+          out.writeByte(FLAG_HELLO);
+          out.flush();
+          continue;
+        }
+        if (flags != 0) {
+          System.err.println("[RpcServer] closing connection: unsupported frame flags " + flags);
+          return;
+        }
+
+        BluePacket response;
         try {
-          s.close();
+          BluePacket request = server_.deserialize(new ByteArrayInputStream(payload));
+          response = server_.execute(request);
         }
-        catch(Throwable t) {}
+        catch (Exception ex) {
+          response = server_.executeError(ex);
+        }
+
+        byte[] data = (response == null) ? new byte[0] : response.serialize();
+        out.writeInt(data.length);
+        out.writeByte(0);
+        out.write(data);
+        out.flush();
       }
     }
+    catch (IOException ioe) {
+      ioe.printStackTrace();
+    }
   }
 }
@@ -1,7 +1,9 @@
 from collections import deque
-from math import floor, log10
+from math import floor, isfinite, log10
+import enum
 import inspect
 import struct
+import sys
 
 _MAX_UNSIGNED_BYTE = 255
 
@@ -98,9 +100,27 @@ def toQuotedString(x):
   return f'"{x}"' if x else ""
 
 
+def roundFloat(x):
+  """Round a single-precision value to the 7 significant digits it holds, e.g. 3.14 rather than 3.140000104904175."""
+  if x == 0 or not isfinite(x):
+    return x
+  return round(x, 6 - int(floor(log10(abs(x)))))
+
+
+def resolveFieldType(packet_class, ftype):
+  """Find the class of an inner or outer enum or packet used by a field."""
+  found = getattr(packet_class, ftype, None)
+  if found is None:
+    found = getattr(sys.modules[packet_class.__module__], ftype, None)
+  if found is None:
+    raise Exception(f"Unknown field type {ftype} in {packet_class.__name__}")
+  return found
+
+
 class BluePacket:
-  def serialize(self):
-    bpw = _BluePacketWriter()
+  def serialize(self, types=None):
+    """Serialize the packet, with the compact type ids of a PacketTypes if given."""
+    bpw = _BluePacketWriter() if types is None else _TypeIdWriter(types)
     bpw.serialize(self)
     return bytes(bpw)
 
@@ -113,21 +133,73 @@ class BluePacketRegistry:
 
   def __init__(self, ):
         self._packet_id_to_class = {}
+        # BluePacketAPI.VERSION -> sorted packet hashes of its module
+        self._api_hashes = {}
+        # tuple of API versions -> PacketTypes
+        self._packet_types = {}
         
   def register(self, module):
+    hashes = []
     for name, cl in inspect.getmembers(module):
       if not name.startswith("__"):
         h = getattr(cl, "packetHash", None)
         if h is not None:
           self._packet_id_to_class[h] = cl
+          hashes.append(h)
+    api = getattr(module, "BluePacketAPI", None)
+    if api is not None:
+      self._api_hashes[api.VERSION] = sorted(hashes)
+
+  @property
+  def apiVersions(self):
+    """BluePacketAPI.VERSION of the registered modules."""
+    return list(self._api_hashes)
+
+  def packetTypes(self, api_versions=None):
+    """Compact type ids of the packets of these APIs, all the registered ones by default.
+
+    Returns None if one of the versions isn't registered. The same versions
+    always give the same ids, and the same PacketTypes object.
+    """
+    api_versions = tuple(self._api_hashes if api_versions is None else api_versions)
+    if not api_versions or any(v not in self._api_hashes for v in api_versions):
+      return None
+    types = self._packet_types.get(api_versions)
+    if types is None:
+      hashes = [h for v in api_versions for h in self._api_hashes[v]]
+      types = self._packet_types[api_versions] = PacketTypes(api_versions, hashes)
+    return types
+
+  def packetClass(self, packetHash):
+    return self._packet_id_to_class.get(packetHash)
+
+  def deserialize(self, buffer, types=None):
+    """Deserialize a packet, serialized with the compact type ids of a PacketTypes if given."""
+    bpr = _BluePacketReader(buffer) if types is None else _TypeIdReader(buffer, types)
+    return self.deserialize_internal(bpr)
+
+  def deserializePartial(self, buffer):
+    """Deserialize a packet from the start of a buffer that may not hold all of it yet.
 
-  def deserialize(self, buffer):
+    Returns:
+        (packet, number of bytes used), or, if more bytes are needed, the
+        size the buffer needs at least before it's worth trying again
+    """
     bpr = _BluePacketReader(buffer)
-    return self.deserialize_internal(bpr)
+    try:
+      packet = self.deserialize_internal(bpr)
+    except (struct.error, IndexError, UnicodeDecodeError):
+      if bpr.offset < len(buffer):
+        raise
+      # the reads advance the offset first: the one that failed ends there
+      return max(bpr.offset, len(buffer) + 1)
+    if bpr.offset > len(buffer):
+      return bpr.offset
+    return packet, bpr.offset
 
   def deserialize_internal(self, bpr):
     # Header
-    packetHash = bpr.readLong()
+    packetHash = bpr.readPacketHash()
     if packetHash == 0:
       return None
     if packetHash not in self._packet_id_to_class:
@@ -147,9 +219,12 @@ class BluePacketRegistry:
 class _BluePacketWriter(bytearray):
 
   def serialize(self, packet):
-    self.writeLong(packet.packetHash)
+    self.writePacketHash(packet.packetHash)
     packet.serializeData(self)
 
+  def writePacketHash(self, packetHash):
+    self.writeLong(packetHash)
+
   def writeByte(self, field):
     self.extend(struct.pack('!b', field))
 
@@ -176,9 +251,9 @@ class _BluePacketWriter(bytearray):
 
   def _writeSeqLength(self, length):
     if (length < _MAX_UNSIGNED_BYTE):
-      self.writeByte(length)
+      self.writeUnsignedByte(length)
     else:
-      self.writeByte(_MAX_UNSIGNED_BYTE)
+      self.writeUnsignedByte(_MAX_UNSIGNED_BYTE)
       self.writeInt(length)
 
   def writeString(self, field):
@@ -191,7 +266,7 @@ class _BluePacketWriter(bytearray):
 
   def writeBluePacket(self, field):
     if field is None:
-        self.writeLong(0)
+        self.writePacketHash(0)
     else:
         self.serialize(field)
 
@@ -221,7 +296,7 @@ class _BluePacketWriter(bytearray):
 
   def writeArrayLargeEnum(self, field):
     if field is None:
-        self.writeShort(0)
+        self.writeByte(0)
     else:
         self._writeSeqLength(len(field))
         for b in field:
@@ -264,9 +339,7 @@ class _BluePacketReader(deque):
     return self._readStruct('!d', 8)
 
   def readFloat(self):
-    value = self._readStruct('!f', 4)
-    sig = 6 - int(floor(log10(abs(value))))
-    return round(value, sig)
+    return roundFloat(self._readStruct('!f', 4))
 
   def readInt(self):
     return self._readStruct('!i', 4)
@@ -274,16 +347,35 @@ class _BluePacketReader(deque):
   def readLong(self):
     return self._readStruct('!q', 8)
 
+  def readPacketHash(self):
+    return self.readLong()
+
   def readShort(self):
     return self._readStruct('!h', 2)
 
   def readUnsignedShort(self):
     return self._readStruct('!H', 2)
 
-  def readListBool(self):
+  def _readSeqLength(self):
     l = self.readUnsignedByte()
     if l == _MAX_UNSIGNED_BYTE:
-      l = self.readLong()
+      l = self.readInt()
+    return l
+
+  def readArrayEnum(self, members):
+    l = self._readSeqLength()
+    i = self.offset
+    self.offset += l
+    return [members[x] for x in self.buffer[i:self.offset]]
+
+  def readArrayLargeEnum(self, members):
+    l = self._readSeqLength()
+    i = self.offset
+    self.offset += 2 * l
+    return [members[x] for x in struct.unpack_from(f'!{l}H', self.buffer, i)]
+
+  def readListBool(self):
+    l = self._readSeqLength()
     ret = []
     for i in range(l):
       if i % 8 == 0:
@@ -293,9 +385,378 @@ class _BluePacketReader(deque):
     return ret
 
   def readString(self):
-    l = self.readUnsignedByte()
-    if l == _MAX_UNSIGNED_BYTE:
-      l = self.readLong()
+    l = self._readSeqLength()
     i = self.offset
     self.offset += l
-    return self.buffer[i:self.offset].decode('utf-8')
+    return str(self.buffer[i:self.offset], 'utf-8')
+
+
+_NATIVE_CODEC = {
+  "byte":   ("writeByte", "readByte"),
+  "double": ("writeDouble", "readDouble"),
+  "float":  ("writeFloat", "readFloat"),
+  "int":    ("writeInt", "readInt"),
+  "long":   ("writeLong", "readLong"),
+  "short":  ("writeShort", "readShort"),
+  "string": ("writeString", "readString"),
+  "ubyte":  ("writeUnsignedByte", "readUnsignedByte"),
+  "ushort": ("writeUnsignedShort", "readUnsignedShort"),
+}
+
+
+class _FieldCodec:
+  """Writes and reads a single field of a packet, with the same encoding as serializeData.
+
+  by_bytes is set for fields holding packets, which have no __eq__ and are
+  compared on their serialized bytes.
+  """
+
+  def __init__(self, packet_class, name, ftype, is_list):
+    self.name = name
+    self.by_bytes = False
+    if ftype == "bool":
+      if is_list:
+        self.write = lambda bpw, v: bpw.writeListBool(v)
+        self.read = lambda registry, bpr: bpr.readListBool()
+      else:
+        self.write = lambda bpw, v: bpw.writeUnsignedByte(1 if v else 0)
+        self.read = lambda registry, bpr: bpr.readUnsignedByte() != 0
+    elif ftype in _NATIVE_CODEC:
+      writer, reader = _NATIVE_CODEC[ftype]
+      if is_list:
+        self.write = lambda bpw, v: bpw.writeArrayNative(v, getattr(bpw, writer))
+        self.read = lambda registry, bpr: [getattr(bpr, reader)() for _ in range(bpr._readSeqLength())]
+      else:
+        self.write = lambda bpw, v: getattr(bpw, writer)(v)
+        self.read = lambda registry, bpr: getattr(bpr, reader)()
+    elif ftype == "packet":
+      self.by_bytes = True
+      if is_list:
+        self.write = lambda bpw, v: bpw.writeArrayNative(v, bpw.writeBluePacket)
+        self.read = lambda registry, bpr: [registry.deserialize_internal(bpr) for _ in range(bpr._readSeqLength())]
+      else:
+        self.write = lambda bpw, v: bpw.writeBluePacket(v)
+        self.read = lambda registry, bpr: registry.deserialize_internal(bpr)
+    else:
+      cl = resolveFieldType(packet_class, ftype)
+      if issubclass(cl, enum.Enum):
+        self._initEnum(cl, is_list)
+      else:
+        self._initClass(cl, is_list)
+
+  def _initEnum(self, cl, is_list):
+    members = tuple(cl)
+    if len(members) <= 256:
+      list_suffix, write_one, read_one = "Enum", "writeUnsignedByte", "readUnsignedByte"
+    else:
+      list_suffix, write_one, read_one = "LargeEnum", "writeUnsignedShort", "readUnsignedShort"
+    if is_list:
+      self.write = lambda bpw, v: getattr(bpw, "writeArray" + list_suffix)(v)
+      self.read = lambda registry, bpr: getattr(bpr, "readArray" + list_suffix)(members)
+    else:
+      self.write = lambda bpw, v: getattr(bpw, write_one)(0 if v is None else v.value)
+      self.read = lambda registry, bpr: members[getattr(bpr, read_one)()]
+
+  def _initClass(self, cl, is_list):
+    self.by_bytes = True
+    def readOne(registry, bpr):
+      x = cl()
+      x.populateData(registry, bpr)
+      return x
+    if is_list:
+      self.write = lambda bpw, v: bpw.writeArray(v)
+      self.read = lambda registry, bpr: [readOne(registry, bpr) for _ in range(bpr._readSeqLength())]
+    else:
+      def writeOptional(bpw, v):
+        if v is None:
+          bpw.writeByte(0)
+        else:
+          bpw.writeByte(1)
+          v.serializeData(bpw)
+      def readOptional(registry, bpr):
+        return readOne(registry, bpr) if bpr.readUnsignedByte() > 0 else None
+      self.write = writeOptional
+      self.read = readOptional
+
+  def encode(self, value):
+    bpw = _BluePacketWriter()
+    self.write(bpw, value)
+    return bytes(bpw)
+
+
+_FIELD_CODECS = {}
+
+def fieldCodecs(packet_class):
+  """Per-field codecs of a packet class, in TYPE_INFO order, cached per class."""
+  ret = _FIELD_CODECS.get(packet_class)
+  if ret is None:
+    ret = [
+      _FieldCodec(packet_class, name, ftype, is_list)
+      for name, (ftype, is_list) in packet_class.TYPE_INFO.items()
+    ]
+    _FIELD_CODECS[packet_class] = ret
+  return ret
+
+
+# Compact type ids: a byte below 0x80 is an id, a byte from 0x80 to 0xFE is
+# the high part of a 2-byte id, 0xFF is followed by a full packetHash.
+_TYPE_ID_HASH = 0xFF
+_MAX_TYPE_ID = 0x7EFF
+
+
+class PacketTypes:
+  """Table of compact ids written instead of the 8-byte packetHash, see BluePacketRegistry.packetTypes().
+
+  Pass it to BluePacket.serialize() and BluePacketRegistry.deserialize().
+  Ids start at 1, 0 is a null packet field; they take 1 byte up to 127,
+  2 bytes above. Packets of other types are written with their full hash,
+  so both sides only need the same table, not the same packets.
+  """
+
+  def __init__(self, api_versions, hashes):
+    self.api_versions = api_versions
+    self._hashes = [0] + hashes
+    self._ids = {h: i for i, h in enumerate(self._hashes) if i <= _MAX_TYPE_ID}
+
+  def __len__(self):
+    return len(self._hashes) - 1
+
+
+class _TypeIdWriter(_BluePacketWriter):
+
+  def __init__(self, types):
+    super().__init__()
+    self._ids = types._ids
+
+  def writePacketHash(self, packetHash):
+    i = self._ids.get(packetHash)
+    if i is None:
+      self.writeUnsignedByte(_TYPE_ID_HASH)
+      self.writeLong(packetHash)
+    elif i < 0x80:
+      self.writeUnsignedByte(i)
+    else:
+      self.writeUnsignedShort(0x8000 | i)
+
+
+class _TypeIdReader(_BluePacketReader):
+
+  def __init__(self, buffer, types):
+    super().__init__(buffer)
+    self._hashes = types._hashes
+
+  def readPacketHash(self):
+    i = self.readUnsignedByte()
+    if i == _TYPE_ID_HASH:
+      return self.readLong()
+    if i >= 0x80:
+      i = (i & 0x7F) << 8 | self.readUnsignedByte()
+    if i >= len(self._hashes):
+      raise Exception(f"Unknown type id received: {i}")
+    return self._hashes[i]
+
+
+_DELTA_KEYFRAME = 0
+_DELTA_CHANGES = 1
+
+
+class DeltaEncoder:
+  """Stateful encoder sending only the fields that changed since the previous packet of the same type.
+
+  Each message is the 8 bytes packetHash, a 1 byte marker, then either:
+  - keyframe: the full packet data, as serializeData
+  - changes: a bitmap of the changed fields in TYPE_INFO order, then those fields
+
+  A keyframe is sent for the first packet of each type, then every
+  keyframe_interval packets, or after requestKeyframe().
+  """
+
+  def __init__(self, keyframe_interval=100):
+    self.keyframe_interval = keyframe_interval
+    # packetHash -> [count since keyframe, values, serialized values]
+    self._previous = {}
+
+  def requestKeyframe(self):
+    """Send a full packet next time, e.g. when a new decoder joins the stream."""
+    self._previous.clear()
+
+  def encode(self, packet):
+    codecs = fieldCodecs(type(packet))
+    # lists are copied, the caller may modify them in place before the next packet
+    values = [getattr(packet, c.name) for c in codecs]
+    values = [list(v) if type(v) == list else v for v in values]
+    encoded = [c.encode(v) if c.by_bytes else None for c, v in zip(codecs, values)]
+
+    bpw = _BluePacketWriter()
+    bpw.writeLong(packet.packetHash)
+    previous = self._previous.get(packet.packetHash)
+    if previous is None or previous[0] >= self.keyframe_interval:
+      bpw.writeUnsignedByte(_DELTA_KEYFRAME)
+      packet.serializeData(bpw)
+      self._previous[packet.packetHash] = [1, values, encoded]
+      return bytes(bpw)
+
+    _, prev_values, prev_encoded = previous
+    bitmap = bytearray((len(codecs) + 7) // 8)
+    changes = _BluePacketWriter()
+    for i, c in enumerate(codecs):
+      if c.by_bytes:
+        if encoded[i] == prev_encoded[i]:
+          continue
+        changes.extend(encoded[i])
+      elif values[i] == prev_values[i]:
+        continue
+      else:
+        c.write(changes, values[i])
+      bitmap[i >> 3] |= 1 << (i & 7)
+
+    bpw.writeUnsignedByte(_DELTA_CHANGES)
+    bpw.extend(bitmap)
+    bpw.extend(changes)
+    previous[0] += 1
+    previous[1] = values
+    previous[2] = encoded
+    return bytes(bpw)
+
+
+class DeltaDecoder:
+  """Stateful decoder of the messages produced by a DeltaEncoder.
+
+  Unchanged fields are shared with the previously decoded packet of the same type.
+  """
+
+  def __init__(self, registry):
+    self._registry = registry
+    # packetHash -> values
+    self._previous = {}
+
+  def decode(self, buffer):
+    bpr = _BluePacketReader(buffer)
+    packetHash = bpr.readLong()
+    packet_class = self._registry.packetClass(packetHash)
+    if packet_class is None:
+      raise Exception(f"Unknown packetHash received: {packetHash}")
+    codecs = fieldCodecs(packet_class)
+    packet = packet_class()
+
+    if bpr.readUnsignedByte() == _DELTA_KEYFRAME:
+      packet.populateData(self._registry, bpr)
+      self._previous[packetHash] = [getattr(packet, c.name) for c in codecs]
+      return packet
+
+    values = self._previous.get(packetHash)
+    if values is None:
+      raise Exception(f"Delta received before keyframe for packetHash: {packetHash}")
+    bitmap = bpr.buffer[bpr.offset:bpr.offset + (len(codecs) + 7) // 8]
+    bpr.offset += len(bitmap)
+    for i, c in enumerate(codecs):
+      if bitmap[i >> 3] & (1 << (i & 7)):
+        values[i] = c.read(self._registry, bpr)
+      setattr(packet, c.name, values[i])
+    return packet
+
+
+class _DictionaryWriter(_BluePacketWriter):
+  """Writer replacing strings by varint references into a dictionary shared by the whole stream.
+
+  Reference 0 is followed by a new string (length and utf-8 bytes), which
+  gets the next index if the dictionary is not full. Index 0 is the empty string.
+  """
+
+  def __init__(self, encoder):
+    super().__init__()
+    self._encoder = encoder
+
+  def writeVarint(self, value):
+    while value >= 0x80:
+      self.append((value & 0x7F) | 0x80)
+      value >>= 7
+    self.append(value)
+
+  def writeString(self, field):
+    if not field:
+      self.writeVarint(1)
+      return
+    index = self._encoder._index.get(field)
+    if index is not None:
+      self.writeVarint(index + 1)
+      return
+    self.writeVarint(0)
+    b = field.encode('utf-8')
+    self._writeSeqLength(len(b))
+    self.extend(b)
+    if len(self._encoder._index) < self._encoder.max_size:
+      self._encoder._index[field] = len(self._encoder._index)
+
+
+class _DictionaryReader(_BluePacketReader):
+
+  def __init__(self, buffer, decoder):
+    super().__init__(buffer)
+    self._decoder = decoder
+
+  def readVarint(self):
+    ret = 0
+    shift = 0
+    while True:
+      b = self.buffer[self.offset]
+      self.offset += 1
+      ret |= (b & 0x7F) << shift
+      if b < 0x80:
+        return ret
+      shift += 7
+
+  def readString(self):
+    ref = self.readVarint()
+    if ref > 0:
+      return self._decoder._strings[ref - 1]
+    ret = sys.intern(super().readString())
+    if len(self._decoder._strings) < self._decoder.max_size:
+      self._decoder._strings.append(ret)
+    return ret
+
+
+class DictionaryEncoder:
+  """Stateful encoder sending each distinct string only once per stream or batch.
+
+  Packets are serialized as usual, except strings which become references
+  to previously sent strings. The decoder must see every message, in order.
+  """
+
+  def __init__(self, max_size=65536):
+    self.max_size = max_size
+    # string -> index
+    self._index = {"": 0}
+
+  def encode(self, packet):
+    bpw = _DictionaryWriter(self)
+    bpw.serialize(packet)
+    return bytes(bpw)
+
+  def encodeBatch(self, packets):
+    """Serialize many packets in one buffer, prefixed by their count."""
+    bpw = _DictionaryWriter(self)
+    bpw.writeVarint(len(packets))
+    for p in packets:
+      bpw.writeBluePacket(p)
+    return bytes(bpw)
+
+
+class DictionaryDecoder:
+  """Stateful decoder of the messages produced by a DictionaryEncoder.
+
+  Repeated strings are returned as the same interned str object.
+  """
+
+  def __init__(self, registry, max_size=65536):
+    self._registry = registry
+    self.max_size = max_size
+    # index -> string
+    self._strings = [""]
+
+  def decode(self, buffer):
+    return self._registry.deserialize_internal(_DictionaryReader(buffer, self))
+
+  def decodeBatch(self, buffer):
+    bpr = _DictionaryReader(buffer, self)
+    return [self._registry.deserialize_internal(bpr) for _ in range(bpr.readVarint())]
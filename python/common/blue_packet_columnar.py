@@ -0,0 +1,386 @@
+"""Columnar container for many BluePackets of a single type.
+
+File layout (all column data is little-endian, every chunk is 8-byte aligned):
+
+  BPc\\0 header
+  - 8 bytes hash of the packet type
+  - 8 bytes number of records
+  column chunks, one or more per field:
+  - numeric fields: fixed-width values
+  - bool fields: bitmap, first record in the lowest bit
+  - enum fields: ordinals, as ubyte or ushort for large enums
+  - string fields: N+1 offsets, then the utf-8 bytes
+  - packet and class fields: N+1 offsets, then the serialized bytes
+  - list fields: N+1 offsets into the elements, then the elements column
+  footer:
+  - column directory, serialized with the BluePacket writer
+  - 4 bytes footer length
+  - BPc\\0 trailer
+"""
+
+from array import array
+import enum
+import mmap
+import sys
+
+from blue_packet import _BluePacketReader, _BluePacketWriter, resolveFieldType, roundFloat
+
+MAGIC = b"BPc\0"
+
+_ALIGN = 8
+
+_NUMERIC_FORMAT = {
+  "byte":   "b",
+  "ubyte":  "B",
+  "short":  "h",
+  "ushort": "H",
+  "int":    "i",
+  "long":   "q",
+  "float":  "f",
+  "double": "d",
+}
+
+_OFFSET_FORMAT = "q"
+
+# column kinds, stored in the footer
+_KIND_NUMERIC = 0
+_KIND_BOOL = 1
+_KIND_ENUM = 2
+_KIND_STRING = 3
+_KIND_PACKET = 4
+_KIND_CLASS = 5
+
+_NO_STATS = 0
+_INT_STATS = 1
+_FLOAT_STATS = 2
+
+
+class ColumnarException(Exception):
+  pass
+
+
+def _fieldKind(packet_class, ftype):
+  if ftype in _NUMERIC_FORMAT:
+    return _KIND_NUMERIC, _NUMERIC_FORMAT[ftype]
+  elif ftype == "bool":
+    return _KIND_BOOL, ""
+  elif ftype == "string":
+    return _KIND_STRING, ""
+  elif ftype == "packet":
+    return _KIND_PACKET, ""
+  cl = resolveFieldType(packet_class, ftype)
+  if issubclass(cl, enum.Enum):
+    return _KIND_ENUM, "B" if len(cl) <= 256 else "H"
+  return _KIND_CLASS, ""
+
+
+def _toLittleEndian(values):
+  if sys.byteorder != "little":
+    values.byteswap()
+  return values
+
+
+def _bitmap(values):
+  ret = bytearray((len(values) + 7) // 8)
+  for i, b in enumerate(values):
+    if b:
+      ret[i >> 3] |= 1 << (i & 7)
+  return ret
+
+
+class _ColumnInfo:
+  """Footer entry describing where and how one field is stored."""
+
+  def __init__(self, name, ftype, is_list, kind, fmt):
+    self.name = name
+    self.ftype = ftype
+    self.is_list = is_list
+    self.kind = kind
+    self.fmt = fmt
+    # list offsets, then value offsets (string, packet, class), then values
+    self.list_offset = 0
+    self.offsets_offset = 0
+    self.data_offset = 0
+    self.data_length = 0
+    self.num_values = 0
+    self.stats = _NO_STATS
+    self.min = None
+    self.max = None
+
+  def write(self, bpw):
+    bpw.writeString(self.name)
+    bpw.writeString(self.ftype)
+    bpw.writeByte(1 if self.is_list else 0)
+    bpw.writeByte(self.kind)
+    bpw.writeString(self.fmt)
+    bpw.writeLong(self.list_offset)
+    bpw.writeLong(self.offsets_offset)
+    bpw.writeLong(self.data_offset)
+    bpw.writeLong(self.data_length)
+    bpw.writeLong(self.num_values)
+    bpw.writeByte(self.stats)
+    if self.stats == _INT_STATS:
+      bpw.writeLong(self.min)
+      bpw.writeLong(self.max)
+    elif self.stats == _FLOAT_STATS:
+      bpw.writeDouble(self.min)
+      bpw.writeDouble(self.max)
+
+  @staticmethod
+  def read(bpr):
+    ret = _ColumnInfo(
+      bpr.readString(), bpr.readString(), bpr.readByte() != 0, bpr.readByte(), bpr.readString()
+    )
+    ret.list_offset = bpr.readLong()
+    ret.offsets_offset = bpr.readLong()
+    ret.data_offset = bpr.readLong()
+    ret.data_length = bpr.readLong()
+    ret.num_values = bpr.readLong()
+    ret.stats = bpr.readByte()
+    if ret.stats == _INT_STATS:
+      ret.min = bpr.readLong()
+      ret.max = bpr.readLong()
+    elif ret.stats == _FLOAT_STATS:
+      ret.min = bpr.readDouble()
+      ret.max = bpr.readDouble()
+    return ret
+
+
+class _ColumnarFileWriter:
+
+  def __init__(self, out):
+    self.out = out
+    self.position = 0
+
+  def write(self, data):
+    self.out.write(data)
+    self.position += len(data)
+
+  def align(self):
+    padding = -self.position % _ALIGN
+    if padding:
+      self.write(bytes(padding))
+
+  def writeChunk(self, data):
+    self.align()
+    offset = self.position
+    self.write(data)
+    return offset
+
+  def writeOffsets(self, offsets):
+    return self.writeChunk(_toLittleEndian(array(_OFFSET_FORMAT, offsets)).tobytes())
+
+  def writeValues(self, info, values):
+    """Write the chunks for a flat sequence of values of one field."""
+    info.num_values = len(values)
+    if info.kind == _KIND_NUMERIC or info.kind == _KIND_ENUM:
+      if info.kind == _KIND_ENUM:
+        values = [0 if v is None else v.value for v in values]
+      data = _toLittleEndian(array(info.fmt, values)).tobytes()
+      if values:
+        info.stats = _FLOAT_STATS if info.fmt in "fd" else _INT_STATS
+        info.min = min(values)
+        info.max = max(values)
+    elif info.kind == _KIND_BOOL:
+      data = _bitmap(values)
+    else:
+      bpw = _BluePacketWriter()
+      offsets = [0]
+      for v in values:
+        if info.kind == _KIND_STRING:
+          if v:
+            bpw.extend(v.encode("utf-8"))
+        elif info.kind == _KIND_PACKET:
+          bpw.writeBluePacket(v)
+        elif v is None:
+          bpw.writeByte(0)
+        else:
+          bpw.writeByte(1)
+          v.serializeData(bpw)
+        offsets.append(len(bpw))
+      info.offsets_offset = self.writeOffsets(offsets)
+      data = bytes(bpw)
+    info.data_offset = self.writeChunk(data)
+    info.data_length = len(data)
+
+
+def writeColumnar(out, packet_class, packets):
+  """Write packets of one type into a columnar container.
+
+  Each field is written as its own column, one column at a time, so packets
+  must be a sequence that can be iterated once per field.
+
+  Args:
+      out: binary file object open for writing
+      packet_class: generated BluePacket class of all the packets
+      packets: sequence of packet_class instances
+  """
+  fw = _ColumnarFileWriter(out)
+  header = _BluePacketWriter()
+  header.extend(MAGIC)
+  header.writeLong(packet_class.packetHash)
+  header.writeLong(len(packets))
+  fw.write(header)
+
+  columns = []
+  for name, (ftype, is_list) in packet_class.TYPE_INFO.items():
+    info = _ColumnInfo(name, ftype, is_list, *_fieldKind(packet_class, ftype))
+    if is_list:
+      offsets = [0]
+      values = []
+      for p in packets:
+        x = getattr(p, name)
+        if x:
+          values.extend(x)
+        offsets.append(len(values))
+      info.list_offset = fw.writeOffsets(offsets)
+    else:
+      values = [getattr(p, name) for p in packets]
+    fw.writeValues(info, values)
+    columns.append(info)
+
+  footer = _BluePacketWriter()
+  footer.writeInt(len(columns))
+  for info in columns:
+    info.write(footer)
+  footer.writeInt(len(footer))
+  footer.extend(MAGIC)
+  fw.align()
+  fw.write(footer)
+
+
+class ColumnarReader:
+  """Memory-mapped reader of a columnar container.
+
+  Columns are decoded independently of each other: reading one field only
+  touches the pages holding that field's chunks.
+  """
+
+  def __init__(self, path, registry):
+    self._registry = registry
+    self._file = open(path, "rb")
+    self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    self._view = memoryview(self._mm)
+
+    if self._mm[:4] != MAGIC or self._mm[-4:] != MAGIC:
+      self.close()
+      raise ColumnarException(f"Not a columnar BluePacket file: {path}")
+
+    header = _BluePacketReader(self._mm)
+    header.offset = len(MAGIC)
+    self.packetHash = header.readLong()
+    self.numRecords = header.readLong()
+    self.packetClass = registry.packetClass(self.packetHash)
+    if self.packetClass is None:
+      self.close()
+      raise ColumnarException(f"Unknown packetHash in columnar file: {self.packetHash}")
+
+    footer_end = len(self._mm) - len(MAGIC) - 4
+    footer = _BluePacketReader(self._mm)
+    footer.offset = footer_end
+    footer.offset = footer_end - footer.readInt()
+    self._columns = {}
+    for _ in range(footer.readInt()):
+      info = _ColumnInfo.read(footer)
+      self._columns[info.name] = info
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, exc_tb):
+    self.close()
+
+  def close(self):
+    self._view.release()
+    self._mm.close()
+    self._file.close()
+
+  @property
+  def columns(self):
+    return list(self._columns)
+
+  def stats(self, name):
+    """Min and max values of a numeric or enum column, or None if not available."""
+    info = self._columns[name]
+    if info.stats == _NO_STATS:
+      return None
+    return info.min, info.max
+
+  def _array(self, fmt, offset, count):
+    ret = array(fmt)
+    ret.frombytes(self._view[offset:offset + count * ret.itemsize])
+    return _toLittleEndian(ret)
+
+  def columnView(self, name):
+    """Zero-copy view of a numeric column, or the ordinals of an enum column.
+
+    The memoryview points into the mapped file and must be released before
+    closing the reader. Only available on little-endian hosts.
+    """
+    info = self._columns[name]
+    if info.kind != _KIND_NUMERIC and info.kind != _KIND_ENUM:
+      raise ColumnarException(f"Column {name} is not fixed-width")
+    if sys.byteorder != "little":
+      raise ColumnarException("Zero-copy columns need a little-endian host")
+    end = info.data_offset + info.data_length
+    return self._view[info.data_offset:end].cast(info.fmt)
+
+  def _readValues(self, info):
+    if info.kind == _KIND_NUMERIC:
+      return self._array(info.fmt, info.data_offset, info.num_values).tolist()
+    elif info.kind == _KIND_ENUM:
+      members = list(resolveFieldType(self.packetClass, info.ftype))
+      return [members[i] for i in self._array(info.fmt, info.data_offset, info.num_values)]
+    elif info.kind == _KIND_BOOL:
+      bits = self._view[info.data_offset:info.data_offset + info.data_length]
+      return [(bits[i >> 3] & (1 << (i & 7))) != 0 for i in range(info.num_values)]
+
+    offsets = self._array(_OFFSET_FORMAT, info.offsets_offset, info.num_values + 1)
+    data = self._view[info.data_offset:info.data_offset + info.data_length]
+    if info.kind == _KIND_STRING:
+      return [str(data[offsets[i]:offsets[i + 1]], "utf-8") for i in range(info.num_values)]
+
+    bpr = _BluePacketReader(data)
+    ret = []
+    if info.kind == _KIND_PACKET:
+      for _ in range(info.num_values):
+        ret.append(self._registry.deserialize_internal(bpr))
+    else:
+      cl = resolveFieldType(self.packetClass, info.ftype)
+      for _ in range(info.num_values):
+        x = None
+        if bpr.readUnsignedByte() > 0:
+          x = cl()
+          x.populateData(self._registry, bpr)
+        ret.append(x)
+    return ret
+
+  def readColumn(self, name):
+    """Decode all the values of one field, in record order.
+
+    List fields are returned as a list of lists. Float fields keep the
+    single-precision value as stored.
+    """
+    info = self._columns[name]
+    values = self._readValues(info)
+    if not info.is_list:
+      return values
+    offsets = self._array(_OFFSET_FORMAT, info.list_offset, self.numRecords + 1)
+    return [values[offsets[i]:offsets[i + 1]] for i in range(self.numRecords)]
+
+  def readRecords(self, names=None):
+    """Rebuild the packets, populating only the given fields (default: all).
+
+    Float fields are rounded as the wire decoder does, so the packets are
+    the same as the deserialized ones.
+    """
+    names = names or self.columns
+    ret = [self.packetClass() for _ in range(self.numRecords)]
+    for name in names:
+      info = self._columns[name]
+      values = self.readColumn(name)
+      if info.kind == _KIND_NUMERIC and info.fmt == "f":
+        values = [[roundFloat(v) for v in x] for x in values] if info.is_list else [roundFloat(v) for v in values]
+      for packet, value in zip(ret, values):
+        setattr(packet, name, value)
+    return ret
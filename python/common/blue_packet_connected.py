@@ -0,0 +1,513 @@
+#! /usr/bin/env python3
+"""Connected mode: long-lived sessions where both sides send packets at any time.
+
+A ConnectedServer holds one ConnectedSession per client, a ConnectedClient
+holds one to its server. Packets go both ways as frames of one serialized
+packet each (see blue_packet_rpc_client), there's no request/response
+pairing: a handler may answer a packet by returning one, and any code can
+push packets to a session, e.g. the server pushing updates to dashboards.
+The first frame of a session is a handshake (FLAG_HELLO) where the client
+offers the compact type ids of its API versions, see blue_packet.PacketTypes;
+the server accepts them if it has the same versions.
+
+Each session has a bounded queue of outbound frames, written by its own
+task, so a slow peer doesn't block the sender: send() waits for room in
+the queue, sendNowait() raises asyncio.QueueFull instead. Both sides send
+a heartbeat when they sent nothing for heartbeat_interval seconds, and
+close sessions they received nothing from for heartbeat_timeout seconds.
+
+ConnectedServer.broadcast() sends the same packet to many sessions: it is
+serialized once (per table of type ids), and the same bytes are queued
+to every session. A session whose queue is full gets it according to its
+slow_consumer policy: DROP the packet, COALESCE it with the last queued
+packet with the same key (its class by default), which it replaces, or
+DISCONNECT the session.
+
+Everything runs on the event loop: sessions must be used from it.
+"""
+
+from collections import deque
+import asyncio
+import inspect
+import sys
+import time
+import traceback
+
+from blue_packet_rpc_client import (
+    FLAG_HEARTBEAT, FLAG_HELLO, RPC_DEFAULT_PORT, apiFeature, decodeHello, encodeHello, negotiateTypes, readFrameAsync,
+    writeFrameAsync, writeFramesAsync,
+)
+from blue_packet_rpc_transport import TcpTransport, transport
+
+DEFAULT_MAX_QUEUE = 1024
+DEFAULT_HEARTBEAT_INTERVAL = 10.0
+
+# Slow consumer policies, applied to the broadcasts to a session whose queue is full
+DROP = "drop"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+
+
+async def _call(callback, *args):
+    """Call a plain or coroutine function."""
+    result = callback(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class _OutboundQueue:
+    """Queue of the (payload, flags, coalescing key) frames to write, with the interface of asyncio.Queue.
+
+    At most maxsize frames are queued, if maxsize > 0. Queued frames can be
+    replaced, see replace(). Once closed, putting a frame raises
+    ConnectionError, waking up the put() waiting for room.
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self._frames = deque()
+        # set when there are frames to get, resp. room to put more
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._closed = False
+
+    def qsize(self):
+        return len(self._frames)
+
+    def empty(self):
+        return not self._frames
+
+    def full(self):
+        return 0 < self.maxsize <= len(self._frames)
+
+    def close(self):
+        self._closed = True
+        self._not_full.set()
+
+    def put_nowait(self, frame):
+        if self._closed:
+            raise ConnectionError("Session is closed")
+        if self.full():
+            raise asyncio.QueueFull()
+        self._frames.append(frame)
+        self._not_empty.set()
+        if self.full():
+            self._not_full.clear()
+
+    async def put(self, frame):
+        while self.full() and not self._closed:
+            await self._not_full.wait()
+        self.put_nowait(frame)
+
+    def get_nowait(self):
+        if not self._frames:
+            raise asyncio.QueueEmpty()
+        frame = self._frames.popleft()
+        if not self._frames:
+            self._not_empty.clear()
+        self._not_full.set()
+        return frame
+
+    async def get(self):
+        while not self._frames:
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def replace(self, key, frame):
+        """Replace the last queued frame with this key, returns False if there's none."""
+        for i in range(len(self._frames) - 1, -1, -1):
+            if self._frames[i][2] == key:
+                self._frames[i] = frame
+                return True
+        return False
+
+
+class ConnectedSession:
+    """One connection of the connected mode, on either side.
+
+    heartbeat_timeout defaults to 3 heartbeat intervals; a heartbeat_interval
+    of None disables the heartbeats and the time out. slow_consumer is the
+    policy applied to broadcasts when the queue is full, it can be changed
+    at any time; dropped and coalesced count the broadcasts it applied to.
+    types is the PacketTypes picked by the handshake, if any.
+    """
+
+    def __init__(self, handlers, reader, writer, max_queue=DEFAULT_MAX_QUEUE,
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, heartbeat_timeout=None, slow_consumer=DROP, types=None):
+        self._handlers = handlers
+        self._reader = reader
+        self._writer = writer
+        self.types = types
+        self.peer = writer.get_extra_info('peername')
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        if heartbeat_timeout is None and heartbeat_interval is not None:
+            self.heartbeat_timeout = 3 * heartbeat_interval
+        self._queue = _OutboundQueue(max_queue)
+        self.slow_consumer = slow_consumer
+        self.dropped = 0
+        self.coalesced = 0
+        self._last_received = self._last_sent = time.monotonic()
+        # a slow handler stops the reading, the peer isn't timed out meanwhile
+        self._dispatching = False
+        self._task = None
+        self._closing = False
+        self._closed = asyncio.Event()
+        # why the session was closed, None when the peer closed it
+        self.error = None
+
+    def __repr__(self):
+        return f"ConnectedSession({self.peer})"
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    @property
+    def queued(self):
+        """Number of frames waiting to be written."""
+        return self._queue.qsize()
+
+    async def send(self, packet):
+        """Queue a packet, waiting for room if the queue is full."""
+        if self._closing:
+            raise ConnectionError("Session is closed")
+        await self._queue.put((packet.serialize(self.types), 0, None))
+
+    def sendNowait(self, packet):
+        """Queue a packet, raises asyncio.QueueFull if the queue is full."""
+        if self._closing:
+            raise ConnectionError("Session is closed")
+        self._queue.put_nowait((packet.serialize(self.types), 0, None))
+
+    def _offer(self, data, key):
+        """Queue a broadcast without waiting, returns False if it was dropped."""
+        if self._closing:
+            return False
+        frame = (data, 0, key)
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.slow_consumer == COALESCE and self._queue.replace(key, frame):
+            self.coalesced += 1
+            return True
+        if self.slow_consumer == DISCONNECT:
+            self.close(ConnectionError(f"{self} is too slow, {self.queued} frames queued"))
+            return False
+        self.dropped += 1
+        return False
+
+    def close(self, error=None):
+        """Close the connection, dropping the packets still queued."""
+        if self._closing:
+            return
+        self._closing = True
+        self.error = error
+        self._queue.close()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def waitClosed(self):
+        await self._closed.wait()
+
+    async def _run(self):
+        """Serve the session until either side closes it."""
+        self._task = asyncio.current_task()
+        if self._closing:
+            self._writer.close()
+            self._closed.set()
+            return
+        tasks = [asyncio.create_task(self._writeFrames())]
+        if self.heartbeat_interval is not None:
+            tasks.append(asyncio.create_task(self._heartbeat()))
+        try:
+            await self._readFrames()
+        except asyncio.CancelledError:
+            # close() called, from this session or from another task
+            pass
+        except (ConnectionError, asyncio.IncompleteReadError) as ex:
+            # not close(), that would cancel this task
+            if not self._closing:
+                self.error = ex
+        finally:
+            self._closing = True
+            self._queue.close()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._writer.close()
+            self._closed.set()
+
+    async def _readFrames(self):
+        while True:
+            frame = await readFrameAsync(self._reader)
+            if frame is None:
+                return
+            self._last_received = time.monotonic()
+            flags, payload = frame
+            if flags & FLAG_HEARTBEAT:
+                continue
+            self._dispatching = True
+            try:
+                await self._handlers._dispatch(self, payload)
+            finally:
+                self._dispatching = False
+                self._last_received = time.monotonic()
+
+    async def _writeFrames(self):
+        try:
+            while True:
+                payload, flags, _ = await self._queue.get()
+                if self._closing:
+                    return
+                frames = [(payload, flags)]
+                # write everything queued meanwhile before waiting for the socket
+                while not self._queue.empty():
+                    payload, flags, _ = self._queue.get_nowait()
+                    frames.append((payload, flags))
+                writeFramesAsync(self._writer, frames)
+                await self._writer.drain()
+                self._last_sent = time.monotonic()
+        except ConnectionError as ex:
+            self.close(ex)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval / 2)
+            now = time.monotonic()
+            if not self._dispatching and now - self._last_received > self.heartbeat_timeout:
+                self.close(TimeoutError(f"No heartbeat from {self.peer} for {self.heartbeat_timeout} seconds"))
+                return
+            if now - self._last_sent >= self.heartbeat_interval and self._queue.empty():
+                self._queue.put_nowait((b'', FLAG_HEARTBEAT, None))
+
+
+class _ConnectedHandlers:
+    """Dispatch of the received packets to the handler declared for their class."""
+
+    def __init__(self, registry, max_queue, heartbeat_interval, heartbeat_timeout, slow_consumer=DROP):
+        self._registry = registry
+        self.max_queue = max_queue
+        self.heartbeat_interval = heartbeat_interval
+        if heartbeat_timeout is None and heartbeat_interval is not None:
+            heartbeat_timeout = 3 * heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.slow_consumer = slow_consumer
+        self._dispatch_handler = {}
+        self._error_handler = None
+
+    def _session(self, reader, writer, types):
+        return ConnectedSession(
+            self, reader, writer, self.max_queue, self.heartbeat_interval, self.heartbeat_timeout, self.slow_consumer,
+            types,
+        )
+
+    async def _readHello(self, reader):
+        """Read the handshake frame, returns its features."""
+        frame = await asyncio.wait_for(readFrameAsync(reader), self.heartbeat_timeout)
+        if frame is None or not frame[0] & FLAG_HELLO:
+            raise ConnectionError("Connection closed during handshake")
+        return decodeHello(frame[1])
+
+    def onReceive(self, packet_class, handler):
+        """Declare the function handling one packet class.
+
+        handler(session, packet) is a plain or coroutine function; the packet
+        it returns, if any, is sent back on the session. The packets of a
+        session are handled one at a time, in order.
+        """
+        self._dispatch_handler[packet_class] = handler
+        return self
+
+    def onError(self, handler):
+        """Declare the function building a packet, sent back on the session, from an exception."""
+        self._error_handler = handler
+        return self
+
+    async def _dispatch(self, session, payload):
+        try:
+            packet = self._registry.deserialize(payload, session.types)
+            handler = self._dispatch_handler.get(type(packet))
+            if handler is None:
+                raise Exception(f"No handler for packet class: {type(packet).__name__}")
+            response = await _call(handler, session, packet)
+        except Exception as ex:
+            if self._error_handler is None:
+                traceback.print_exception(ex)
+                return
+            try:
+                response = self._error_handler(ex)
+            except Exception as handler_ex:
+                # like a failing handler, a failing error handler doesn't close the session
+                traceback.print_exception(handler_ex)
+                return
+        if response is not None:
+            await session.send(response)
+
+
+class ConnectedServer(_ConnectedHandlers):
+    """Asyncio server of connected sessions, see the module documentation.
+
+    onConnect() and onDisconnect() callbacks are told about the sessions
+    opening and closing, e.g. to manage subscriptions; sessions holds the
+    open ones. slow_consumer is the initial policy of the sessions.
+    """
+
+    def __init__(self, registry, max_queue=DEFAULT_MAX_QUEUE, heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+                 heartbeat_timeout=None, slow_consumer=DROP):
+        super().__init__(registry, max_queue, heartbeat_interval, heartbeat_timeout, slow_consumer)
+        self.sessions = set()
+        # tasks serving the sessions
+        self._connections = set()
+        self._connect_handler = None
+        self._disconnect_handler = None
+        self._server = None
+        self._transport = None
+
+    def onConnect(self, handler):
+        """Declare the plain or coroutine function called with each new session."""
+        self._connect_handler = handler
+        return self
+
+    def onDisconnect(self, handler):
+        """Declare the plain or coroutine function called with each closed session."""
+        self._disconnect_handler = handler
+        return self
+
+    def broadcast(self, packet, sessions=None, key=None):
+        """Send a packet to sessions, every open session by default, without waiting.
+
+        The packet is serialized once per PacketTypes of the sessions.
+        Returns the number of sessions it was queued to, the others dropped
+        it as slow consumers. Slow consumers with the COALESCE policy replace
+        the last queued broadcast with the same key, the packet class by
+        default, e.g. (type(packet), packet.symbol) to keep the last update
+        of each symbol.
+        """
+        # PacketTypes -> serialized packet
+        data = {}
+        key = type(packet) if key is None else key
+        queued = 0
+        for session in list(self.sessions if sessions is None else sessions):
+            if session.types not in data:
+                data[session.types] = packet.serialize(session.types)
+            queued += session._offer(data[session.types], key)
+        return queued
+
+    def run(self, port=RPC_DEFAULT_PORT, reuse_port=False, address=None):
+        """Run in an infinite loop, until shutdown() is called, see RpcServer.run() for the arguments."""
+        try:
+            asyncio.run(self.serve(port, reuse_port, address))
+        except asyncio.CancelledError:
+            pass
+        print("[ConnectedServer] exiting", file=sys.stderr)
+
+    async def serve(self, port=RPC_DEFAULT_PORT, reuse_port=False, address=None):
+        self._loop = asyncio.get_running_loop()
+        self._transport = TcpTransport("", port) if address is None else transport(address, port)
+        self._server = await self._transport.startServer(self._handleConnection, 1024, reuse_port)
+        print("[ConnectedServer] listening to", address or f"port {port}", file=sys.stderr)
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            finally:
+                # let the sessions closed by shutdown() finish
+                await asyncio.gather(*self._connections, return_exceptions=True)
+
+    def shutdown(self):
+        """Stop the server and close its sessions, can be called from any thread."""
+        if self._server is not None:
+            self._loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        self._server.close()
+        for session in list(self.sessions):
+            session.close()
+
+    async def _handleConnection(self, reader, writer):
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            self._transport.configure(sock)
+        try:
+            features = await self._readHello(reader)
+            types = negotiateTypes(self._registry, features.get("api"))
+            writeFrameAsync(writer, encodeHello({"api": apiFeature(types)}), FLAG_HELLO)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, TimeoutError):
+            writer.close()
+            return
+        session = self._session(reader, writer, types)
+        self.sessions.add(session)
+        self._connections.add(asyncio.current_task())
+        try:
+            if self._connect_handler is not None:
+                await _call(self._connect_handler, session)
+            await session._run()
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+            try:
+                if self._disconnect_handler is not None:
+                    await _call(self._disconnect_handler, session)
+            finally:
+                self._connections.discard(asyncio.current_task())
+
+
+class ConnectedClient(_ConnectedHandlers):
+    """Asyncio client holding one connected session to a server, see the module documentation.
+
+    host is anything accepted by blue_packet_rpc_transport.transport().
+    Packets pushed by the server are handled by the handlers declared with
+    onReceive(). With compact_types, the client offers the type ids of all
+    its registered API versions in the handshake.
+    """
+
+    def __init__(self, host, registry, port=RPC_DEFAULT_PORT, max_queue=DEFAULT_MAX_QUEUE,
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, heartbeat_timeout=None, compact_types=True):
+        super().__init__(registry, max_queue, heartbeat_interval, heartbeat_timeout)
+        self.transport = transport(host, port)
+        self._types = registry.packetTypes() if compact_types else None
+        self.session = None
+        self._task = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb):
+        await self.close()
+
+    async def connect(self):
+        reader, writer = await self.transport.openConnection()
+        try:
+            writeFrameAsync(writer, encodeHello({"api": apiFeature(self._types)}), FLAG_HELLO)
+            await writer.drain()
+            features = await self._readHello(reader)
+        except BaseException:
+            writer.close()
+            raise
+        self.session = self._session(reader, writer, negotiateTypes(self._registry, features.get("api")))
+        self._task = asyncio.create_task(self.session._run())
+
+    @property
+    def closed(self):
+        return self.session is None or self.session.closed
+
+    async def send(self, packet):
+        if self.session is None:
+            raise ConnectionError("Client is not connected")
+        await self.session.send(packet)
+
+    def sendNowait(self, packet):
+        if self.session is None:
+            raise ConnectionError("Client is not connected")
+        self.session.sendNowait(packet)
+
+    async def close(self):
+        if self.session is not None:
+            self.session.close()
+            await asyncio.gather(self._task, return_exceptions=True)
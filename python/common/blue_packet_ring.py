@@ -0,0 +1,213 @@
+"""Single-producer, single-consumer ring buffer of BluePackets in shared memory.
+
+One process writes packets, another one reads them, both on the same host.
+The writer serializes each packet straight into the shared memory, and the
+reader deserializes it from a memoryview of it, so a packet is never copied
+through a socket or a pipe.
+
+Shared memory layout, integers in the native byte order:
+
+  header, each index on its own cache line
+  - 8 bytes capacity of the data region
+  - 8 bytes closed flag, set by the writer
+  - 8 bytes head: total number of bytes written, at offset 64
+  - 8 bytes tail: total number of bytes read, at offset 128
+  data region, from offset 192: records aligned on 8 bytes
+  - 4 bytes packet length, or 0xFFFFFFFF to skip to the start of the region
+  - serialized packet
+
+There's no lock: only the writer moves the head, only the reader moves the
+tail. The header is accessed through a memoryview of 8-byte integers, which
+copies each of them at once, unlike struct.pack_into() that zero-fills its
+target first. A side waiting for the other one spins for a while, then
+sleeps for increasing intervals, up to MAX_SLEEP seconds.
+"""
+
+from multiprocessing import resource_tracker, shared_memory
+import struct
+import time
+
+from blue_packet import _BluePacketWriter
+
+_LENGTH = struct.Struct("I")
+
+# indexes in the header, in 8-byte integers
+_CAPACITY = 0
+_CLOSED = 1
+_HEAD = 8
+_TAIL = 16
+_DATA = 192
+
+_ALIGN = 8
+_WRAP = 0xFFFFFFFF
+
+SPINS = 1000
+MAX_SLEEP = 0.001
+
+
+def _aligned(size):
+  return (size + _ALIGN - 1) & ~(_ALIGN - 1)
+
+
+class _RingFull(Exception):
+  pass
+
+
+class _RingWriter(_BluePacketWriter):
+  """Writer serializing straight into a slice of the data region."""
+
+  def __init__(self, view, start, end):
+    super().__init__()
+    self.view = view
+    self.position = start
+    self.end = end
+
+  def extend(self, data):
+    end = self.position + len(data)
+    if end > self.end:
+      raise _RingFull()
+    self.view[self.position:end] = data
+    self.position = end
+
+
+class _Backoff:
+
+  def __init__(self, timeout):
+    self.deadline = None if timeout is None else time.monotonic() + timeout
+    self.spins = 0
+    self.sleep = 0.00001
+
+  def wait(self):
+    if self.deadline is not None and time.monotonic() > self.deadline:
+      raise TimeoutError("Timed out waiting for the other side of the ring")
+    self.spins += 1
+    if self.spins < SPINS:
+      return
+    time.sleep(self.sleep)
+    self.sleep = min(self.sleep * 2, MAX_SLEEP)
+
+
+class PacketRing:
+  """One end of a ring buffer: create() it in one process, attach() to it by name in the other.
+
+  Only one process may write, and only one may read.
+  """
+
+  def __init__(self, shm, registry, owner):
+    self._shm = shm
+    self._registry = registry
+    self._owner = owner
+    self._header = shm.buf[:_DATA].cast("Q")
+    self.capacity = self._header[_CAPACITY]
+    self._data = shm.buf[_DATA:_DATA + self.capacity]
+
+  @staticmethod
+  def create(capacity, registry=None, name=None):
+    """Create a ring holding up to capacity bytes of records, removed from the system on close()."""
+    capacity = _aligned(capacity)
+    shm = shared_memory.SharedMemory(name=name, create=True, size=_DATA + capacity)
+    shm.buf[:_DATA] = bytes(_DATA)
+    with shm.buf[:_DATA].cast("Q") as header:
+      header[_CAPACITY] = capacity
+    return PacketRing(shm, registry, True)
+
+  @staticmethod
+  def attach(name, registry=None):
+    """Open a ring created by another process, the registry is needed to read."""
+    shm = shared_memory.SharedMemory(name=name)
+    # only the creator removes the ring: the resource tracker of this process
+    # would remove it when this process exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return PacketRing(shm, registry, False)
+
+  @property
+  def name(self):
+    return self._shm.name
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, exc_tb):
+    self.close()
+
+  def close(self):
+    self._header.release()
+    self._data.release()
+    self._shm.close()
+    if self._owner:
+      # registered again: an attach() sharing the resource tracker of this
+      # process, e.g. from a child process, unregistered the ring
+      resource_tracker.register(self._shm._name, "shared_memory")
+      self._shm.unlink()
+
+  def closeWriter(self):
+    """Tell the reader there are no more packets: read() returns None once the ring is empty."""
+    self._header[_CLOSED] = 1
+
+  def write(self, packet, timeout=None):
+    """Write one packet, waiting up to timeout seconds (forever by default) for the reader to make room."""
+    backoff = _Backoff(timeout)
+    # serialized copy of the packet, once it didn't fit in place
+    data = None
+    while True:
+      head = self._header[_HEAD]
+      position = head % self.capacity
+      free = self.capacity - (head - self._header[_TAIL])
+      contiguous = min(free, self.capacity - position)
+
+      if data is None and contiguous > _LENGTH.size:
+        bpw = _RingWriter(self._data, position + _LENGTH.size, position + contiguous)
+        try:
+          bpw.serialize(packet)
+        except _RingFull:
+          data = packet.serialize()
+        else:
+          length = bpw.position - position - _LENGTH.size
+          _LENGTH.pack_into(self._data, position, length)
+          # publish the record once it's complete
+          self._header[_HEAD] = head + _aligned(_LENGTH.size + length)
+          return
+      elif data is None:
+        data = packet.serialize()
+
+      size = _aligned(_LENGTH.size + len(data))
+      if size > self.capacity:
+        raise ValueError(f"Packet of {len(data)} bytes larger than the ring capacity {self.capacity}")
+      if size > self.capacity - position:
+        if free >= self.capacity - position:
+          # not enough room before the end of the region, start over at its beginning
+          _LENGTH.pack_into(self._data, position, _WRAP)
+          self._header[_HEAD] = head + self.capacity - position
+          continue
+      elif size <= free:
+        start = position + _LENGTH.size
+        self._data[start:start + len(data)] = data
+        _LENGTH.pack_into(self._data, position, len(data))
+        self._header[_HEAD] = head + size
+        return
+      backoff.wait()
+
+  def read(self, timeout=None):
+    """Read the next packet, waiting up to timeout seconds (forever by default) for one.
+
+    Returns None once the writer called closeWriter() and every packet was read.
+    """
+    backoff = _Backoff(timeout)
+    while True:
+      closed = self._header[_CLOSED]
+      tail = self._header[_TAIL]
+      if self._header[_HEAD] == tail:
+        if closed:
+          return None
+        backoff.wait()
+        continue
+      position = tail % self.capacity
+      (length,) = _LENGTH.unpack_from(self._data, position)
+      if length == _WRAP:
+        self._header[_TAIL] = tail + self.capacity - position
+        continue
+      start = position + _LENGTH.size
+      with self._data[start:start + length] as view:
+        packet = self._registry.deserialize(view)
+      self._header[_TAIL] = tail + _aligned(_LENGTH.size + length)
+      return packet
@@ -1,38 +1,1273 @@
 #! /usr/bin/env python3
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import itertools
+import lzma
+import math
+import random
 import socket
+import struct
+import threading
+import time
+import weakref
+import zlib
+
+from blue_packet_rpc_metrics import NO_STAGES, stages
+from blue_packet_rpc_transport import transport
 
 RPC_DEFAULT_PORT = 5900
 
-_CHUNK_SIZE = 4096
+# Initial size of the buffer a response is received into, it doubles as needed.
+RECEIVE_BUFFER_SIZE = 64 * 1024
+
+# Framed mode: every message is preceded by its payload length and a byte of
+# flags, so one connection can carry many request/response pairs.
+_FRAME_HEADER = struct.Struct('!IB')
+
+# Frame flags
+# - payload starts with a 4-byte request id, echoed in the response frame;
+#   responses to such requests can come back in any order
+FLAG_REQUEST_ID = 0x01
+# - payload is a batch of requests, or of their responses in the same order,
+#   see encodeBatch()
+FLAG_BATCH = 0x02
+# - handshake, the first frame of a connection: the client lists the features
+#   it supports and the server answers with the ones it picked, see encodeHello();
+#   "compression" lists algorithms, "api" API versions whose compact type ids
+#   (see blue_packet.PacketTypes) replace the packet hashes in the payloads,
+#   "one_way" is set if the server executes FLAG_ONE_WAY requests
+FLAG_HELLO = 0x04
+# - payload, after the request id, is compressed with the algorithm picked in
+#   the handshake
+FLAG_COMPRESSED = 0x08
+# - connected mode: heartbeat with an empty payload, keeping an idle session
+#   alive, see blue_packet_connected
+FLAG_HEARTBEAT = 0x10
+# - payload is a request, or a batch of requests, the server doesn't answer;
+#   only sent to servers with the "one_way" feature, see RpcClient._executeOneWay()
+FLAG_ONE_WAY = 0x20
+# - request answered with a stream of responses, and the frames of that
+#   stream: each carries a response, or a batch of them with FLAG_BATCH;
+#   an empty payload ends the stream, see RpcClient._executeStream()
+FLAG_STREAM = 0x40
+
+REQUEST_ID = struct.Struct('!I')
+
+# Compression algorithms: name -> (compress, decompressor factory)
+COMPRESSION = {
+    "zlib": (zlib.compress, zlib.decompressobj),
+    "lzma": (lzma.compress, lzma.LZMADecompressor),
+}
+
+# Largest payload of a frame, whose length is an unsigned int. Compressed
+# payloads are rejected if they decompress to more, see decompressPayload().
+MAX_FRAME_SIZE = 2 ** 32 - 1
+
+# Payloads smaller than this are not worth compressing.
+COMPRESSION_THRESHOLD = 1024
+
+# One-way requests are sent in a batch once there are this many of them, or
+# this many bytes of them, or this many seconds after the first one.
+ONE_WAY_BATCH_COUNT = 1000
+ONE_WAY_BATCH_BYTES = 256 * 1024
+ONE_WAY_LINGER = 0.005
+
+_BATCH_LENGTH = struct.Struct('!I')
+
+
+def _remaining(deadline):
+    """Seconds left before a time.monotonic() deadline, or None if there's no deadline."""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("RPC deadline exceeded")
+    return remaining
 
 
-# TODO: make a generator to avoid materializing the chunks
-def receive(sock):
-    chunks = []
+def _setDeadline(sock, deadline):
+    if deadline is not None:
+        sock.settimeout(_remaining(deadline))
+
+
+def receive(sock, buffer_size=RECEIVE_BUFFER_SIZE, deadline=None):
+    """Read until the peer closes the connection, returns a memoryview of the received bytes."""
+    buffer = bytearray(buffer_size)
+    received = 0
     while True:
-        one_chunk = sock.recv(_CHUNK_SIZE)
-        if one_chunk == b'':
+        if received == len(buffer):
+            buffer.extend(bytes(len(buffer)))
+        _setDeadline(sock, deadline)
+        with memoryview(buffer) as view:
+            n = sock.recv_into(view[received:])
+        if n == 0:
             break
-        chunks.append(one_chunk)
-    return b''.join(chunks)
+        received += n
+    return memoryview(buffer)[:received]
+
+
+def _receiveExactly(sock, size, deadline=None):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        _setDeadline(sock, deadline)
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError(f"Connection closed after {received} of {size} bytes")
+        received += n
+    return buffer
+
+
+def sendFrame(sock, data, flags=0):
+    sock.sendall(_FRAME_HEADER.pack(len(data), flags) + data)
+
+
+def receiveFrame(sock, deadline=None):
+    """Read one frame, returns (flags, payload), or None if the peer closed the connection.
+
+    With a time.monotonic() deadline, raises TimeoutError if the frame isn't fully received by then.
+    """
+    _setDeadline(sock, deadline)
+    first = sock.recv(_FRAME_HEADER.size)
+    if first == b'':
+        return None
+    if len(first) < _FRAME_HEADER.size:
+        first += _receiveExactly(sock, _FRAME_HEADER.size - len(first), deadline)
+    length, flags = _FRAME_HEADER.unpack(first)
+    return flags, _receiveExactly(sock, length, deadline)
+
+
+async def readFrameAsync(reader):
+    """Read one frame from an asyncio stream, returns (flags, payload), or None at end of stream."""
+    try:
+        header = await reader.readexactly(_FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as ex:
+        if ex.partial:
+            raise ConnectionError("Connection closed inside a frame header")
+        return None
+    length, flags = _FRAME_HEADER.unpack(header)
+    return flags, await reader.readexactly(length)
+
+
+def writeFrameAsync(writer, data, flags=0):
+    writer.write(_FRAME_HEADER.pack(len(data), flags))
+    writer.write(data)
+
+
+def writeFramesAsync(writer, frames):
+    """Write (payload, flags) frames in a single call, without joining the payloads where the transport can."""
+    parts = []
+    for data, flags in frames:
+        parts.append(_FRAME_HEADER.pack(len(data), flags))
+        parts.append(data)
+    writer.writelines(parts)
+
+
+def encodeBatch(items):
+    """Build a batch payload: the number of items, then each serialized packet prefixed by its length.
+
+    An empty item stands for no packet, e.g. a handler without response.
+    """
+    parts = [_BATCH_LENGTH.pack(len(items))]
+    for data in items:
+        parts.append(_BATCH_LENGTH.pack(len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def decodeBatch(payload):
+    """Split a batch payload into memoryviews of the serialized packets."""
+    view = memoryview(payload)
+    try:
+        (count,) = _BATCH_LENGTH.unpack_from(view)
+        offset = _BATCH_LENGTH.size
+        items = []
+        for _ in range(count):
+            (length,) = _BATCH_LENGTH.unpack_from(view, offset)
+            offset += _BATCH_LENGTH.size
+            items.append(view[offset:offset + length])
+            offset += length
+    except struct.error:
+        raise ConnectionError("Truncated batch payload")
+    if offset != len(view):
+        raise ConnectionError("Malformed batch payload")
+    return items
+
+
+def encodeHello(features):
+    """Build a handshake payload from a dict of feature name -> value, both strings."""
+    return "\n".join(f"{name}={value}" for name, value in features.items()).encode('utf-8')
+
+
+def decodeHello(payload):
+    try:
+        text = str(payload, 'utf-8')
+    except UnicodeDecodeError as ex:
+        raise ConnectionError("Malformed handshake frame") from ex
+    features = {}
+    for line in text.splitlines():
+        name, _, value = line.partition("=")
+        features[name] = value
+    return features
+
+
+# What the handshake of a connection picked: compression algorithm and PacketTypes, or None,
+# and whether the server executes one-way requests
+Handshake = namedtuple("Handshake", ["compression", "types", "one_way"], defaults=[None, None, False])
+
+NO_HANDSHAKE = Handshake()
+
+
+def apiFeature(types):
+    """Value of the "api" handshake feature offering, or accepting, a PacketTypes."""
+    return "" if types is None else ",".join(str(v) for v in types.api_versions)
+
+
+def negotiateTypes(registry, feature):
+    """PacketTypes of the API versions of an "api" handshake feature, or None if one isn't registered."""
+    try:
+        versions = [int(v) for v in feature.split(",")] if feature else []
+    except ValueError:
+        return None
+    return registry.packetTypes(versions) if versions else None
+
+
+def compressPayload(algorithm, threshold, data):
+    """Returns (payload, flags): data compressed with algorithm, unless it's too small or doesn't shrink."""
+    if algorithm is None or len(data) < threshold:
+        return data, 0
+    compressed = COMPRESSION[algorithm][0](data)
+    if len(compressed) >= len(data):
+        return data, 0
+    return compressed, FLAG_COMPRESSED
+
+
+def decompressPayload(algorithm, flags, payload):
+    if not flags & FLAG_COMPRESSED:
+        return payload
+    if algorithm is None:
+        raise ConnectionError("Compressed frame on a connection without compression")
+    decompressor = COMPRESSION[algorithm][1]()
+    try:
+        # bounded, so a small frame can't decompress to more than a frame can carry
+        data = decompressor.decompress(payload, MAX_FRAME_SIZE + 1)
+    except (zlib.error, lzma.LZMAError) as ex:
+        raise ConnectionError("Malformed compressed frame") from ex
+    if len(data) > MAX_FRAME_SIZE:
+        raise ConnectionError(f"Compressed frame larger than {MAX_FRAME_SIZE} bytes once decompressed")
+    if not decompressor.eof or decompressor.unused_data:
+        raise ConnectionError("Malformed compressed frame, truncated or followed by other data")
+    return data
+
+
+def _isHealthy(sock):
+    """An idle connection is healthy if it's open and has no unexpected pending data."""
+    # a socket with a timeout would wait for data before peeking
+    timeout = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        # either closed by the server (b'') or unexpected data
+        sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+        return False
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.settimeout(timeout)
+
+
+class RpcConnectionPool:
+    """Bounded pool of framed connections to one endpoint, safe to share between threads.
+
+    Connections are created on demand up to max_size; when all of them are in
+    use, checkout() waits for one to be returned. Idle connections older than
+    idle_timeout seconds are closed, and every idle connection is checked for
+    a closed or dirty socket before being handed out. Connections get a
+    socket timeout, in seconds, if given. on_connect(sock, deadline) is
+    called on each new connection, e.g. for a handshake, with the
+    time.monotonic() deadline of the checkout, or None; its result is kept
+    as the session() of the connection.
+    """
+
+    def __init__(self, host, port=RPC_DEFAULT_PORT, max_size=1, idle_timeout=60.0, checkout_timeout=None, timeout=None,
+                 metrics=None, on_connect=None):
+        self.transport = transport(host, port)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.timeout = timeout
+        self.metrics = metrics
+        self.on_connect = on_connect
+        self._sessions = weakref.WeakKeyDictionary()
+        self.created = 0
+        self.reused = 0
+        self._lock = threading.Condition()
+        # (socket, time returned to the pool), most recently used last
+        self._idle = []
+        self._size = 0
+        self._closed = False
+
+    def _newConnection(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        sock = self.transport.connect(timeout)
+        try:
+            if self.on_connect is not None:
+                self._sessions[sock] = self.on_connect(sock, deadline)
+            sock.settimeout(self.timeout)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def session(self, sock):
+        """What on_connect() returned for this connection."""
+        return self._sessions.get(sock)
+
+    def setSession(self, sock, session):
+        """Replace the session of a connection, e.g. after a later handshake."""
+        self._sessions[sock] = session
+
+    def _evictIdle(self, now):
+        # called with the lock held, oldest connections first
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            sock, _ = self._idle.pop(0)
+            sock.close()
+            self._size -= 1
+
+    def checkout(self, timeout=None):
+        """Get a connection, waiting and connecting for at most timeout seconds, if given."""
+        wait_timeout = self.checkout_timeout
+        if timeout is not None and (wait_timeout is None or timeout < wait_timeout):
+            wait_timeout = timeout
+        with self._lock:
+            deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+            while True:
+                if self._closed:
+                    raise ConnectionError("Connection pool is closed")
+                self._evictIdle(time.monotonic())
+                while self._idle:
+                    sock, _ = self._idle.pop()
+                    if _isHealthy(sock):
+                        self.reused += 1
+                        if self.metrics is not None:
+                            self.metrics.count("connections_reused", None)
+                        return sock
+                    sock.close()
+                    self._size -= 1
+                if self._size < self.max_size:
+                    # reserve the slot, connect outside of the lock
+                    self._size += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No connection available to {self.transport}")
+                self._lock.wait(remaining)
+        try:
+            sock = self._newConnection(self.timeout if timeout is None else timeout)
+        except Exception:
+            self._release()
+            raise
+        with self._lock:
+            self.created += 1
+        if self.metrics is not None:
+            self.metrics.count("connections_created", None)
+        return sock
+
+    def _release(self):
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+
+    def checkin(self, sock, broken=False):
+        """Give back a connection; broken connections are closed instead of reused."""
+        if broken:
+            sock.close()
+            self._release()
+            return
+        with self._lock:
+            if self._closed:
+                sock.close()
+                self._size -= 1
+            else:
+                self._idle.append((sock, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        sock = self.checkout(timeout)
+        try:
+            yield sock
+        except BaseException:
+            # the connection state is unknown
+            self.checkin(sock, broken=True)
+            raise
+        self.checkin(sock)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for sock, _ in self._idle:
+                sock.close()
+            self._size -= len(self._idle)
+            self._idle = []
+            self._lock.notify_all()
+
+
+class RpcResponseCache:
+    """LRU cache of the responses to idempotent requests, shared by the threads of an RpcClient.
+
+    Only requests of the classes declared with cache() are cached, each
+    with its own time to live in seconds. Entries are keyed on the
+    serialized request; the least recently used ones are evicted when there
+    are more than max_entries, or when the serialized responses add up to
+    more than max_bytes. Identical requests sent while one of them is in
+    flight wait for its response instead of being sent again. Responses of
+    the classes declared with error(), e.g. the packets of the server's
+    error handler, are never cached.
+
+    Cached response packets are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._ttl = {}
+        self._errors = set()
+        self._lock = threading.Lock()
+        # serialized request -> (response, response size, expiry time), most recently used last
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # serialized request -> Future of the response, for requests in flight
+        self._pending = {}
+
+    def cache(self, packet_class, ttl):
+        """Declare requests of packet_class as cacheable, for ttl seconds."""
+        self._ttl[packet_class] = ttl
+        return self
+
+    def error(self, packet_class):
+        """Declare responses of packet_class as errors, which are not cached."""
+        self._errors.add(packet_class)
+        return self
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _put(self, key, response, size, expiry):
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (response, size, expiry)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def get(self, request_class, key, load, timeout=None):
+        """Return the response to a serialized request, calling load() on a miss.
+
+        load() sends the request and returns (response, size of the serialized response).
+        Waiting for an identical request in flight raises TimeoutError after
+        timeout seconds, if given.
+        """
+        ttl = self._ttl.get(request_class)
+        if ttl is None:
+            return load()[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(key)
+            future = self._pending.get(key)
+            loading = future is None
+            if loading:
+                self.misses += 1
+                future = self._pending[key] = Future()
+            else:
+                self.coalesced += 1
+        if not loading:
+            return future.result(timeout)
+        try:
+            response, size = load()
+        except BaseException as ex:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(ex)
+            raise
+        with self._lock:
+            del self._pending[key]
+            # an error answers the identical requests in flight, not the next ones
+            if type(response) not in self._errors:
+                self._put(key, response, size, time.monotonic() + ttl)
+        future.set_result(response)
+        return response
+
+
+class RpcHedging:
+    """Hedging policy of an RpcClient: requests unanswered after a delay are sent again to another endpoint.
+
+    Only requests of the classes declared with hedge() are hedged; they must
+    be idempotent since both copies may be executed. The delay is the given
+    percentile of the latencies of the last window requests of the same
+    class, or initial_delay until there are min_samples of them. The first
+    response wins. The original request is sent from the caller's thread,
+    only the copy runs on the client's thread pool: a copy answered first
+    interrupts the original request and closes its connection, an original
+    request answered first lets the copy complete in the background and
+    drops its response.
+    """
+
+    def __init__(self, percentile=95, window=100, min_samples=20, initial_delay=0.05):
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.hedged = 0
+        # hedged requests answered first by their copy
+        self.wins = 0
+        self._classes = set()
+        self._lock = threading.Lock()
+        # packet class -> latencies of its last requests
+        self._latencies = {}
+
+    def hedge(self, packet_class):
+        """Declare requests of packet_class as idempotent, to be hedged."""
+        self._classes.add(packet_class)
+        return self
+
+    def isHedged(self, packet_class):
+        return packet_class in self._classes
+
+    def record(self, packet_class, latency):
+        with self._lock:
+            if packet_class not in self._latencies:
+                self._latencies[packet_class] = deque(maxlen=self.window)
+            self._latencies[packet_class].append(latency)
+
+    def delay(self, packet_class):
+        """Seconds to wait for a response before hedging a request."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(packet_class, ()))
+        if len(latencies) < self.min_samples:
+            return self.initial_delay
+        return latencies[math.ceil(len(latencies) * self.percentile / 100) - 1]
+
+
+class _HedgeWon(Exception):
+    """The copy of a hedged request was answered first, the original request is abandoned."""
+
+
+class _HedgedCall:
+    """Hedged request: its original request starts the copy if not answered after a delay.
+
+    A copy answered first wakes up the original request by shutting down
+    its connection, which is then closed rather than reused.
+    """
+
+    def __init__(self, executor, delay, attempt):
+        self._executor = executor
+        self._hedge_at = time.monotonic() + delay
+        self._attempt = attempt
+        self._lock = threading.Lock()
+        # socket of the original request while it waits for its response
+        self._waiting = None
+        self._won = False
+        # Future of the copy, once started
+        self.hedge = None
+
+    def _runHedge(self):
+        result = self._attempt()
+        with self._lock:
+            self._won = True
+            if self._waiting is not None:
+                self._waiting.shutdown(socket.SHUT_RDWR)
+        return result
+
+    def waitFirstByte(self, sock, deadline):
+        """Wait for the response of the original request, starting the copy if it's late.
+
+        Raises _HedgeWon if the copy was answered first.
+        """
+        with self._lock:
+            self._waiting = sock
+        error = None
+        try:
+            late = True
+            delay = self._hedge_at - time.monotonic()
+            if delay > 0:
+                sock.settimeout(delay)
+                try:
+                    sock.recv(1, socket.MSG_PEEK)
+                    late = False
+                except TimeoutError:
+                    pass
+            if late:
+                self.hedge = self._executor.submit(self._runHedge)
+                sock.settimeout(None if deadline is None else _remaining(deadline))
+                sock.recv(1, socket.MSG_PEEK)
+        except OSError as ex:
+            error = ex
+        with self._lock:
+            self._waiting = None
+            won = self._won
+        if won:
+            raise _HedgeWon()
+        if error is not None:
+            raise error
+
+
+class RoundRobin:
+    """Load balancing strategy sending the requests to each endpoint in turn."""
+
+    def __init__(self):
+        self._next = itertools.count()
+
+    def choose(self, endpoints):
+        return endpoints[next(self._next) % len(endpoints)]
+
+
+class LeastOutstanding:
+    """Load balancing strategy sending each request to the endpoint with the fewest requests in flight."""
+
+    def choose(self, endpoints):
+        # shuffled, so idle endpoints share the requests
+        return min(random.sample(endpoints, len(endpoints)), key=lambda e: e.outstanding)
+
+
+class PowerOfTwoChoices:
+    """Load balancing strategy picking two random endpoints, and the one with fewer requests in flight."""
+
+    def choose(self, endpoints):
+        if len(endpoints) == 1:
+            return endpoints[0]
+        a, b = random.sample(endpoints, 2)
+        return a if a.outstanding <= b.outstanding else b
+
+
+class _Endpoint:
+    """One server of an RpcClient, with its connection pool and health."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.pool = None
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def __repr__(self):
+        return repr(self.transport)
+
+
+class RpcServiceError(Exception):
+    """Raised by the generated service stubs when the server answers an rpc with one of its error packets."""
+
+    def __init__(self, packet):
+        super().__init__(str(packet))
+        self.packet = packet
+
+
+def serviceResponse(response, response_hash, error_hashes):
+    """Response of an rpc of the generated service stubs, checked by packet hash."""
+    packet_hash = getattr(response, "packetHash", None)
+    if packet_hash == response_hash:
+        return response
+    if packet_hash in error_hashes:
+        raise RpcServiceError(response)
+    raise Exception("Unexpected response packet: " + str(response))
 
 
 class RpcClient:
+    """Send one request packet and receive one response packet.
+
+    By default, each request opens a new connection and the response is
+    delimited by the server closing it. In framed mode, requests go through a
+    pool of up to pool_size persistent connections per endpoint, opened in
+    __enter__ and closed in __exit__, and the client can be shared between threads.
+
+    host is a host name, "unix:///path/to/socket" for a server on the same
+    host (see blue_packet_rpc_transport), or a transport object. It can also
+    be a list of endpoints, host names, (host, port) tuples, unix:// paths
+    or transports: each request goes to the endpoint chosen by the strategy
+    (RoundRobin, LeastOutstanding, PowerOfTwoChoices, or any object with a
+    choose(endpoints) method). An endpoint that fails with a connection
+    error or a time out eject_after times in a row is ejected: it doesn't
+    get requests for ejection_time seconds. Calls time out after timeout
+    seconds, if given, see _execute().
+    With an RpcHedging policy, slow idempotent requests are also sent to a
+    second endpoint, and the first response is used. With a metrics sink,
+    see blue_packet_rpc_metrics, every call reports the time spent in
+    each of its stages and its sizes.
+
+    In framed mode, compression lists the algorithms (see COMPRESSION)
+    the client can use, by order of preference; the server picks one when
+    connecting, and frames of at least compression_threshold bytes are
+    then compressed in both directions. With compact_types, connections
+    to servers with the same API versions replace the 8-byte packet hashes
+    with 1 or 2 byte type ids, see blue_packet.PacketTypes.
 
-    def __init__(self, host, registry):
+    In framed mode, one-way requests (see _executeOneWay()) are queued and
+    sent in a single frame once there are batch_count of them, or
+    batch_bytes bytes of them, or linger seconds after the first one.
+
+    Responses are received in place into a buffer of buffer_size bytes,
+    which grows as needed, and decoded without copying it. With an
+    RpcResponseCache, cacheable requests are answered from the cache when
+    possible.
+    """
+
+    def __init__(self, host, registry, framed=False, port=RPC_DEFAULT_PORT, pool_size=1, idle_timeout=60.0,
+                 buffer_size=RECEIVE_BUFFER_SIZE, cache=None, strategy=None, timeout=None,
+                 eject_after=3, ejection_time=30.0, hedging=None, metrics=None,
+                 compression=None, compression_threshold=COMPRESSION_THRESHOLD, compact_types=False,
+                 batch_count=ONE_WAY_BATCH_COUNT, batch_bytes=ONE_WAY_BATCH_BYTES, linger=ONE_WAY_LINGER):
         self._registry = registry
-        self.host = host
+        if compact_types and not framed:
+            raise ValueError("Compact type ids need a framed RpcClient")
+        self._types = registry.packetTypes() if compact_types else None
+        self.metrics = metrics
+        if isinstance(compression, str):
+            compression = [compression]
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.framed = framed
+        self.buffer_size = buffer_size
+        self.cache = cache
+        self.hedging = hedging
+        self._hedging_executor = None
+        if hedging is not None:
+            self._hedging_executor = ThreadPoolExecutor(thread_name_prefix="RpcClient-hedging")
+        self.strategy = strategy or RoundRobin()
+        self.timeout = timeout
+        self.eject_after = eject_after
+        self.ejection_time = ejection_time
+        self._lock = threading.Lock()
+        self.batch_count = batch_count
+        self.batch_bytes = batch_bytes
+        self.linger = linger
+        # serialized one-way requests waiting to be sent, see _executeOneWay()
+        self._one_way = []
+        self._one_way_bytes = 0
+        self._one_way_deadline = None
+        self._one_way_error = None
+        self._one_way_ready = threading.Condition()
+        # batches are taken and sent under this lock, so they are sent in order
+        self._one_way_send = threading.Lock()
+        self._flusher = None
+        self._closed = False
+        self._endpoints = []
+        for endpoint in host if isinstance(host, list) else [host]:
+            endpoint = _Endpoint(transport(endpoint, port))
+            if framed:
+                endpoint.pool = RpcConnectionPool(
+                    endpoint.transport, max_size=pool_size, idle_timeout=idle_timeout, timeout=timeout,
+                    metrics=metrics, on_connect=self._hello if compression or self._types else None,
+                )
+            self._endpoints.append(endpoint)
 
     def __enter__(self):
+        if self.framed:
+            # open the first connections now, rather than on the first requests
+            errors = []
+            for endpoint in self._endpoints:
+                try:
+                    endpoint.pool.checkin(endpoint.pool.checkout())
+                except OSError as ex:
+                    errors.append(ex)
+            if len(errors) == len(self._endpoints):
+                raise errors[0]
         return self
 
     def __exit__(self, exc_type, exc_value, exc_tb):
-        pass
+        self.close()
+
+    def close(self):
+        """Send the queued one-way requests, then close the connections."""
+        with self._one_way_ready:
+            self._closed = True
+            self._one_way_ready.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+        try:
+            self._flushOneWay()
+        finally:
+            for endpoint in self._endpoints:
+                if endpoint.pool is not None:
+                    endpoint.pool.close()
+            if self._hedging_executor is not None:
+                self._hedging_executor.shutdown(wait=False)
+
+    @property
+    def ejected(self):
+        """Endpoints currently not receiving requests after too many failures."""
+        now = time.monotonic()
+        return [e for e in self._endpoints if e.ejected_until > now]
+
+    @contextmanager
+    def _endpoint(self, used=None):
+        """Choose the endpoint of one request, and keep track of its outstanding requests and failures.
+
+        Endpoints in the used list are avoided if possible, the chosen one is added to it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            # if every endpoint is ejected, try them all rather than failing right away
+            endpoints = [e for e in self._endpoints if e.ejected_until <= now] or self._endpoints
+            if used:
+                endpoints = [e for e in endpoints if e not in used] or endpoints
+            endpoint = self.strategy.choose(endpoints)
+            endpoint.outstanding += 1
+            if used is not None:
+                used.append(endpoint)
+        try:
+            yield endpoint
+        except OSError:
+            # time outs and connection errors, eject endpoints failing eject_after times in a row
+            with self._lock:
+                endpoint.failures += 1
+                if endpoint.failures >= self.eject_after:
+                    endpoint.failures = 0
+                    endpoint.ejected_until = time.monotonic() + self.ejection_time
+            raise
+        else:
+            endpoint.failures = 0
+        finally:
+            with self._lock:
+                endpoint.outstanding -= 1
+
+    def _deadline(self, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        return None if timeout is None else time.monotonic() + timeout
+
+    def _execute(self, request, timeout=None):
+        """Send a request and return its response.
+
+        Raises TimeoutError if the response isn't received within timeout
+        seconds, or the client timeout by default; connecting, sending and
+        receiving all count toward it.
+        """
+        deadline = self._deadline(timeout)
+        st = stages(self.metrics)
+        data = request.serialize(self._types)
+        st.stage("serialize")
+        send = lambda: self._send(type(request), data, deadline, st)
+        try:
+            if self.cache is not None:
+                response = self.cache.get(type(request), data, send, _remaining(deadline))
+            else:
+                response = send()[0]
+        except OSError:
+            self._count("transport_errors", type(request).__name__)
+            raise
+        st.end(type(request).__name__)
+        return response
+
+    def _count(self, name, packet_type, value=1):
+        if self.metrics is not None:
+            self.metrics.count(name, packet_type, value)
+
+    def _send(self, request_class, data, deadline, st=NO_STAGES):
+        """Send a serialized request, returns (response, size of the serialized response)."""
+        if self.hedging is None or not self.hedging.isHedged(request_class):
+            result = self._attempt(data, deadline, st=st)
+        else:
+            result = self._sendHedged(request_class, data, deadline)
+        packet_type = request_class.__name__
+        self._count("requests", packet_type)
+        self._count("request_bytes", packet_type, len(data))
+        self._count("response_bytes", packet_type, result[1])
+        if result[0] is not None:
+            self._count("response." + type(result[0]).__name__, packet_type)
+        return result
+
+    def _sendHedged(self, request_class, data, deadline):
+        used = []
+        def attempt(call=None):
+            # attempts run concurrently, each times its own stages
+            st = stages(self.metrics)
+            start = time.monotonic()
+            result = self._attempt(data, deadline, used, st, call)
+            self.hedging.record(request_class, time.monotonic() - start)
+            st.end(request_class.__name__, total=False)
+            return result
+
+        delay = self.hedging.delay(request_class)
+        if deadline is not None:
+            delay = max(0, min(delay, deadline - time.monotonic()))
+        call = _HedgedCall(self._hedging_executor, delay, attempt)
+        try:
+            # the original request runs on this thread, it starts the copy when late
+            return attempt(call)
+        except _HedgeWon:
+            self.hedging.wins += 1
+            return call.hedge.result()
+        except Exception as ex:
+            if call.hedge is None:
+                raise
+            error = ex
+        finally:
+            if call.hedge is not None:
+                self.hedging.hedged += 1
+        try:
+            result = call.hedge.result()
+        except Exception:
+            raise error
+        self.hedging.wins += 1
+        return result
+
+    def _attempt(self, data, deadline, used=None, st=NO_STAGES, call=None):
+        types = None
+        if self.framed:
+            _, response_data, types = self._roundTrip(data, deadline=deadline, used=used, st=st, call=call)
+        else:
+            with self._endpoint(used) as endpoint, \
+                    endpoint.transport.connect(_remaining(deadline)) as s:
+                st.stage("connect")
+                _setDeadline(s, deadline)
+                s.sendall(data)
+                st.stage("send")
+                self._waitFirstByte(s, deadline, st, call)
+                response_data = receive(s, self.buffer_size, deadline)
+                st.stage("receive")
+        response = self._deserialize(response_data, types)
+        st.stage("deserialize")
+        return response, len(response_data)
+
+    def _waitFirstByte(self, sock, deadline, st, call=None):
+        if call is not None:
+            call.waitFirstByte(sock, deadline)
+            st.stage("wait")
+        # only to time the wait separately from the receive
+        elif st is not NO_STAGES:
+            _setDeadline(sock, deadline)
+            sock.recv(1, socket.MSG_PEEK)
+            st.stage("wait")
+
+    def _sendFrame(self, endpoint, sock, data, flags, deadline):
+        """Send a request frame as the handshake of the connection requires, returns the Handshake."""
+        handshake = endpoint.pool.session(sock) or NO_HANDSHAKE
+        if handshake.types is not self._types:
+            data = self._reserialize(data, flags, handshake.types)
+        data, compressed = compressPayload(handshake.compression, self.compression_threshold, data)
+        _setDeadline(sock, deadline)
+        sendFrame(sock, data, flags | compressed)
+        return handshake
+
+    def _roundTrip(self, data, flags=0, deadline=None, used=None, st=NO_STAGES, call=None):
+        """Send a frame and receive the response, returns (flags, payload, PacketTypes of the payload).
+
+        call is the _HedgedCall of the original request of a hedged call.
+        """
+        with self._endpoint(used) as endpoint, endpoint.pool.connection(_remaining(deadline)) as sock:
+            st.stage("connect")
+            handshake = self._sendFrame(endpoint, sock, data, flags, deadline)
+            algorithm = handshake.compression
+            st.stage("send")
+            self._waitFirstByte(sock, deadline, st, call)
+            frame = receiveFrame(sock, deadline)
+            if frame is None:
+                raise ConnectionError("Connection closed by server before response")
+            st.stage("receive")
+            sock.settimeout(endpoint.pool.timeout)
+        flags, payload = frame
+        return flags, decompressPayload(algorithm, flags, payload), handshake.types
+
+    def _reserialize(self, data, flags, types):
+        # the connection doesn't use the type ids the request was serialized with
+        if flags & FLAG_BATCH:
+            return encodeBatch([self._reserialize(item, 0, types) for item in decodeBatch(data)])
+        return self._registry.deserialize(data, self._types).serialize(types)
+
+    def _hello(self, sock, deadline=None):
+        """Handshake of a connection, returns the Handshake picked by the server."""
+        features = {"compression": ",".join(self.compression or ()), "one_way": "1"}
+        if self._types is not None:
+            features["api"] = apiFeature(self._types)
+        _setDeadline(sock, deadline)
+        sendFrame(sock, encodeHello(features), FLAG_HELLO)
+        frame = receiveFrame(sock, deadline)
+        if frame is None:
+            raise ConnectionError("Connection closed by server during handshake")
+        flags, payload = frame
+        if not flags & FLAG_HELLO:
+            # the server doesn't know about handshakes, and answered with an error
+            return NO_HANDSHAKE
+        features = decodeHello(payload)
+        return Handshake(
+            features.get("compression") or None, negotiateTypes(self._registry, features.get("api")),
+            features.get("one_way") == "1",
+        )
+
+    def _deserialize(self, response_data, types=None):
+        if not response_data:
+            return None
+        return self._registry.deserialize(memoryview(response_data), types)
+
+    def _executeBatch(self, requests, timeout=None):
+        """Send several requests in a single frame, returns their responses in the same order.
+
+        The server answers each failing request with its error handler, so
+        one error doesn't fail the whole batch. Needs a framed client.
+        """
+        if not self.framed:
+            raise ValueError("Batches need a framed RpcClient")
+        data = encodeBatch([r.serialize(self._types) for r in requests])
+        flags, payload, types = self._roundTrip(data, FLAG_BATCH, self._deadline(timeout))
+        if not flags & FLAG_BATCH:
+            raise ConnectionError("Server answered a batch with a single response")
+        items = decodeBatch(payload)
+        if len(items) != len(requests):
+            raise ConnectionError(f"Server answered {len(items)} of {len(requests)} batched requests")
+        return [self._deserialize(item, types) for item in items]
+
+    def _executeStream(self, request, timeout=None):
+        """Send a request answered with a stream of responses, yields them as they are received.
+
+        timeout applies to the wait for each frame of the stream. The
+        connection is used until the end of the stream: if the iteration
+        stops before, the connection is closed. Needs a framed client.
+        """
+        if not self.framed:
+            raise ValueError("Streams need a framed RpcClient")
+        data = request.serialize(self._types)
+        packet_type = type(request).__name__
+        self._count("requests", packet_type)
+        self._count("request_bytes", packet_type, len(data))
+        deadline = self._deadline(timeout)
+        with self._endpoint() as endpoint, endpoint.pool.connection(_remaining(deadline)) as sock:
+            handshake = self._sendFrame(endpoint, sock, data, FLAG_STREAM, deadline)
+            while True:
+                frame = receiveFrame(sock, self._deadline(timeout))
+                if frame is None:
+                    raise ConnectionError("Connection closed by server before the end of the stream")
+                flags, payload = frame
+                if not flags & FLAG_STREAM:
+                    raise ConnectionError("Server answered a stream with a single response")
+                if not payload:
+                    break
+                self._count("response_bytes", packet_type, len(payload))
+                payload = decompressPayload(handshake.compression, flags, payload)
+                for item in decodeBatch(payload) if flags & FLAG_BATCH else [payload]:
+                    yield self._deserialize(item, handshake.types)
+            sock.settimeout(endpoint.pool.timeout)
+
+    def _executeOneWay(self, request):
+        """Queue a request the server doesn't answer, it is sent in a batch with the next ones.
+
+        Returns without waiting unless the batch is full, which is then sent
+        right away. Requests are sent in order, at most once: if a batch
+        fails in the background, its error is raised by the next call.
+        Needs a framed client, and a server with the "one_way" handshake
+        feature: other servers would answer them on a connection nobody
+        reads, so a batch for such a server fails with ConnectionError.
+        """
+        if not self.framed:
+            raise ValueError("One-way requests need a framed RpcClient")
+        data = request.serialize(self._types)
+        with self._one_way_ready:
+            self._raiseOneWayError()
+            self._one_way.append(data)
+            self._one_way_bytes += len(data)
+            full = len(self._one_way) >= self.batch_count or self._one_way_bytes >= self.batch_bytes
+            if not full and len(self._one_way) == 1:
+                self._one_way_deadline = time.monotonic() + self.linger
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flushLingering, name="RpcClient-linger", daemon=True)
+                    self._flusher.start()
+                self._one_way_ready.notify()
+        if full:
+            self._flushOneWay()
+
+    def flush(self):
+        """Send the queued one-way requests now."""
+        with self._one_way_ready:
+            self._raiseOneWayError()
+        self._flushOneWay()
+
+    def _raiseOneWayError(self):
+        # called with _one_way_ready held
+        error, self._one_way_error = self._one_way_error, None
+        if error is not None:
+            raise error
+
+    def _flushOneWay(self):
+        with self._one_way_send:
+            with self._one_way_ready:
+                batch = self._one_way
+                self._one_way = []
+                self._one_way_bytes = 0
+                self._one_way_deadline = None
+            if not batch:
+                return
+            if len(batch) == 1:
+                data, flags = batch[0], FLAG_ONE_WAY
+            else:
+                data, flags = encodeBatch(batch), FLAG_ONE_WAY | FLAG_BATCH
+            deadline = self._deadline(None)
+            try:
+                with self._endpoint() as endpoint, endpoint.pool.connection(_remaining(deadline)) as sock:
+                    supported = self._oneWayHandshake(endpoint, sock, deadline).one_way
+                    if supported:
+                        self._sendFrame(endpoint, sock, data, flags, deadline)
+                    sock.settimeout(endpoint.pool.timeout)
+            except OSError:
+                self._count("transport_errors", None)
+                raise
+            if not supported:
+                raise ConnectionError(f"{endpoint.transport} doesn't support one-way requests")
+            self._count("one_way_batches", None)
+            self._count("one_way_requests", None, len(batch))
+
+    def _oneWayHandshake(self, endpoint, sock, deadline):
+        # connections without compression or compact types skip the handshake until they need it
+        handshake = endpoint.pool.session(sock)
+        if handshake is None:
+            handshake = self._hello(sock, deadline)
+            endpoint.pool.setSession(sock, handshake)
+        return handshake
+
+    def _flushLingering(self):
+        # background thread sending the batches that are not full after linger seconds
+        while True:
+            with self._one_way_ready:
+                while not self._closed:
+                    # no deadline: nothing queued, or a full batch being sent by its last caller
+                    deadline = self._one_way_deadline
+                    if deadline is not None and time.monotonic() >= deadline:
+                        break
+                    self._one_way_ready.wait(None if deadline is None else deadline - time.monotonic())
+                if self._closed:
+                    return
+            try:
+                self._flushOneWay()
+            except OSError as ex:
+                with self._one_way_ready:
+                    self._one_way_error = ex
+
+
+class _AsyncConnection:
+    """One multiplexed connection: requests are tagged with an id and matched to their response."""
+
+    def __init__(self, registry, reader, writer):
+        self._registry = registry
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count(1)
+        # request id -> future of the response packet
+        self._pending = {}
+        self._reader_task = asyncio.create_task(self._readResponses())
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    @property
+    def closed(self):
+        return self._reader_task.done()
+
+    async def _readResponses(self):
+        error = ConnectionError("Connection closed by server")
+        try:
+            while True:
+                frame = await readFrameAsync(self._reader)
+                if frame is None:
+                    break
+                _, payload = frame
+                (request_id,) = REQUEST_ID.unpack_from(payload)
+                future = self._pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                try:
+                    response_data = memoryview(payload)[REQUEST_ID.size:]
+                    future.set_result(self._registry.deserialize(response_data) if response_data else None)
+                except Exception as ex:
+                    future.set_exception(ex)
+        except Exception as ex:
+            error = ex
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        self._writer.close()
+
+    async def execute(self, data):
+        if self.closed:
+            raise ConnectionError("Connection is closed")
+        request_id = next(self._ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            writeFrameAsync(self._writer, REQUEST_ID.pack(request_id) + data, FLAG_REQUEST_ID)
+            await self._writer.drain()
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
+        await asyncio.gather(self._reader_task, return_exceptions=True)
+
+
+class AsyncRpcClient:
+    """Asyncio RPC client sending many concurrent requests over a few framed connections.
+
+    Each request carries an id so the server can answer out of order; any
+    number of execute() calls can be awaited at the same time. Requests go to
+    the connection with the fewest requests in flight; closed connections
+    are reopened on the next request.
+    """
+
+    def __init__(self, host, registry, port=RPC_DEFAULT_PORT, connections=1):
+        self._registry = registry
+        self.transport = transport(host, port)
+        self._connections = [None] * connections
+        self._connecting = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb):
+        await self.close()
+
+    async def connect(self):
+        async with self._connecting:
+            for i, conn in enumerate(self._connections):
+                if conn is None or conn.closed:
+                    reader, writer = await self.transport.openConnection()
+                    self._connections[i] = _AsyncConnection(self._registry, reader, writer)
+
+    async def close(self):
+        connections = [c for c in self._connections if c is not None]
+        self._connections = [None] * len(self._connections)
+        for conn in connections:
+            await conn.close()
 
-    def _execute(self, request):
+    async def execute(self, request):
         data = request.serialize()
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((self.host, RPC_DEFAULT_PORT))
-            s.sendall(data)
-            response_data = receive(s)
-            return self._registry.deserialize(response_data)
+        if any(c is None or c.closed for c in self._connections):
+            await self.connect()
+        conn = min(self._connections, key=lambda c: c.in_flight)
+        return await conn.execute(data)
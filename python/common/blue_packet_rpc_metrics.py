@@ -0,0 +1,159 @@
+#! /usr/bin/env python3
+"""Measurements of the RPC client and servers.
+
+Both report to a sink: an object with timing(name, packet_type, seconds)
+and count(name, packet_type, value) methods, packet_type being the name of
+the request packet class, or None for connection-level counters.
+
+Timings, one per stage of a call:
+- client: serialize, connect (or get a pooled connection), send, wait (for
+  the first byte of the response), receive, deserialize, and total
+- server: receive (reading and decoding a one-shot request) or deserialize
+  (a framed request), handle, serialize, send (one-shot responses), and total
+
+Counters:
+- client: requests, request_bytes, response_bytes, transport_errors,
+  connections_created and connections_reused
+- server: requests, request_bytes, response_bytes, handler_errors
+- both: response.<class> for each response packet class, so RpcError
+  responses are counted separately from the others
+"""
+
+from bisect import bisect_left
+import threading
+import time
+
+
+class MetricsSink:
+    """Sink ignoring everything, subclass it to forward the measurements elsewhere."""
+
+    def timing(self, name, packet_type, seconds):
+        pass
+
+    def count(self, name, packet_type, value=1):
+        pass
+
+
+class Histogram:
+    """Latency histogram with fixed log-scale buckets, 10 per decade from 1 microsecond to 100 seconds."""
+
+    BOUNDS = tuple(1e-6 * 10 ** (i / 10) for i in range(81))
+
+    def __init__(self):
+        # the last bucket holds everything above the last bound
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        self.buckets[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, capped to the largest value."""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+
+
+class RpcMetrics(MetricsSink):
+    """In-process sink: a Histogram per timing and a total per counter, both per packet type."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (name, packet type) -> Histogram
+        self._histograms = {}
+        # (name, packet type) -> total
+        self._counters = {}
+
+    def timing(self, name, packet_type, seconds):
+        key = (name, packet_type)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.record(seconds)
+
+    def count(self, name, packet_type, value=1):
+        key = (name, packet_type)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def histogram(self, name, packet_type):
+        return self._histograms.get((name, packet_type))
+
+    def counter(self, name, packet_type=None):
+        return self._counters.get((name, packet_type), 0)
+
+    def total(self, name):
+        """Sum of a counter over all the packet types."""
+        with self._lock:
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def report(self):
+        """Human readable summary: one line per timing with its percentiles in ms, then the counters."""
+        lines = []
+        with self._lock:
+            for (name, packet_type), h in sorted(self._histograms.items(), key=lambda x: (str(x[0][1]), x[0][0])):
+                lines.append(
+                    f"{packet_type} {name}: n={h.count} mean={h.mean * 1000:.3f}"
+                    f" p50={h.percentile(50) * 1000:.3f} p95={h.percentile(95) * 1000:.3f}"
+                    f" p99={h.percentile(99) * 1000:.3f} max={h.max * 1000:.3f}"
+                )
+            for (name, packet_type), v in sorted(self._counters.items(), key=lambda x: (str(x[0][1]), x[0][0])):
+                lines.append(f"{packet_type} {name}: {v}")
+        return "\n".join(lines)
+
+
+class _Stages:
+    """Times the consecutive stages of one call, reported at the end when its packet type is known."""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.start = self.last = time.perf_counter()
+        self.times = []
+
+    def stage(self, name):
+        now = time.perf_counter()
+        self.times.append((name, now - self.last))
+        self.last = now
+
+    def end(self, packet_type, total=True):
+        for name, seconds in self.times:
+            self.sink.timing(name, packet_type, seconds)
+        if total:
+            self.sink.timing("total", packet_type, time.perf_counter() - self.start)
+
+
+class _NoStages:
+    """Stand-in for _Stages when there's no sink."""
+
+    def stage(self, name):
+        pass
+
+    def end(self, packet_type, total=True):
+        pass
+
+
+NO_STAGES = _NoStages()
+
+
+def stages(sink):
+    return NO_STAGES if sink is None else _Stages(sink)
@@ -0,0 +1,721 @@
+#! /usr/bin/env python3
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.connection import wait
+import asyncio
+import inspect
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from blue_packet_rpc_client import (
+    COMPRESSION, COMPRESSION_THRESHOLD, FLAG_BATCH, FLAG_COMPRESSED, FLAG_HELLO, FLAG_ONE_WAY, FLAG_REQUEST_ID, FLAG_STREAM,
+    NO_HANDSHAKE, REQUEST_ID, RPC_DEFAULT_PORT, Handshake, apiFeature, compressPayload, decodeBatch, decodeHello,
+    decompressPayload, encodeBatch, encodeHello, negotiateTypes, readFrameAsync, receiveFrame, sendFrame, writeFrameAsync,
+)
+from blue_packet_rpc_metrics import stages
+from blue_packet_rpc_transport import TcpTransport, transport
+
+_CHUNK_SIZE = 65536
+
+# The responses of a stream are sent in batches of about this many bytes.
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def receivePacket(sock, registry):
+    """Read one request packet from a connection that is not closed by the client.
+
+    The packet is deserialized as the bytes arrive, so its end is known
+    without any framing. Returns None if the client closed the connection
+    before sending a full packet.
+    """
+    result = _receivePacket(sock, registry)
+    return None if result is None else result[0]
+
+
+def _receivePacket(sock, registry):
+    # returns (packet, size of the serialized packet), or None
+    buffer = bytearray()
+    needed = 1
+    while True:
+        chunk = sock.recv(_CHUNK_SIZE)
+        if chunk == b'':
+            return None
+        buffer.extend(chunk)
+        # parsing every chunk of a large packet again from its start would be quadratic
+        if len(buffer) < needed:
+            continue
+        result = registry.deserializePartial(buffer)
+        if not isinstance(result, int):
+            return result
+        needed = result
+
+
+def _callHandler(handler, packet):
+    # module-level so it can be sent to a worker process
+    return handler(packet)
+
+
+def _responses(result):
+    # the responses of a stream handler: an iterable of packets, one packet, or None
+    if result is None:
+        return ()
+    if hasattr(result, "serialize"):
+        return (result, )
+    return result
+
+
+class _StreamChunker:
+    """Groups the serialized responses of a stream into frames of about chunk_bytes.
+
+    The first response is sent alone, for a short time to first result.
+    """
+
+    def __init__(self, chunk_bytes):
+        self.chunk_bytes = chunk_bytes
+        self.size = 0
+        self._items = []
+        self._chunk_size = 0
+
+    def add(self, data):
+        """Returns the frames to send now, as (payload, flags)."""
+        first = self.size == 0
+        self.size += len(data)
+        self._items.append(data)
+        self._chunk_size += len(data)
+        if first or self._chunk_size >= self.chunk_bytes:
+            return self._flush()
+        return []
+
+    def end(self):
+        """Returns the last frames of the stream, including the end of stream."""
+        return self._flush() + [(b'', FLAG_STREAM)]
+
+    def _flush(self):
+        items, self._items, self._chunk_size = self._items, [], 0
+        if not items:
+            return []
+        if len(items) == 1:
+            return [(items[0], FLAG_STREAM)]
+        return [(encodeBatch(items), FLAG_STREAM | FLAG_BATCH)]
+
+
+class _RpcServerThread(threading.Thread):
+    """Worker thread to execute requests."""
+
+    def __init__(self, server):
+        super().__init__(daemon=True)
+        self._server = server
+
+    def run(self):
+        while True:
+            # Thread doesn't need to sleep because get() is blocking
+            sock = self._server._getJob(self)
+            if sock is None:
+                # received message to terminate
+                return
+            try:
+                if self._server.framed:
+                    self._runFramed(sock)
+                else:
+                    self._runOneShot(sock)
+            except Exception:
+                # a bad connection must not take the worker thread down with it
+                traceback.print_exc()
+            finally:
+                sock.close()
+
+    def _runOneShot(self, sock):
+        server = self._server
+        st = stages(server.metrics)
+        request, size = None, 0
+        try:
+            result = _receivePacket(sock, server._registry)
+            if result is None:
+                return
+            request, size = result
+            st.stage("receive")
+            response = server.execute(request)
+            st.stage("handle")
+        except Exception as ex:
+            response = server._executeError(ex, request)
+        data = b'' if response is None else response.serialize()
+        st.stage("serialize")
+        if data:
+            sock.sendall(data)
+        st.stage("send")
+        server._report(st, request, size, response, len(data))
+
+    def _runFramed(self, sock):
+        server = self._server
+        handshake = NO_HANDSHAKE
+        while True:
+            frame = receiveFrame(sock)
+            if frame is None:
+                return
+            flags, payload = frame
+            if flags & FLAG_HELLO:
+                answer, handshake = server._hello(payload)
+                sendFrame(sock, answer, FLAG_HELLO)
+                continue
+            prefix = b''
+            if flags & FLAG_REQUEST_ID:
+                prefix = bytes(payload[:REQUEST_ID.size])
+                payload = payload[REQUEST_ID.size:]
+            payload = decompressPayload(handshake.compression, flags, payload)
+            if flags & FLAG_ONE_WAY:
+                for item in decodeBatch(payload) if flags & FLAG_BATCH else [payload]:
+                    self._executeData(item, handshake.types, one_way=True)
+                continue
+            if flags & FLAG_STREAM:
+                chunker = _StreamChunker(server.stream_chunk_bytes)
+                try:
+                    for data in self._executeStream(payload, handshake.types, chunker):
+                        self._sendStream(sock, prefix, chunker.add(data), handshake)
+                    self._sendStream(sock, prefix, chunker.end(), handshake)
+                except ConnectionError:
+                    # the client stopped reading the stream and closed the connection
+                    return
+                continue
+            if flags & FLAG_BATCH:
+                data = encodeBatch([self._executeData(item, handshake.types) for item in decodeBatch(payload)])
+            else:
+                data = self._executeData(payload, handshake.types)
+            data, compressed = compressPayload(handshake.compression, server.compression_threshold, data)
+            sendFrame(sock, prefix + data, flags & ~FLAG_COMPRESSED | compressed)
+
+    def _sendStream(self, sock, prefix, frames, handshake):
+        for data, flags in frames:
+            data, compressed = compressPayload(handshake.compression, self._server.compression_threshold, data)
+            sendFrame(sock, prefix + data, flags | compressed)
+
+    def _executeStream(self, payload, types, chunker):
+        """Yields the serialized responses of a stream request, ending with the error handler's if it fails."""
+        server = self._server
+        st = stages(server.metrics)
+        request = None
+        try:
+            request = server._registry.deserialize(payload, types)
+            st.stage("deserialize")
+            for response in _responses(server.execute(request)):
+                yield response.serialize(types)
+        except Exception as ex:
+            response = server._executeError(ex, request)
+            if response is not None:
+                yield response.serialize(types)
+        st.stage("stream")
+        server._report(st, request, len(payload), None, chunker.size)
+
+    def _executeData(self, payload, types=None, one_way=False):
+        server = self._server
+        st = stages(server.metrics)
+        request = None
+        try:
+            request = server._registry.deserialize(payload, types)
+            st.stage("deserialize")
+            response = server.execute(request)
+            st.stage("handle")
+            # nobody waits for the response of a one-way request
+            data = b'' if response is None or one_way else response.serialize(types)
+        except Exception as ex:
+            # also when the response can't be serialized, e.g. the generator
+            # of a stream handler called without a stream request
+            response = server._executeError(ex, request)
+            data = b'' if response is None or one_way else response.serialize(types)
+        if one_way:
+            response = None
+        st.stage("serialize")
+        server._report(st, request, len(payload), response, len(data))
+        return data
+
+
+class _RpcDispatcher:
+    """Dispatch of request packets to the handler declared for their class."""
+
+    def __init__(self, registry):
+        self._registry = registry
+        self._dispatch_handler = {}
+        self._error_handler = None
+        self.framed = False
+        self.metrics = None
+        self.compression = ()
+        self.compression_threshold = COMPRESSION_THRESHOLD
+        self.stream_chunk_bytes = STREAM_CHUNK_BYTES
+
+    def _handler(self, packet):
+        handler = self._dispatch_handler.get(type(packet))
+        if handler is None:
+            raise Exception(f"No handler for packet class: {type(packet).__name__}")
+        return handler
+
+    def executeError(self, ex):
+        """Execute the exception handler, or print the stack trace if there's none."""
+        if self._error_handler is None:
+            traceback.print_exception(ex)
+            return None
+        return self._error_handler(ex)
+
+    def _executeError(self, ex, request):
+        if self.metrics is not None:
+            self.metrics.count("handler_errors", None if request is None else type(request).__name__)
+        return self.executeError(ex)
+
+    def _report(self, st, request, request_size, response, response_size):
+        if self.metrics is None:
+            return
+        packet_type = None if request is None else type(request).__name__
+        self.metrics.count("requests", packet_type)
+        self.metrics.count("request_bytes", packet_type, request_size)
+        self.metrics.count("response_bytes", packet_type, response_size)
+        if response is not None:
+            self.metrics.count("response." + type(response).__name__, packet_type)
+        st.end(packet_type)
+
+    def _hello(self, payload):
+        """Answer the handshake of a framed connection, returns (answer payload, Handshake)."""
+        features = decodeHello(payload)
+        offered = features.get("compression", "").split(",")
+        algorithm = next((a for a in offered if a in self.compression), None)
+        # compact type ids if every API version offered is registered here too
+        types = negotiateTypes(self._registry, features.get("api"))
+        answer = {"compression": algorithm or ""}
+        if "api" in features:
+            answer["api"] = apiFeature(types)
+        if "one_way" in features:
+            answer["one_way"] = "1"
+        return encodeHello(answer), Handshake(algorithm, types)
+
+    def setCompression(self, algorithms=tuple(COMPRESSION), threshold=COMPRESSION_THRESHOLD):
+        """Compress the frames of the clients asking for one of the algorithms, if at least threshold bytes."""
+        self.compression = tuple(algorithms)
+        self.compression_threshold = threshold
+        return self
+
+    def setMetrics(self, sink):
+        """Report the stages and sizes of every request to a sink, see blue_packet_rpc_metrics."""
+        self.metrics = sink
+        return self
+
+    def setFramed(self, framed):
+        """Keep connections open and read length-prefixed frames, see blue_packet_rpc_client."""
+        self.framed = framed
+        return self
+
+    def onError(self, handler):
+        """Declare the function building a response packet from an exception."""
+        self._error_handler = handler
+        return self
+
+    def onReceive(self, packet_class, handler):
+        """Declare the function handling one packet class, returning the response packet (ignored if one-way).
+
+        Requests sent as streams (see RpcClient._executeStream()) can be
+        answered with an iterable of response packets, e.g. a generator:
+        they are sent while the handler produces them.
+        """
+        self._dispatch_handler[packet_class] = handler
+        return self
+
+
+class RpcServer(_RpcDispatcher):
+    """Server waiting for incoming requests ("jobs") and offering them to a pool of worker threads.
+
+    Requests are dispatched by packet class to the handlers declared with
+    onReceive(). With processes > 0, handlers run in a pool of worker
+    processes so CPU-bound handlers can use several cores; they must then
+    be module-level functions, and packets are pickled to and from the workers.
+    """
+
+    DEFAULT_NUM_THREAD = 10
+
+    def __init__(self, registry, processes=0):
+        super().__init__(registry)
+        self._jobs = queue.Queue(1000)
+        self._thread_pool = []
+        self._lock = threading.Lock()
+        self._listener = None
+        self._running = False
+        self._process_pool = ProcessPoolExecutor(processes) if processes > 0 else None
+
+    def run(self, num_threads=DEFAULT_NUM_THREAD, port=RPC_DEFAULT_PORT, reuse_port=False, address=None):
+        """Run in an infinite loop, until shutdown() is called or the port can't be used.
+
+        With reuse_port, several processes can listen to the same port and
+        the kernel spreads the connections between them (SO_REUSEPORT).
+        address replaces port with another endpoint, e.g. "unix:///run/bp.sock",
+        see blue_packet_rpc_transport.
+        """
+        if self._process_pool is not None:
+            # start the handler processes now: forked later on, by the first request
+            # of a worker thread, they could leave that request hanging
+            self._process_pool.submit(int).result()
+        self.addThreads(num_threads)
+        self._running = True
+        try:
+            listen_to = TcpTransport("", port) if address is None else transport(address, port)
+            listener = listen_to.listen(50 * num_threads, reuse_port)
+            self._listener = listener
+            print("[RpcServer] listening to", address or f"port {port}", file=sys.stderr)
+            while True:
+                sock, _ = listener.accept()
+                listen_to.configure(sock)
+                self._jobs.put(sock)
+        except OSError:
+            if self._running:
+                traceback.print_exc()
+        with self._lock:
+            threads = list(self._thread_pool)
+        self.removeThreads(len(threads))
+        # drain: let the workers finish the connections they are serving
+        for t in threads:
+            t.join()
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+        print("[RpcServer] exiting", file=sys.stderr)
+
+    def shutdown(self):
+        """Stop accepting connections, run() returns once the workers are notified."""
+        self._running = False
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            # wakes up the blocking accept()
+            listener.shutdown(socket.SHUT_RDWR)
+            listener.close()
+
+    def addThreads(self, num):
+        """Increase the size of the thread pool, can be called while running."""
+        print("[RpcServer] Adding", num, "threads", file=sys.stderr)
+        for _ in range(num):
+            t = _RpcServerThread(self)
+            with self._lock:
+                self._thread_pool.append(t)
+            t.start()
+
+    def removeThreads(self, num):
+        """Decrease the size of the thread pool, idle threads exit when they get the termination signal."""
+        print("[RpcServer] Notifying", num, "threads to exit when done processing", file=sys.stderr)
+        for _ in range(num):
+            self._jobs.put(None)
+
+    def _getJob(self, t):
+        sock = self._jobs.get()
+        if sock is None:
+            with self._lock:
+                self._thread_pool.remove(t)
+        return sock
+
+    def execute(self, packet):
+        """Execute the handler associated with the class of the request packet."""
+        handler = self._handler(packet)
+        # generators can't be sent back from a worker process
+        if self._process_pool is not None and not inspect.isgeneratorfunction(handler):
+            return self._process_pool.submit(_callHandler, handler, packet).result()
+        return handler(packet)
+
+
+class AsyncRpcServer(_RpcDispatcher):
+    """Asyncio server holding many connections on a single thread.
+
+    Handlers can be plain functions, called on the event loop (or in
+    executor, if given), or coroutine functions. In framed mode, requests
+    sent with FLAG_REQUEST_ID are executed concurrently, up to
+    max_in_flight per connection: the server stops reading a connection
+    that reaches the limit until some of its responses are sent. Other
+    framed requests are executed in order, one-way requests too.
+    """
+
+    def __init__(self, registry, max_in_flight=64, executor=None):
+        super().__init__(registry)
+        self.max_in_flight = max_in_flight
+        self._executor = executor
+        self._server = None
+        self._transport = None
+
+    def run(self, port=RPC_DEFAULT_PORT, reuse_port=False, address=None):
+        """Run in an infinite loop, until shutdown() is called, see RpcServer.run() for the arguments."""
+        try:
+            asyncio.run(self.serve(port, reuse_port, address))
+        except asyncio.CancelledError:
+            pass
+        print("[AsyncRpcServer] exiting", file=sys.stderr)
+
+    async def serve(self, port=RPC_DEFAULT_PORT, reuse_port=False, address=None):
+        self._loop = asyncio.get_running_loop()
+        self._transport = TcpTransport("", port) if address is None else transport(address, port)
+        self._server = await self._transport.startServer(self._handleConnection, 1024, reuse_port)
+        print("[AsyncRpcServer] listening to", address or f"port {port}", file=sys.stderr)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def shutdown(self):
+        """Stop the server, can be called from any thread."""
+        if self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+    async def execute(self, packet):
+        """Execute the handler associated with the class of the request packet."""
+        handler = self._handler(packet)
+        if inspect.iscoroutinefunction(handler):
+            return await handler(packet)
+        if inspect.isasyncgenfunction(handler):
+            return handler(packet)
+        if self._executor is not None:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, handler, packet)
+        return handler(packet)
+
+    async def _handleConnection(self, reader, writer):
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            self._transport.configure(sock)
+        try:
+            if self.framed:
+                await self._runFramed(reader, writer)
+            else:
+                await self._runOneShot(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _runOneShot(self, reader, writer):
+        st = stages(self.metrics)
+        request, size = None, 0
+        buffer = bytearray()
+        needed = 1
+        try:
+            while True:
+                chunk = await reader.read(_CHUNK_SIZE)
+                if not chunk:
+                    return
+                buffer.extend(chunk)
+                # as _receivePacket(): parse again only once the short read can succeed
+                if len(buffer) < needed:
+                    continue
+                result = self._registry.deserializePartial(buffer)
+                if not isinstance(result, int):
+                    break
+                needed = result
+            request, size = result
+            st.stage("receive")
+            response = await self.execute(request)
+            st.stage("handle")
+        except ConnectionError:
+            raise
+        except Exception as ex:
+            response = self._executeError(ex, request)
+        data = b'' if response is None else response.serialize()
+        st.stage("serialize")
+        if data:
+            writer.write(data)
+            await writer.drain()
+        st.stage("send")
+        self._report(st, request, size, response, len(data))
+
+    async def _executeData(self, payload, types=None, one_way=False):
+        st = stages(self.metrics)
+        request = None
+        try:
+            request = self._registry.deserialize(payload, types)
+            st.stage("deserialize")
+            response = await self.execute(request)
+            st.stage("handle")
+            # nobody waits for the response of a one-way request
+            data = b'' if response is None or one_way else response.serialize(types)
+        except Exception as ex:
+            # also when the response can't be serialized, e.g. the generator
+            # of a stream handler called without a stream request
+            response = self._executeError(ex, request)
+            data = b'' if response is None or one_way else response.serialize(types)
+        if one_way:
+            response = None
+        st.stage("serialize")
+        self._report(st, request, len(payload), response, len(data))
+        return data
+
+    async def _sendStream(self, writer, prefix, frames, handshake):
+        if not frames:
+            return
+        for data, flags in frames:
+            data, compressed = compressPayload(handshake.compression, self.compression_threshold, data)
+            writeFrameAsync(writer, prefix + data, flags | compressed)
+        # backpressure: don't produce responses faster than the client reads them
+        await writer.drain()
+
+    async def _executeStream(self, payload, types, chunker):
+        """Yields the serialized responses of a stream request, ending with the error handler's if it fails.
+
+        Handlers can return an iterable or an async iterable of packets.
+        """
+        st = stages(self.metrics)
+        request = None
+        try:
+            request = self._registry.deserialize(payload, types)
+            st.stage("deserialize")
+            responses = await self.execute(request)
+            if hasattr(responses, "__aiter__"):
+                async for response in responses:
+                    yield response.serialize(types)
+            else:
+                for response in _responses(responses):
+                    yield response.serialize(types)
+        except Exception as ex:
+            response = self._executeError(ex, request)
+            if response is not None:
+                yield response.serialize(types)
+        st.stage("stream")
+        self._report(st, request, len(payload), None, chunker.size)
+
+    async def _answer(self, reader, writer, flags, prefix, payload, handshake):
+        payload = decompressPayload(handshake.compression, flags, payload)
+        if flags & FLAG_ONE_WAY:
+            # one-way requests are executed in order, and not answered
+            for item in decodeBatch(payload) if flags & FLAG_BATCH else [payload]:
+                await self._executeData(item, handshake.types, one_way=True)
+            return
+        if flags & FLAG_STREAM:
+            chunker = _StreamChunker(self.stream_chunk_bytes)
+            async for data in self._executeStream(payload, handshake.types, chunker):
+                if writer.is_closing() or reader.at_eof():
+                    raise ConnectionResetError("Connection closed by client during a stream")
+                await self._sendStream(writer, prefix, chunker.add(data), handshake)
+            await self._sendStream(writer, prefix, chunker.end(), handshake)
+            return
+        if flags & FLAG_BATCH:
+            # the requests of a batch are executed concurrently
+            items = await asyncio.gather(*(self._executeData(item, handshake.types) for item in decodeBatch(payload)))
+            data = encodeBatch(items)
+        else:
+            data = await self._executeData(payload, handshake.types)
+        data, compressed = compressPayload(handshake.compression, self.compression_threshold, data)
+        writeFrameAsync(writer, prefix + data, flags & ~FLAG_COMPRESSED | compressed)
+        await writer.drain()
+
+    async def _runFramed(self, reader, writer):
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        async def answerConcurrently(*args):
+            try:
+                await self._answer(reader, writer, *args)
+            except Exception:
+                # its client would wait for the response forever: like the threaded
+                # server, log the error and close the connection
+                if not writer.is_closing():
+                    traceback.print_exc()
+                    writer.close()
+            finally:
+                in_flight.release()
+        handshake = NO_HANDSHAKE
+        try:
+            while True:
+                frame = await readFrameAsync(reader)
+                if frame is None:
+                    break
+                flags, payload = frame
+                if flags & FLAG_HELLO:
+                    answer, handshake = self._hello(payload)
+                    writeFrameAsync(writer, answer, FLAG_HELLO)
+                    await writer.drain()
+                    continue
+                if not flags & FLAG_REQUEST_ID:
+                    await self._answer(reader, writer, flags, b'', payload, handshake)
+                    continue
+                # backpressure: don't read more requests than we can have in flight
+                await in_flight.acquire()
+                task = asyncio.create_task(answerConcurrently(
+                    flags, payload[:REQUEST_ID.size], payload[REQUEST_ID.size:], handshake
+                ))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def _runWorker(server_factory, port, run_args):
+    server = server_factory()
+    # the supervisor handles ctrl-c, and asks the workers to drain with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.shutdown())
+    server.run(port=port, reuse_port=True, **run_args)
+
+
+class RpcSupervisor:
+    """Pre-fork supervisor running one RpcServer or AsyncRpcServer per worker process.
+
+    Every worker builds its own server (and registry) with server_factory,
+    binds the same port with SO_REUSEPORT and runs its own accept loop, so
+    handlers are not limited by a single GIL. Workers that die are
+    restarted. On SIGTERM or SIGINT, or shutdown(), workers stop accepting
+    connections and get drain_timeout seconds to finish the ones they serve.
+    """
+
+    RESTART_DELAY = 1.0
+
+    def __init__(self, server_factory, workers=None, drain_timeout=10.0):
+        self._server_factory = server_factory
+        self.workers = workers or os.cpu_count()
+        self.drain_timeout = drain_timeout
+        self._context = multiprocessing.get_context("fork")
+        self._processes = []
+        self._running = False
+
+    def _start(self, port, run_args):
+        # not daemonic, so RpcServer(processes=N) can start its pool in the worker;
+        # _drain() terminates, then kills, the workers that are left
+        p = self._context.Process(target=_runWorker, args=(self._server_factory, port, run_args), daemon=False)
+        p.start()
+        p.started = time.monotonic()
+        return p
+
+    def run(self, port=RPC_DEFAULT_PORT, **run_args):
+        """Run until shutdown() or a termination signal, run_args are passed to each server run()."""
+        self._running = True
+        previous_handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous_handlers[signum] = signal.signal(signum, lambda signum, frame: self.shutdown())
+
+        print("[RpcSupervisor] starting", self.workers, "workers on port", port, file=sys.stderr)
+        self._processes = [self._start(port, run_args) for _ in range(self.workers)]
+        try:
+            while self._running:
+                wait([p.sentinel for p in self._processes], timeout=0.5)
+                for i, p in enumerate(self._processes):
+                    if p.is_alive() or not self._running:
+                        continue
+                    print("[RpcSupervisor] worker", p.pid, "exited with", p.exitcode, file=sys.stderr)
+                    if time.monotonic() - p.started < self.RESTART_DELAY:
+                        # don't spin if workers die right away, e.g. the port can't be used
+                        time.sleep(self.RESTART_DELAY)
+                    self._processes[i] = self._start(port, run_args)
+        finally:
+            self._drain()
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+        print("[RpcSupervisor] exiting", file=sys.stderr)
+
+    def _drain(self):
+        for p in self._processes:
+            if p.is_alive():
+                p.terminate()
+        deadline = time.monotonic() + self.drain_timeout
+        for p in self._processes:
+            p.join(max(0, deadline - time.monotonic()))
+            if p.is_alive():
+                print("[RpcSupervisor] killing worker", p.pid, file=sys.stderr)
+                p.kill()
+                p.join()
+
+    def shutdown(self):
+        self._running = False
+
+    @property
+    def pids(self):
+        return [p.pid for p in self._processes]
@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+"""Transports carrying the RPC connections between clients and servers.
+
+A transport opens client connections and listening sockets, for the
+threaded client and server, and asyncio streams, for the async ones. Any
+object with the same methods as TcpTransport can be used.
+"""
+
+import asyncio
+import os
+import socket
+import stat
+
+UNIX_SCHEME = "unix://"
+
+
+class TcpTransport:
+    """TCP connections to host:port, with Nagle's algorithm disabled."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def __repr__(self):
+        return f"{self.host}:{self.port}"
+
+    def configure(self, sock):
+        """Set the options of a new connection, client or server side."""
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def connect(self, timeout=None):
+        sock = socket.create_connection((self.host, self.port), timeout)
+        try:
+            self.configure(sock)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def listen(self, backlog, reuse_port=False):
+        return socket.create_server((self.host, self.port), backlog=backlog, reuse_port=reuse_port)
+
+    async def openConnection(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.configure(writer.get_extra_info('socket'))
+        return reader, writer
+
+    async def startServer(self, handler, backlog, reuse_port=False):
+        return await asyncio.start_server(handler, self.host or None, self.port, backlog=backlog, reuse_port=reuse_port)
+
+
+class UnixTransport:
+    """Unix domain socket connections, for a client and a server on the same host.
+
+    They skip the TCP stack; a stale socket file left by a previous server
+    is replaced when listening.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return UNIX_SCHEME + self.path
+
+    def configure(self, sock):
+        pass
+
+    def connect(self, timeout=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _removeStale(self):
+        try:
+            if stat.S_ISSOCK(os.stat(self.path).st_mode):
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def listen(self, backlog, reuse_port=False):
+        if reuse_port:
+            raise ValueError("Unix domain sockets can't be shared with reuse_port")
+        self._removeStale()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.path)
+            sock.listen(backlog)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    async def openConnection(self):
+        return await asyncio.open_unix_connection(self.path)
+
+    async def startServer(self, handler, backlog, reuse_port=False):
+        if reuse_port:
+            raise ValueError("Unix domain sockets can't be shared with reuse_port")
+        self._removeStale()
+        return await asyncio.start_unix_server(handler, self.path, backlog=backlog)
+
+
+def transport(endpoint, port):
+    """Transport of an endpoint.
+
+    Args:
+        endpoint: "unix:///path/to/socket", a host name, a (host, port)
+            tuple, or a transport object, returned as is
+        port: port of a host name without one
+    """
+    if isinstance(endpoint, str):
+        if endpoint.startswith(UNIX_SCHEME):
+            return UnixTransport(endpoint[len(UNIX_SCHEME):])
+        return TcpTransport(endpoint, port)
+    if isinstance(endpoint, tuple):
+        return TcpTransport(*endpoint)
+    return endpoint
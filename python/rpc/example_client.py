@@ -4,57 +4,58 @@ import sys
 sys.path.append("../common")
 
 from blue_packet import BluePacketRegistry
-from blue_packet_rpc_client import RPC_DEFAULT_PORT, RpcClient
+from blue_packet_rpc_client import RpcServiceError
+from blue_packet_rpc_metrics import RpcMetrics
 import gen.example.packet as bp
 
 
-class ExampleClient(RpcClient):
-
-    def rpcExec(self, request):
-        response = self._execute(request)
-        if isinstance(response, bp.RpcResult):
-            return response.value
-        elif isinstance(response, bp.RpcError):
-            raise Exception("ERROR - RpcError: " + response.message)
-        else:
-            raise Exception("ERROR - Unexpected response packet: " + str(response))
-
-
-def _makeCalcSum(*values):
+def _callCalcSum(client, *values):
     v = [float(x) for x in values]
-    return bp.CalcSum(values=v)
+    return client.callCalcSum(bp.CalcSum(values=v))
 
 
-def _makeCalcMean(mean_type, *values):
+def _callCalcMean(client, mean_type, *values):
     try:
         t = bp.CalcMean.Type[mean_type]
     except KeyError:
         raise Exception("ERROR - Unknown CalcMean.Type: " + mean_type)
     v = [float(x) for x in values]
-    return bp.CalcMean(type=t, values=v)
+    return client.callCalcMean(bp.CalcMean(type=t, values=v))
 
 
-_REQUEST_MAKER = {
-    "Add": _makeCalcSum,
-    "Mean": _makeCalcMean,
+_OPERATIONS = {
+    "Add": _callCalcSum,
+    "Mean": _callCalcMean,
 }
 
 
 def main():
+    # --metrics: print the time spent in each stage of the request
+    metrics = None
+    if "--metrics" in sys.argv:
+        sys.argv.remove("--metrics")
+        metrics = RpcMetrics()
+    # --framed: talk to a server run with --framed
+    framed = "--framed" in sys.argv
+    if framed:
+        sys.argv.remove("--framed")
+
     registry = BluePacketRegistry()
     registry.register(bp)
     #print("registry =", registry, file=sys.stderr)
 
     op = sys.argv[1]
-    if op not in _REQUEST_MAKER:
+    if op not in _OPERATIONS:
         raise Exception("ERROR - Unknown operation: " + op)
 
-    request_fn = _REQUEST_MAKER[op]
-    request = request_fn(*sys.argv[2:])
-
-    with ExampleClient("127.0.0.1", registry) as client:
-        value = client.rpcExec(request)
-        print(value)
+    with bp.BluePacketServiceClient("127.0.0.1", registry, framed=framed, metrics=metrics) as client:
+        try:
+            response = _OPERATIONS[op](client, *sys.argv[2:])
+        except RpcServiceError as ex:
+            raise Exception("ERROR - RpcError: " + ex.packet.message)
+        print(response.value)
+    if metrics is not None:
+        print(metrics.report(), file=sys.stderr)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+import math
+import sys
+
+sys.path.append("../common")
+
+from blue_packet import BluePacketRegistry
+from blue_packet_rpc_server import AsyncRpcServer, RpcServer, RpcSupervisor
+import gen.example.packet as bp
+
+
+def _values(pk):
+    if not pk.values:
+        raise Exception("No values provided")
+    return pk.values
+
+
+def calculateSum(pk):
+    return bp.RpcResult(value=float(sum(pk.values or [])))
+
+
+def calculateMean(pk):
+    values = _values(pk)
+    if pk.type == bp.CalcMean.Type.Arithmetic:
+        s = sum(values) / len(values)
+    elif pk.type == bp.CalcMean.Type.Geometric:
+        s = math.prod(values) ** (1.0 / len(values))
+    elif pk.type == bp.CalcMean.Type.Harmonic:
+        s = len(values) / sum(1.0 / x for x in values)
+    else:
+        raise Exception("Unsupported CalcMean.Type: " + str(pk.type))
+    return bp.RpcResult(value=s)
+
+
+def errorHandler(ex):
+    return bp.RpcError(message=str(ex))
+
+
+def _option(name, default=0):
+    if name in sys.argv:
+        return int(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+def makeServer():
+    registry = BluePacketRegistry()
+    registry.register(bp)
+
+    if "--async" in sys.argv:
+        server = AsyncRpcServer(registry)
+    else:
+        server = RpcServer(registry, processes=_option("--processes"))
+    return server \
+        .onReceive(bp.CalcSum, calculateSum) \
+        .onReceive(bp.CalcMean, calculateMean) \
+        .onError(errorHandler) \
+        .setFramed("--framed" in sys.argv)
+
+
+def main():
+    """Example implementation of a BluePacket RPC Server for a calculator service.
+
+    Options:
+        --framed: keep client connections open for length-prefixed requests
+        --processes N: run the handlers in N worker processes
+        --async: run an asyncio server on a single thread instead
+        --workers N: pre-fork N server processes sharing the port
+    """
+    workers = _option("--workers")
+    if workers:
+        RpcSupervisor(makeServer, workers=workers).run()
+    else:
+        makeServer().run()
+
+
+if __name__ == '__main__':
+    main()
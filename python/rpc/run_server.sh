@@ -0,0 +1 @@
+python3 ./example_server.py $*
@@ -12,25 +12,43 @@ popd
 
 ./build.sh > run_tests.log 2>&1
 
-echo "=== SERVER ==="
+# arguments are passed to every client, e.g. --framed
+run_client_tests() {
+  echo "=== TESTING ==="
+
+  echo "Clients testing" >> run_tests.log
+  ./run_client.sh "$@" Add 1 2 3 4 >> result_tests.log 2>> run_tests.log
+  ./run_client.sh "$@" Mean Arithmetic 4 36 45 50 75 >> result_tests.log 2>> run_tests.log
+  ./run_client.sh "$@" Mean Geometric 4 36 45 50 75 >> result_tests.log 2>> run_tests.log
+  ./run_client.sh "$@" Mean Harmonic 4 36 45 50 75 >> result_tests.log 2>> run_tests.log
+
+  echo "=== NEGATIVE TESTING ==="
+
+  ./run_client.sh "$@" Fake 1 2 3 4 2>&1 | grep "^Exception" >> result_tests.log 2>> run_tests.log
+  ./run_client.sh "$@" Mean Quantic 1 2 3 4 2>&1 | grep "^Exception" >> result_tests.log 2>> run_tests.log
+  ./run_client.sh "$@" Mean Harmonic 2>&1 | grep "^Exception" >> result_tests.log 2>> run_tests.log
+}
 
 trap 'kill $(jobs -pr)' EXIT
+
+echo "=== JAVA SERVER ==="
 java -cp ../../java/rpc/build example.rpc.ExampleServer >> run_tests.log 2>&1 &
 sleep 1
+run_client_tests
+kill %1
+wait %1 || true
 
-echo "=== TESTING ==="
-
-echo "Clients testing" >> run_tests.log
-./run_client.sh Add 1 2 3 4 >> result_tests.log 2>> run_tests.log
-./run_client.sh Mean Arithmetic 4 36 45 50 75 >> result_tests.log 2>> run_tests.log
-./run_client.sh Mean Geometric 4 36 45 50 75 >> result_tests.log 2>> run_tests.log
-./run_client.sh Mean Harmonic 4 36 45 50 75 >> result_tests.log 2>> run_tests.log
-
-echo "=== NEGATIVE TESTING ==="
+echo "=== JAVA FRAMED SERVER ==="
+java -cp ../../java/rpc/build example.rpc.ExampleServer --framed >> run_tests.log 2>&1 &
+sleep 1
+run_client_tests --framed
+kill %1
+wait %1 || true
 
-./run_client.sh Fake 1 2 3 4 2>&1 | grep "^Exception" >> result_tests.log 2>> run_tests.log
-./run_client.sh Mean Quantic 1 2 3 4 2>&1 | grep "^Exception" >> result_tests.log 2>> run_tests.log
-./run_client.sh Mean Harmonic 2>&1 | grep "^Exception" >> result_tests.log 2>> run_tests.log
+echo "=== PYTHON SERVER ==="
+./run_server.sh >> run_tests.log 2>&1 &
+sleep 1
+run_client_tests
 
 echo "=== RESULTS ==="
 
@@ -1,10 +1,15 @@
 #! /usr/bin/env python3
+import multiprocessing
 import os, sys
+import subprocess
+import tempfile
 import unittest
 
 sys.path.append("../common")
 
-from blue_packet import BluePacketRegistry, FieldTypeException, toSignedByte, toSignedShort, toUnsignedByte, toUnsignedShort
+from blue_packet import BluePacketRegistry, DeltaDecoder, PacketTypes, DeltaEncoder, DictionaryDecoder, DictionaryEncoder, FieldTypeException, toSignedByte, toSignedShort, toUnsignedByte, toUnsignedShort
+from blue_packet_columnar import ColumnarReader, writeColumnar
+from blue_packet_ring import PacketRing
 import gen.test as t
 
 TESTDATA_DIR = "../../testdata/"
@@ -24,6 +29,13 @@ def parameters(*param_list):
 
 _TEST_DATA = {}
 
+
+def _writeRing(name, count):
+  with PacketRing.attach(name) as ring:
+    for i in range(count):
+      ring.write(t.DemoOuter(oInt=i, oString="x" * (i % 100)))
+    ring.closeWriter()
+
 class TestBluePacket(unittest.TestCase):
   _BP_REGISTRY = BluePacketRegistry()
 
@@ -144,6 +156,23 @@ class TestBluePacket(unittest.TestCase):
     bp = self._BP_REGISTRY.deserialize(_TEST_DATA[bin])
     self.assertEqual(str(_TEST_DATA[packet]), str(bp))
 
+  @parameters(
+    ("DemoPacket.bin", "DemoPacket"),
+    ("DemoPacket2.bin", "DemoPacket2"),
+    ("DemoPacket3.bin", "DemoPacket3"),
+    ("DemoPacketU.bin", "DemoPacketU"),
+  )
+  def testDeserializePartial(self, bin, packet):
+    data = _TEST_DATA[bin]
+    for size in range(len(data)):
+      # the size needed is past what's there, but not past the packet
+      needed = self._BP_REGISTRY.deserializePartial(data[:size])
+      self.assertLess(size, needed)
+      self.assertLessEqual(needed, len(data))
+    bp, size = self._BP_REGISTRY.deserializePartial(data + b'next')
+    self.assertEqual(len(data), size)
+    self.assertEqual(str(_TEST_DATA[packet]), str(bp))
+
   @parameters(
     ("DemoPacket.bin", "DemoPacket"),
     ("DemoPacket2.bin", "DemoPacket2"),
@@ -417,6 +446,185 @@ class TestBluePacket(unittest.TestCase):
     actualConvert2 = [p.packetHash for p in d2.convert()]
     self.assertEqual(expectedConvert2, actualConvert2, "List of convertible BluePackets for DemoSecond")
 
+  def testEnumList(self):
+    inner = t.DemoPacket.MyInner(iInteger=1, iEnum=t.DemoPacket.MyEnum.POSSIBLE,
+      aEnum=[t.DemoPacket.MyEnum.WHOKNOWS, t.DemoPacket.MyEnum.DUNNO])
+    packet = self._BP_REGISTRY.deserialize(_TEST_DATA["DemoPacket.bin"])
+    packet.fInner = inner
+    packet.xPacket = t.DemoPacket3(possible=[t.DemoEnum.SURE, t.DemoEnum.YES] * 150)
+    bp = self._BP_REGISTRY.deserialize(packet.serialize())
+    self.assertEqual(str(packet), str(bp))
+    self.assertIs(t.DemoEnum.SURE, bp.xPacket.possible[298])
+
+  def testColumnar(self):
+    u1 = _TEST_DATA["DemoPacketU"]
+    u2 = t.DemoUnsigned(ub=7, us=8, lub=[], lus=[9], a0=False, b1=True, c2=True)
+    p1 = _TEST_DATA["DemoPacket"]
+    p2 = t.DemoPacket(fByte=-5, fShort=0, fInt=-12, fLong=0, fFloat=0.0, fDouble=0.0, fString="x")
+    with tempfile.TemporaryDirectory() as tmp:
+      path_u = os.path.join(tmp, "u.bpc")
+      with open(path_u, "wb") as f:
+        writeColumnar(f, t.DemoUnsigned, [u1, u2])
+      with ColumnarReader(path_u, self._BP_REGISTRY) as r:
+        self.assertEqual(2, r.numRecords)
+        self.assertEqual([str(u1), str(u2)], [str(x) for x in r.readRecords()])
+        self.assertEqual([[201, 5], []], r.readColumn("lub"))
+        self.assertEqual((7, 200), r.stats("ub"))
+
+      path_p = os.path.join(tmp, "p.bpc")
+      with open(path_p, "wb") as f:
+        writeColumnar(f, t.DemoPacket, [p1, p2])
+      with ColumnarReader(path_p, self._BP_REGISTRY) as r:
+        self.assertEqual(["abcdefåäöàê", "x"], r.readColumn("fString"))
+        self.assertEqual([t.DemoPacket.MyEnum.MAYBE, t.DemoPacket.MyEnum.DUNNO], r.readColumn("fEnum"))
+        self.assertEqual((-12, 987654321), r.stats("fInt"))
+        view = r.columnView("fInt")
+        self.assertEqual([987654321, -12], view.tolist())
+        view.release()
+        inner, no_inner = r.readColumn("aInner")
+        self.assertEqual([str(x) for x in p1.aInner], [str(x) for x in inner])
+        self.assertEqual([], no_inner)
+        self.assertEqual([str(p1.xPacket), "None"], [str(x) for x in r.readColumn("xPacket")])
+        self.assertEqual([p1.fBoolean, False], r.readColumn("fBoolean"))
+        self.assertAlmostEqual(3.14, r.readColumn("fFloat")[0], places=5)
+        # records are rounded like the wire decoder rounds floats
+        wire = [self._BP_REGISTRY.deserialize(p.serialize()) for p in (p1, p2)]
+        self.assertEqual([str(x) for x in wire], [str(x) for x in r.readRecords()])
+        self.assertEqual(3.14, r.readRecords(["fFloat"])[0].fFloat)
+
+      path_p2 = os.path.join(tmp, "p2.bpc")
+      p3 = _TEST_DATA["DemoPacket2"]
+      with open(path_p2, "wb") as f:
+        writeColumnar(f, t.DemoPacket2, [p3])
+      with ColumnarReader(path_p2, self._BP_REGISTRY) as r:
+        self.assertEqual([3.14], r.readRecords(["aFloat"])[0].aFloat)
+
+  def testDelta(self):
+    encoder = DeltaEncoder(keyframe_interval=3)
+    decoder = DeltaDecoder(self._BP_REGISTRY)
+    p = self._BP_REGISTRY.deserialize(_TEST_DATA["DemoPacket.bin"])
+    full = p.serialize()
+
+    sizes = []
+    for i in range(4):
+      p.fInt = i
+      p.aInner[1].iInteger = i
+      data = encoder.encode(p)
+      sizes.append(len(data))
+      self.assertEqual(str(p), str(decoder.decode(data)))
+    self.assertEqual(len(full) + 1, sizes[0])
+    self.assertLess(sizes[1], len(full) / 2)
+    self.assertEqual(len(full) + 1, sizes[3])
+
+    p2 = _TEST_DATA["DemoPacket2"]
+    self.assertEqual(str(p2), str(decoder.decode(encoder.encode(p2))))
+    self.assertEqual(str(p), str(decoder.decode(encoder.encode(p))))
+
+    with self.assertRaises(Exception):
+      DeltaDecoder(self._BP_REGISTRY).decode(data[:8] + encoder.encode(p)[8:])
+
+  def testDictionary(self):
+    encoder = DictionaryEncoder(max_size=4)
+    decoder = DictionaryDecoder(self._BP_REGISTRY, max_size=4)
+    p = _TEST_DATA["DemoPacket2"]
+    first = encoder.encode(p)
+    second = encoder.encode(p)
+    self.assertLess(len(second), len(first))
+    self.assertEqual(str(p), str(decoder.decode(first)))
+    decoded = decoder.decode(second)
+    self.assertEqual(str(p), str(decoded))
+    self.assertIs(decoded.aString[1], decoder.decode(encoder.encode(p)).aString[1])
+
+    packets = [_TEST_DATA["DemoPacket"], p, _TEST_DATA["DemoPacketU"]]
+    batch = DictionaryDecoder(self._BP_REGISTRY).decodeBatch(DictionaryEncoder().encodeBatch(packets))
+    self.assertEqual([str(x) for x in packets], [str(x) for x in batch])
+
+  def testPacketTypes(self):
+    types = self._BP_REGISTRY.packetTypes()
+    self.assertEqual((t.BluePacketAPI.VERSION,), types.api_versions)
+    self.assertIs(types, self._BP_REGISTRY.packetTypes([t.BluePacketAPI.VERSION]))
+    self.assertIsNone(self._BP_REGISTRY.packetTypes([12345]))
+    self.assertIsNone(self._BP_REGISTRY.packetTypes([]))
+
+    # only DemoPacket has an id, the others are written with their hash
+    partial = PacketTypes((), [t.DemoPacket.packetHash])
+    for key in ["DemoPacket", "DemoPacket2", "DemoPacket3", "DemoPacketU"]:
+      packet = _TEST_DATA[key]
+      data = packet.serialize(types)
+      self.assertLessEqual(len(data), len(packet.serialize()) - 7)
+      self.assertEqual(str(packet), str(self._BP_REGISTRY.deserialize(data, types)))
+      data = packet.serialize(partial)
+      self.assertEqual(str(packet), str(self._BP_REGISTRY.deserialize(data, partial)))
+
+    with self.assertRaises(Exception):
+      self._BP_REGISTRY.deserialize(bytes([len(types) + 1]), types)
+
+    # 2-byte ids
+    large = PacketTypes((), list(range(1, 200)) + [t.DemoPacket.packetHash])
+    packet = _TEST_DATA["DemoPacket"]
+    data = packet.serialize(large)
+    self.assertEqual(bytes([0x80, 200]), data[:2])
+    self.assertEqual(str(packet), str(self._BP_REGISTRY.deserialize(data, large)))
+
+  def testRing(self):
+    with PacketRing.create(1000, self._BP_REGISTRY) as ring:
+      self.assertEqual(1000, ring.capacity)
+      reader = PacketRing.attach(ring.name, self._BP_REGISTRY)
+      # wraps around the end of the ring many times
+      for packet in [_TEST_DATA[k] for k in ("DemoPacket", "DemoPacket2", "DemoPacket3", "DemoPacketU")]:
+        for _ in range(10):
+          ring.write(packet)
+          self.assertEqual(str(packet), str(reader.read()))
+      big = t.DemoOuter(oInt=1, oString="x" * 2000)
+      with self.assertRaises(ValueError):
+        ring.write(big)
+      with self.assertRaises(TimeoutError):
+        reader.read(timeout=0.01)
+      while True:
+        try:
+          ring.write(_TEST_DATA["DemoPacket"], timeout=0.01)
+        except TimeoutError:
+          break
+      ring.closeWriter()
+      # the packets still in the ring are read before the end
+      self.assertEqual(str(_TEST_DATA["DemoPacket"]), str(reader.read()))
+      while reader.read() is not None:
+        pass
+      reader.close()
+
+    count = 10000
+    with PacketRing.create(4096, self._BP_REGISTRY) as ring:
+      writer = multiprocessing.get_context("fork").Process(target=_writeRing, args=(ring.name, count))
+      writer.start()
+      received = []
+      while True:
+        packet = ring.read(timeout=10)
+        if packet is None:
+          break
+        received.append(packet)
+      writer.join()
+    self.assertEqual(list(range(count)), [p.oInt for p in received])
+    self.assertEqual("x" * 99, received[99].oString)
+
+  def testRingOtherProcess(self):
+    # a process with its own resource tracker, which must leave the ring to its creator
+    count = 1000
+    with PacketRing.create(4096, self._BP_REGISTRY) as ring:
+      writer = subprocess.Popen([sys.executable, "-c", f"import TestBluePacket; TestBluePacket._writeRing({ring.name!r}, {count})"],
+                                stderr=subprocess.PIPE, text=True)
+      received = []
+      while True:
+        packet = ring.read(timeout=10)
+        if packet is None:
+          break
+        received.append(packet)
+      _, errors = writer.communicate(timeout=10)
+      self.assertEqual(0, writer.returncode, errors)
+      self.assertNotIn("leaked", errors)
+      # the ring is still there once the writer exited
+      PacketRing.attach(ring.name).close()
+    self.assertEqual(list(range(count)), [p.oInt for p in received])
+
   def testApiVersion(self):
     self.assertNotEqual(0, t.BluePacketAPI.VERSION)
     self.assertIsNotNone(t.BluePacketAPI.VERSION_HEX)
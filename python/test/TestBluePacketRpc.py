@@ -0,0 +1,954 @@
+#! /usr/bin/env python3
+import asyncio
+import io
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import redirect_stderr
+from unittest.mock import patch
+
+sys.path.append("../common")
+
+from blue_packet import BluePacketRegistry
+from blue_packet_connected import COALESCE, DISCONNECT, DROP, ConnectedClient, ConnectedServer
+from blue_packet_rpc_metrics import Histogram, RpcMetrics
+from blue_packet_rpc_server import AsyncRpcServer, RpcServer, RpcSupervisor
+from blue_packet_rpc_transport import TcpTransport, UnixTransport, transport
+from blue_packet_rpc_client import (
+  AsyncRpcClient, LeastOutstanding, PowerOfTwoChoices, RoundRobin, RpcClient, RpcConnectionPool, RpcHedging, RpcResponseCache,
+  RpcServiceError,
+  COMPRESSION, FLAG_BATCH, FLAG_COMPRESSED, FLAG_HEARTBEAT, FLAG_HELLO, FLAG_REQUEST_ID, NO_HANDSHAKE, REQUEST_ID, decodeHello, decompressPayload, encodeHello, readFrameAsync, receive, receiveFrame, sendFrame, writeFrameAsync,
+)
+import gen.test as t
+
+
+class _FramedHandler(socketserver.BaseRequestHandler):
+  """Stand-in framed server: answers DemoOuter(oInt=n) with DemoOuter(oInt=n+1).
+
+  Like the Java RpcServer, it answers handshakes with no features.
+  """
+
+  def handle(self):
+    while True:
+      frame = receiveFrame(self.request)
+      if frame is None:
+        return
+      flags, payload = frame
+      if flags & FLAG_HELLO:
+        sendFrame(self.request, b'', FLAG_HELLO)
+        continue
+      request = self.server.registry.deserialize(payload)
+      self.server.connections.add(self.client_address)
+      sendFrame(self.request, t.DemoOuter(oInt=request.oInt + 1, oString=request.oString).serialize())
+
+
+class _OneFrameHandler(_FramedHandler):
+  """Stand-in server closing the connection after each response."""
+
+  def handle(self):
+    frame = receiveFrame(self.request)
+    self.server.connections.add(self.client_address)
+    if frame is not None:
+      sendFrame(self.request, frame[1])
+
+
+def _startServer(handler):
+  server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), handler)
+  server.daemon_threads = True
+  server.registry = TestBluePacketRpc._BP_REGISTRY
+  server.connections = set()
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+
+def _increment(request):
+  return t.DemoOuter(oInt=request.oInt + 1, oString=request.oString)
+
+
+def _fail(request):
+  raise Exception("failed " + request.fString)
+
+
+def _pid(request):
+  return t.DemoOuter(oInt=os.getpid())
+
+
+def _runServer(server, num_threads=4, address=None):
+  """Run a RpcServer, AsyncRpcServer or ConnectedServer in the background on a free port, or address, returns the port."""
+  with socket.create_server(("127.0.0.1", 0)) as s:
+    port = s.getsockname()[1]
+  args = (num_threads, port) if isinstance(server, RpcServer) else (port, )
+  threading.Thread(target=server.run, args=args, kwargs={"address": address}, daemon=True).start()
+  for _ in range(100):
+    try:
+      transport(address or "127.0.0.1", port).connect().close()
+      return port
+    except (ConnectionRefusedError, FileNotFoundError):
+      time.sleep(0.01)
+  raise AssertionError("RpcServer did not start")
+
+
+class TestBluePacketRpc(unittest.TestCase):
+  _BP_REGISTRY = BluePacketRegistry()
+
+  @classmethod
+  def setUpClass(cls):
+    cls._BP_REGISTRY.register(t)
+
+  def testReceive(self):
+    data = t.DemoOuter(oInt=3, oString="s" * 100000).serialize()
+    a, b = socket.socketpair()
+    with a, b:
+      a.sendall(data)
+      a.close()
+      response_data = receive(b, buffer_size=16)
+    self.assertIsInstance(response_data, memoryview)
+    self.assertEqual(data, response_data)
+    response = self._BP_REGISTRY.deserialize(response_data)
+    self.assertEqual((3, "s" * 100000), (response.oInt, response.oString))
+
+  def testFramedConnectionReuse(self):
+    server = _startServer(_FramedHandler)
+    try:
+      with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=True, port=server.server_address[1]) as client:
+        for i in range(5):
+          response = client._execute(t.DemoOuter(oInt=i, oString="x"))
+          self.assertEqual(i + 1, response.oInt)
+      self.assertEqual(1, len(server.connections))
+    finally:
+      server.shutdown()
+      server.server_close()
+
+  def testPoolSharedBetweenThreads(self):
+    server = _startServer(_FramedHandler)
+    try:
+      with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=True, port=server.server_address[1], pool_size=2) as client:
+        def call(i):
+          return client._execute(t.DemoOuter(oInt=i)).oInt
+        with ThreadPoolExecutor(8) as executor:
+          self.assertEqual(list(range(1, 101)), list(executor.map(call, range(100))))
+        self.assertLessEqual(client._endpoints[0].pool.created, 2)
+      self.assertLessEqual(len(server.connections), 2)
+    finally:
+      server.shutdown()
+      server.server_close()
+
+  def testLoadBalancing(self):
+    with socket.create_server(("127.0.0.1", 0)) as s:
+      dead = ("127.0.0.1", s.getsockname()[1])
+    for framed in (True, False):
+      calls = [[], []]
+      servers = [
+        RpcServer(self._BP_REGISTRY).onReceive(t.DemoOuter, lambda r, c=c: c.append(r.oInt) or _increment(r)).setFramed(framed)
+        for c in calls
+      ]
+      endpoints = [("127.0.0.1", _runServer(server)) for server in servers] + [dead]
+      try:
+        with RpcClient(endpoints, self._BP_REGISTRY, framed=framed, timeout=1, eject_after=2) as client:
+          failures = 0
+          for i in range(9):
+            try:
+              self.assertEqual(i + 1, client._execute(t.DemoOuter(oInt=i)).oInt)
+            except ConnectionRefusedError:
+              failures += 1
+          self.assertEqual(2, failures)
+          self.assertEqual("[127.0.0.1:%d]" % dead[1], str(client.ejected))
+          self.assertEqual(([0, 3], [1, 4]), (calls[0][:2], calls[1][:2]))
+          # requests only go to the live endpoints
+          for i in range(10):
+            self.assertEqual(i + 1, client._execute(t.DemoOuter(oInt=i)).oInt)
+          self.assertEqual(17, len(calls[0]) + len(calls[1]))
+      finally:
+        for server in servers:
+          server.shutdown()
+
+  def testLoadBalancingStrategies(self):
+    class E:
+      def __init__(self, outstanding):
+        self.outstanding = outstanding
+    endpoints = [E(3), E(0), E(1)]
+    round_robin = RoundRobin()
+    self.assertEqual(endpoints * 2, [round_robin.choose(endpoints) for _ in range(6)])
+    self.assertIs(endpoints[1], LeastOutstanding().choose(endpoints))
+    chosen = {id(PowerOfTwoChoices().choose(endpoints)) for _ in range(100)}
+    self.assertEqual({id(endpoints[1]), id(endpoints[2])}, chosen)
+
+  def testDeadline(self):
+    # the connection is accepted by the kernel, but never answered
+    with socket.create_server(("127.0.0.1", 0)) as s:
+      # including the handshake of a new connection
+      for framed, compression in ((False, None), (True, None), (True, "zlib")):
+        client = RpcClient(
+          "127.0.0.1", self._BP_REGISTRY, framed=framed, port=s.getsockname()[1], timeout=5, compression=compression,
+        )
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+          client._execute(_TEST_PACKET, timeout=0.2)
+        self.assertLess(time.monotonic() - start, 1)
+        client.close()
+
+  def testHedging(self):
+    def slowIncrement(request):
+      time.sleep(0.5)
+      return _increment(request)
+    def slowEcho(request):
+      time.sleep(0.5)
+      return request
+    servers = [
+      RpcServer(self._BP_REGISTRY).onReceive(t.DemoOuter, slowIncrement).onReceive(t.DemoPacket, slowEcho),
+      RpcServer(self._BP_REGISTRY).onReceive(t.DemoOuter, _increment).onReceive(t.DemoPacket, lambda r: r),
+    ]
+    endpoints = [("127.0.0.1", _runServer(server.setFramed(True))) for server in servers]
+    hedging = RpcHedging(initial_delay=0.05).hedge(t.DemoOuter)
+    try:
+      with RpcClient(endpoints, self._BP_REGISTRY, framed=True, hedging=hedging, pool_size=2) as client:
+        start = time.monotonic()
+        self.assertEqual(2, client._execute(t.DemoOuter(oInt=1)).oInt)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual((1, 1), (hedging.hedged, hedging.wins))
+        # not hedged
+        start = time.monotonic()
+        client._execute(_TEST_PACKET)
+        self.assertGreater(time.monotonic() - start, 0.4)
+      with RpcClient(endpoints[1:], self._BP_REGISTRY, framed=True, hedging=hedging) as client:
+        # answered before the delay, on the caller's thread
+        self.assertEqual(3, client._execute(t.DemoOuter(oInt=2)).oInt)
+        self.assertEqual(1, hedging.hedged)
+        self.assertEqual(0, len(client._hedging_executor._threads))
+    finally:
+      for server in servers:
+        server.shutdown()
+
+    hedging = RpcHedging(min_samples=10)
+    for i in range(100):
+      hedging.record(t.DemoOuter, i / 1000)
+    self.assertEqual(0.094, hedging.delay(t.DemoOuter))
+    self.assertEqual(0.05, hedging.delay(t.DemoPacket))
+
+  def testPoolHealthCheckAndEviction(self):
+    server = _startServer(_OneFrameHandler)
+    try:
+      pool = RpcConnectionPool("127.0.0.1", server.server_address[1], max_size=1, checkout_timeout=1)
+      for i in range(3):
+        with pool.connection() as sock:
+          sendFrame(sock, t.DemoOuter(oInt=i).serialize())
+          receiveFrame(sock)
+        time.sleep(0.05)
+      # the server closed every connection, none could be reused
+      self.assertEqual((3, 0), (pool.created, pool.reused))
+
+      pool.idle_timeout = 0
+      sock = pool.checkout()
+      pool.checkin(sock)
+      time.sleep(0.01)
+      pool.checkin(pool.checkout())
+      self.assertEqual((5, 0), (pool.created, pool.reused))
+
+      sock = pool.checkout()
+      with self.assertRaises(TimeoutError):
+        pool.checkout()
+      pool.close()
+    finally:
+      server.shutdown()
+      server.server_close()
+
+  def testAsyncOutOfOrder(self):
+    async def handle(reader, writer):
+      async def answer(flags, payload):
+        request = self._BP_REGISTRY.deserialize(payload[4:])
+        await asyncio.sleep(0.01 * (10 - request.oInt))
+        writeFrameAsync(writer, payload[:4] + t.DemoOuter(oInt=request.oInt + 1).serialize(), flags)
+      tasks = []
+      while (frame := await readFrameAsync(reader)) is not None:
+        tasks.append(asyncio.create_task(answer(*frame)))
+      await asyncio.gather(*tasks)
+      writer.close()
+
+    async def run():
+      server = await asyncio.start_server(handle, "127.0.0.1", 0)
+      port = server.sockets[0].getsockname()[1]
+      order = []
+      async def call(client, i):
+        response = await client.execute(t.DemoOuter(oInt=i))
+        order.append(i)
+        return response.oInt
+      async with AsyncRpcClient("127.0.0.1", self._BP_REGISTRY, port=port) as client:
+        results = await asyncio.gather(*(call(client, i) for i in range(10)))
+      server.close()
+      return results, order
+
+    results, order = asyncio.run(run())
+    self.assertEqual(list(range(1, 11)), results)
+    self.assertEqual(list(range(9, -1, -1)), order)
+
+  def testServer(self):
+    for framed, processes in ((False, 0), (True, 0), (True, 2)):
+      server = RpcServer(self._BP_REGISTRY, processes=processes) \
+          .onReceive(t.DemoOuter, _increment) \
+          .onReceive(t.DemoPacket, _fail) \
+          .onError(lambda ex: t.DemoOuter(oInt=-1, oString=str(ex))) \
+          .setFramed(framed)
+      port = _runServer(server)
+      try:
+        with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=framed, port=port) as client:
+          self.assertEqual(8, client._execute(t.DemoOuter(oInt=7, oString="s" * 100000)).oInt)
+          error = client._execute(_TEST_PACKET)
+          self.assertEqual((-1, "failed x"), (error.oInt, error.oString))
+          error = client._execute(t.DemoPacket3())
+          self.assertEqual("No handler for packet class: DemoPacket3", error.oString)
+      finally:
+        server.shutdown()
+
+  def testAsyncServer(self):
+    in_flight = [0, 0]
+    async def slowIncrement(request):
+      in_flight[0] += 1
+      in_flight[1] = max(in_flight)
+      await asyncio.sleep(0.01 * (10 - request.oInt))
+      in_flight[0] -= 1
+      return _increment(request)
+
+    for framed in (False, True):
+      server = AsyncRpcServer(self._BP_REGISTRY, max_in_flight=3) \
+          .onReceive(t.DemoOuter, slowIncrement) \
+          .onReceive(t.DemoPacket, _fail) \
+          .onError(lambda ex: t.DemoOuter(oInt=-1, oString=str(ex))) \
+          .setFramed(framed)
+      port = _runServer(server)
+      try:
+        with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=framed, port=port) as client:
+          self.assertEqual(8, client._execute(t.DemoOuter(oInt=7, oString="s" * 100000)).oInt)
+          self.assertEqual("failed x", client._execute(_TEST_PACKET).oString)
+      finally:
+        server.shutdown()
+
+    async def pipelined():
+      async with AsyncRpcClient("127.0.0.1", self._BP_REGISTRY, port=port) as client:
+        return await asyncio.gather(*(client.execute(t.DemoOuter(oInt=i)) for i in range(10)))
+    server = AsyncRpcServer(self._BP_REGISTRY, max_in_flight=3).onReceive(t.DemoOuter, slowIncrement).setFramed(True)
+    port = _runServer(server)
+    try:
+      self.assertEqual(list(range(1, 11)), [r.oInt for r in asyncio.run(pipelined())])
+      self.assertEqual(3, in_flight[1])
+      # a request failing outside of its handler is logged, and closes the connection
+      with redirect_stderr(io.StringIO()) as log, socket.create_connection(("127.0.0.1", port)) as s:
+        s.settimeout(5)
+        sendFrame(s, REQUEST_ID.pack(1) + b'\x00\x00\x00\x05', FLAG_REQUEST_ID | FLAG_BATCH)
+        self.assertIsNone(receiveFrame(s))
+      self.assertIn("Truncated batch payload", log.getvalue())
+    finally:
+      server.shutdown()
+
+  def testBatch(self):
+    for server in (RpcServer(self._BP_REGISTRY), AsyncRpcServer(self._BP_REGISTRY)):
+      server.onReceive(t.DemoOuter, _increment) \
+          .onReceive(t.DemoPacket, _fail) \
+          .onError(lambda ex: t.DemoOuter(oInt=-1, oString=str(ex))) \
+          .setFramed(True)
+      port = _runServer(server)
+      try:
+        with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=True, port=port) as client:
+          responses = client._executeBatch([t.DemoOuter(oInt=i) for i in range(20)] + [_TEST_PACKET])
+          self.assertEqual(list(range(1, 21)) + [-1], [r.oInt for r in responses])
+          self.assertEqual("failed x", responses[-1].oString)
+          self.assertEqual([], client._executeBatch([]))
+          # the connection is still usable after a batch
+          self.assertEqual(2, client._execute(t.DemoOuter(oInt=1)).oInt)
+      finally:
+        server.shutdown()
+    with self.assertRaises(ValueError):
+      RpcClient("127.0.0.1", self._BP_REGISTRY)._executeBatch([_TEST_PACKET])
+
+  def testResponseCache(self):
+    calls = []
+    def slowIncrement(request):
+      calls.append(request.oInt)
+      time.sleep(0.1)
+      return _increment(request)
+
+    server = RpcServer(self._BP_REGISTRY).onReceive(t.DemoOuter, slowIncrement).onReceive(t.DemoPacket, _fail)
+    server.onError(lambda ex: t.DemoOuter(oInt=-1, oString=str(ex))).setFramed(True)
+    port = _runServer(server)
+    try:
+      cache = RpcResponseCache(max_entries=2).cache(t.DemoOuter, ttl=0.5)
+      with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=True, port=port, pool_size=4, cache=cache) as client:
+        # identical concurrent requests are sent once
+        with ThreadPoolExecutor(4) as executor:
+          responses = list(executor.map(client._execute, [t.DemoOuter(oInt=1)] * 4))
+        self.assertEqual([2] * 4, [r.oInt for r in responses])
+        self.assertEqual([1], calls)
+        self.assertEqual((0, 1, 3), (cache.hits, cache.misses, cache.coalesced))
+
+        self.assertIs(responses[0], client._execute(t.DemoOuter(oInt=1)))
+        self.assertEqual(1, cache.hits)
+
+        # least recently used entry is evicted
+        client._execute(t.DemoOuter(oInt=2))
+        client._execute(t.DemoOuter(oInt=3))
+        self.assertEqual(2, len(cache))
+        client._execute(t.DemoOuter(oInt=1))
+        self.assertEqual([1, 2, 3, 1], calls)
+
+        # expired entries are sent again
+        time.sleep(0.5)
+        client._execute(t.DemoOuter(oInt=3))
+        self.assertEqual([1, 2, 3, 1, 3], calls)
+
+        # other request classes are not cached
+        client._execute(_TEST_PACKET)
+        client._execute(_TEST_PACKET)
+        self.assertEqual(2, len(cache))
+    finally:
+      server.shutdown()
+
+    cache = RpcResponseCache(max_bytes=100).cache(t.DemoOuter, ttl=10)
+    self.assertEqual(3, cache.get(t.DemoOuter, b"a", lambda: (3, 60)))
+    self.assertEqual(4, cache.get(t.DemoOuter, b"b", lambda: (4, 60)))
+    self.assertEqual(1, len(cache))
+    self.assertEqual(5, cache.get(t.DemoOuter, b"c", lambda: (5, 101)))
+    self.assertEqual(1, len(cache))
+    with self.assertRaises(KeyError):
+      cache.get(t.DemoOuter, b"d", lambda: {}["x"])
+    self.assertEqual(4, cache.get(t.DemoOuter, b"b", lambda: (0, 0)))
+
+    # waiting for an identical request in flight is bounded too
+    loading = threading.Event()
+    def slowLoad():
+      loading.set()
+      time.sleep(0.5)
+      return 6, 1
+    with ThreadPoolExecutor(1) as executor:
+      first = executor.submit(cache.get, t.DemoOuter, b"e", slowLoad)
+      loading.wait()
+      start = time.monotonic()
+      with self.assertRaises(TimeoutError):
+        cache.get(t.DemoOuter, b"e", lambda: (0, 0), timeout=0.1)
+      self.assertLess(time.monotonic() - start, 0.4)
+      self.assertEqual(6, first.result())
+
+    # errors are not cached
+    cache.error(t.DemoPacket)
+    loads = []
+    for _ in range(2):
+      self.assertIs(_TEST_PACKET, cache.get(t.DemoOuter, b"f", lambda: loads.append(1) or (_TEST_PACKET, 1)))
+    self.assertEqual(2, len(loads))
+
+  def testUnixSocket(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      for server_class in (RpcServer, AsyncRpcServer):
+        for framed in (False, True):
+          # not reused: a server that was just shut down may still be listening
+          address = f"unix://{tmp}/{server_class.__name__}-{framed}.sock"
+          server = server_class(self._BP_REGISTRY).onReceive(t.DemoOuter, _increment).setFramed(framed)
+          _runServer(server, address=address)
+          try:
+            with RpcClient(address, self._BP_REGISTRY, framed=framed) as client:
+              self.assertEqual(8, client._execute(t.DemoOuter(oInt=7, oString="s" * 100000)).oInt)
+            if framed:
+              async def pipelined():
+                async with AsyncRpcClient(address, self._BP_REGISTRY, connections=2) as client:
+                  return await asyncio.gather(*(client.execute(t.DemoOuter(oInt=i)) for i in range(10)))
+              self.assertEqual(list(range(1, 11)), [r.oInt for r in asyncio.run(pipelined())])
+          finally:
+            server.shutdown()
+
+    self.assertEqual("/run/bp.sock", transport("unix:///run/bp.sock", 1).path)
+    self.assertIsInstance(transport("localhost", 1), TcpTransport)
+    self.assertEqual("localhost:2", repr(transport(("localhost", 2), 1)))
+    unix = UnixTransport("/run/bp.sock")
+    self.assertIs(unix, transport(unix, 1))
+
+  def testCompression(self):
+    big = t.DemoOuter(oInt=7, oString="s" * 100000)
+    for server in (RpcServer(self._BP_REGISTRY), AsyncRpcServer(self._BP_REGISTRY)):
+      server.onReceive(t.DemoOuter, _increment).setCompression(["zlib"], threshold=100).setFramed(True)
+      port = _runServer(server)
+      try:
+        with socket.create_connection(("127.0.0.1", port)) as sock:
+          sendFrame(sock, encodeHello({"compression": "lzma,zlib"}), FLAG_HELLO)
+          flags, payload = receiveFrame(sock)
+          self.assertEqual((FLAG_HELLO, {"compression": "zlib"}), (flags, decodeHello(payload)))
+          sendFrame(sock, big.serialize())
+          flags, payload = receiveFrame(sock)
+          self.assertEqual(FLAG_COMPRESSED, flags)
+          self.assertLess(len(payload), 1000)
+          # small responses are not compressed
+          sendFrame(sock, t.DemoOuter(oInt=1).serialize())
+          self.assertEqual(0, receiveFrame(sock)[0])
+
+        for compression, expected in (("zlib", "zlib"), (["lzma", "zlib"], "zlib"), ("lzma", None), (None, None)):
+          with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=True, port=port, compression=compression) as client:
+            response = client._execute(big)
+            self.assertEqual((8, big.oString), (response.oInt, response.oString))
+            endpoint = client._endpoints[0]
+            with endpoint.pool.connection() as sock:
+              self.assertEqual(expected, (endpoint.pool.session(sock) or NO_HANDSHAKE).compression)
+      finally:
+        server.shutdown()
+
+  def testCorruptFrame(self):
+    server = RpcServer(self._BP_REGISTRY).onReceive(t.DemoOuter, _increment).setCompression(["zlib"]).setFramed(True)
+    port = _runServer(server, num_threads=2)
+    try:
+      log = io.StringIO()
+      with redirect_stderr(log):
+        # more corrupt connections than worker threads
+        for frames in ([(b"\xff\xfe", FLAG_HELLO)], [(encodeHello({"compression": "zlib"}), FLAG_HELLO), (b"garbage", FLAG_COMPRESSED)]) * 2:
+          with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+            for payload, flags in frames:
+              sendFrame(sock, payload, flags)
+            while receiveFrame(sock) is not None:
+              pass
+      self.assertIn("Malformed", log.getvalue())
+      with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=True, port=port, compression="zlib", timeout=5) as client:
+        self.assertEqual(2, client._execute(t.DemoOuter(oInt=1)).oInt)
+    finally:
+      server.shutdown()
+
+  def testDecompressionLimit(self):
+    data = b"x" * 1000
+    for algorithm, (compress, _) in COMPRESSION.items():
+      self.assertEqual(data, decompressPayload(algorithm, FLAG_COMPRESSED, compress(data)))
+      # a payload decompressing to more than a frame can carry is rejected
+      with patch("blue_packet_rpc_client.MAX_FRAME_SIZE", 999), self.assertRaises(ConnectionError):
+        decompressPayload(algorithm, FLAG_COMPRESSED, compress(data))
+      for payload in (compress(data)[:-1], compress(data) + b"x"):
+        with self.assertRaises(ConnectionError):
+          decompressPayload(algorithm, FLAG_COMPRESSED, payload)
+
+  def testCompactTypes(self):
+    other = BluePacketRegistry()
+    other.register(t)
+    other._api_hashes[t.BluePacketAPI.VERSION + 1] = []
+    for server in (RpcServer(self._BP_REGISTRY), AsyncRpcServer(self._BP_REGISTRY)):
+      server.onReceive(t.DemoOuter, _increment).setFramed(True)
+      port = _runServer(server)
+      try:
+        with socket.create_connection(("127.0.0.1", port)) as sock:
+          types = self._BP_REGISTRY.packetTypes()
+          sendFrame(sock, encodeHello({"api": str(t.BluePacketAPI.VERSION)}), FLAG_HELLO)
+          self.assertEqual({"compression": "", "api": str(t.BluePacketAPI.VERSION)}, decodeHello(receiveFrame(sock)[1]))
+          request = t.DemoOuter(oInt=1)
+          sendFrame(sock, request.serialize(types))
+          _, payload = receiveFrame(sock)
+          self.assertEqual(len(request.serialize()) - 7, len(payload))
+          self.assertEqual(2, self._BP_REGISTRY.deserialize(payload, types).oInt)
+
+        # the server doesn't know one of the API versions of the client, and answers with full hashes
+        for registry, expected in ((self._BP_REGISTRY, True), (other, False)):
+          with RpcClient("127.0.0.1", registry, framed=True, port=port, compact_types=True) as client:
+            self.assertEqual(2, client._execute(t.DemoOuter(oInt=1)).oInt)
+            responses = client._executeBatch([t.DemoOuter(oInt=i) for i in range(5)])
+            self.assertEqual(list(range(1, 6)), [r.oInt for r in responses])
+            endpoint = client._endpoints[0]
+            with endpoint.pool.connection() as sock:
+              self.assertEqual(expected, endpoint.pool.session(sock).types is not None)
+      finally:
+        server.shutdown()
+    with self.assertRaises(ValueError):
+      RpcClient("127.0.0.1", self._BP_REGISTRY, compact_types=True)
+
+  def testServiceStubs(self):
+    class Handlers(t.BluePacketServiceHandlers):
+      def onDemoOuter(self, request):
+        if request.oInt < 0:
+          return _TEST_PACKET
+        return _increment(request)
+
+    for server in (RpcServer(self._BP_REGISTRY), AsyncRpcServer(self._BP_REGISTRY)):
+      Handlers().bind(server).onError(lambda ex: t.DemoOuter(oInt=-1, oString=str(ex))).setFramed(True)
+      # only the overridden methods are bound
+      self.assertEqual({t.DemoOuter}, set(server._dispatch_handler))
+      port = _runServer(server)
+      try:
+        with t.BluePacketServiceClient("127.0.0.1", self._BP_REGISTRY, framed=True, port=port) as client:
+          self.assertEqual(2, client.callDemoOuter(t.DemoOuter(oInt=1)).oInt)
+          responses = client.callDemoOuterBatch([t.DemoOuter(oInt=i) for i in range(3)])
+          self.assertEqual([1, 2, 3], [r.oInt for r in responses])
+          with self.assertRaises(RpcServiceError) as cm:
+            client.callDemoOuter(t.DemoOuter(oInt=-5))
+          self.assertEqual(str(_TEST_PACKET), str(cm.exception.packet))
+          # no handler: the error handler answers with a DemoOuter
+          with self.assertRaisesRegex(Exception, "Unexpected response packet"):
+            client.callDemoPacket3(t.DemoPacket3())
+      finally:
+        server.shutdown()
+
+  def testOneWay(self):
+    received = []
+    class Handlers(t.BluePacketServiceHandlers):
+      def onDemoOuter(self, request):
+        return _increment(request)
+      def onDemoPacket2(self, request):
+        received.extend(request.aInt)
+        if request.aInt[0] < 0:
+          raise Exception("negative")
+        # discarded
+        return request
+
+    for server in (RpcServer(self._BP_REGISTRY), AsyncRpcServer(self._BP_REGISTRY)):
+      received.clear()
+      Handlers().bind(server).onError(lambda ex: t.DemoOuter(oInt=-1, oString=str(ex))).setFramed(True)
+      port = _runServer(server)
+      try:
+        with t.BluePacketServiceClient(
+            "127.0.0.1", self._BP_REGISTRY, framed=True, port=port, batch_count=10, linger=0.05,
+        ) as client:
+          for i in range(25):
+            client.sendDemoPacket2(t.DemoPacket2(aInt=[i]))
+          # two full batches are sent right away, the last one after linger seconds
+          self.assertEqual(5, len(client._one_way))
+          for _ in range(100):
+            if len(received) == 25:
+              break
+            time.sleep(0.01)
+          self.assertEqual(list(range(25)), received)
+
+          # errors aren't answered either, the connection is still in sync
+          client.sendDemoPacket2(t.DemoPacket2(aInt=[-1]))
+          client.flush()
+          self.assertEqual(2, client.callDemoOuter(t.DemoOuter(oInt=1)).oInt)
+          self.assertEqual(-1, received[-1])
+
+          # close() sends the queued requests
+          client.sendDemoPacket2(t.DemoPacket2(aInt=[100]))
+        for _ in range(100):
+          if received[-1] == 100:
+            break
+          time.sleep(0.01)
+        self.assertEqual(100, received[-1])
+      finally:
+        server.shutdown()
+    with self.assertRaises(ValueError):
+      RpcClient("127.0.0.1", self._BP_REGISTRY)._executeOneWay(_TEST_PACKET)
+
+    # servers without the one_way feature would answer, the requests aren't sent
+    server = _startServer(_FramedHandler)
+    try:
+      with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=True, port=server.server_address[1], linger=10) as client:
+        client._executeOneWay(t.DemoOuter(oInt=1))
+        with self.assertRaises(ConnectionError):
+          client.flush()
+        self.assertEqual(2, client._execute(t.DemoOuter(oInt=1)).oInt)
+    finally:
+      server.shutdown()
+      server.server_close()
+
+  def testStream(self):
+    produce = threading.Event()
+    def rows(request):
+      for i in range(request.oInt):
+        yield t.DemoOuter(oInt=i, oString="row")
+    def failing(request):
+      yield t.DemoPacket3()
+      raise Exception("failed stream")
+    def slow(request):
+      yield t.DemoPacket2(aInt=[1])
+      produce.wait(5)
+      yield t.DemoPacket2(aInt=[2])
+    async def asyncRows(request):
+      for i in range(request.oInt):
+        yield t.DemoOuter(oInt=i, oString="row")
+        await asyncio.sleep(0)
+
+    for server, handler in ((RpcServer(self._BP_REGISTRY), rows), (AsyncRpcServer(self._BP_REGISTRY), asyncRows)):
+      produce.clear()
+      server.onReceive(t.DemoOuter, handler) \
+          .onReceive(t.DemoPacket3, failing) \
+          .onReceive(t.DemoPacket2, slow) \
+          .onReceive(t.DemoPacket, _fail) \
+          .onError(lambda ex: t.DemoOuter(oInt=-1, oString=str(ex))) \
+          .setFramed(True)
+      port = _runServer(server)
+      try:
+        with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=True, port=port, compact_types=True) as client:
+          responses = list(client._executeStream(t.DemoOuter(oInt=20000)))
+          self.assertEqual(list(range(20000)), [r.oInt for r in responses])
+          self.assertEqual([], list(client._executeStream(t.DemoOuter(oInt=0))))
+
+          # the error handler answers last
+          responses = list(client._executeStream(t.DemoPacket3()))
+          self.assertEqual([t.DemoPacket3, t.DemoOuter], [type(r) for r in responses])
+          self.assertEqual("failed stream", responses[1].oString)
+          self.assertEqual([-1], [r.oInt for r in client._executeStream(_TEST_PACKET)])
+
+          # the first response comes while the handler is still producing
+          stream = client._executeStream(t.DemoPacket2())
+          self.assertEqual([1], next(stream).aInt)
+          produce.set()
+          self.assertEqual([[2]], [r.aInt for r in stream])
+
+          # a stream stopped early closes its connection, the next requests use a new one
+          stream = client._executeStream(t.DemoOuter(oInt=100000))
+          self.assertEqual(0, next(stream).oInt)
+          stream.close()
+          self.assertEqual([0, 1], [r.oInt for r in client._executeStream(t.DemoOuter(oInt=2))])
+
+          # a stream handler called without a stream request fails like any other handler
+          self.assertEqual(-1, client._execute(t.DemoOuter(oInt=2)).oInt)
+          self.assertEqual([0, 1], [r.oInt for r in client._executeStream(t.DemoOuter(oInt=2))])
+      finally:
+        server.shutdown()
+    with self.assertRaises(ValueError):
+      next(RpcClient("127.0.0.1", self._BP_REGISTRY)._executeStream(_TEST_PACKET))
+
+  def testMetrics(self):
+    for server_class, framed in ((RpcServer, False), (RpcServer, True), (AsyncRpcServer, False), (AsyncRpcServer, True)):
+      server_metrics = RpcMetrics()
+      server = server_class(self._BP_REGISTRY) \
+          .onReceive(t.DemoOuter, _increment) \
+          .onReceive(t.DemoPacket, _fail) \
+          .onError(lambda ex: t.DemoOuter(oInt=-1, oString=str(ex))) \
+          .setMetrics(server_metrics) \
+          .setFramed(framed)
+      port = _runServer(server)
+      metrics = RpcMetrics()
+      try:
+        with RpcClient("127.0.0.1", self._BP_REGISTRY, framed=framed, port=port, metrics=metrics) as client:
+          for i in range(3):
+            client._execute(t.DemoOuter(oInt=i))
+          client._execute(_TEST_PACKET)
+      finally:
+        server.shutdown()
+
+      for stage in ("serialize", "connect", "send", "wait", "receive", "deserialize", "total"):
+        self.assertEqual(3, metrics.histogram(stage, "DemoOuter").count, stage)
+      self.assertEqual(3, metrics.counter("requests", "DemoOuter"))
+      self.assertEqual(3 * len(t.DemoOuter(oInt=0).serialize()), metrics.counter("request_bytes", "DemoOuter"))
+      self.assertEqual(3, metrics.counter("response.DemoOuter", "DemoOuter"))
+      self.assertEqual(1, metrics.counter("response.DemoOuter", "DemoPacket"))
+      self.assertEqual(4, metrics.total("requests"))
+      if framed:
+        self.assertEqual((1, 4), (metrics.counter("connections_created"), metrics.counter("connections_reused")))
+
+      # the client reads the response after the server is done with the request
+      for _ in range(100):
+        if server_metrics.total("requests") == 4:
+          break
+        time.sleep(0.01)
+      self.assertEqual(1, server_metrics.counter("handler_errors", "DemoPacket"))
+      self.assertEqual(metrics.counter("request_bytes", "DemoOuter"), server_metrics.counter("request_bytes", "DemoOuter"))
+      self.assertEqual(metrics.counter("response_bytes", "DemoPacket"), server_metrics.counter("response_bytes", "DemoPacket"))
+      self.assertEqual(3, server_metrics.histogram("handle", "DemoOuter").count)
+      self.assertIn("DemoOuter total: n=3", server_metrics.report())
+
+    h = Histogram()
+    for i in range(1, 101):
+      h.record(i / 1000)
+    self.assertEqual((100, 0.001, 0.1), (h.count, h.min, h.max))
+    self.assertAlmostEqual(0.0505, h.mean)
+    self.assertTrue(0.05 <= h.percentile(50) < 0.05 * 1.26)
+    self.assertEqual(0.1, h.percentile(100))
+
+  def testSupervisor(self):
+    with socket.create_server(("127.0.0.1", 0)) as s:
+      port = s.getsockname()[1]
+    def factory():
+      pid = lambda request: t.DemoOuter(oInt=os.getpid())
+      return AsyncRpcServer(self._BP_REGISTRY).onReceive(t.DemoOuter, pid)
+    supervisor = RpcSupervisor(factory, workers=2, drain_timeout=2)
+    supervisor_thread = threading.Thread(target=supervisor.run, args=(port, ))
+    supervisor_thread.start()
+    try:
+      def servedBy(count):
+        pids = set()
+        for _ in range(count):
+          try:
+            with RpcClient("127.0.0.1", self._BP_REGISTRY, port=port) as client:
+              pids.add(client._execute(t.DemoOuter(oInt=0)).oInt)
+          except (ConnectionError, OSError):
+            time.sleep(0.05)
+        return pids
+
+      served = servedBy(100)
+      workers = set(supervisor.pids)
+      self.assertEqual(workers, served)
+      os.kill(supervisor.pids[0], signal.SIGKILL)
+      time.sleep(1.5)
+      self.assertEqual(2, len(set(supervisor.pids) - {0}))
+      self.assertNotEqual(workers, set(supervisor.pids))
+      self.assertEqual(set(supervisor.pids), servedBy(100))
+    finally:
+      supervisor.shutdown()
+      supervisor_thread.join()
+
+  def testSupervisorProcesses(self):
+    # workers can have their own pool of handler processes
+    with socket.create_server(("127.0.0.1", 0)) as s:
+      port = s.getsockname()[1]
+    factory = lambda: RpcServer(self._BP_REGISTRY, processes=2).onReceive(t.DemoOuter, _pid)
+    supervisor = RpcSupervisor(factory, workers=1, drain_timeout=5)
+    supervisor_thread = threading.Thread(target=supervisor.run, args=(port, ), kwargs={"num_threads": 2})
+    supervisor_thread.start()
+    try:
+      response = None
+      for _ in range(100):
+        try:
+          with RpcClient("127.0.0.1", self._BP_REGISTRY, port=port, timeout=5) as client:
+            response = client._execute(t.DemoOuter(oInt=0))
+          break
+        except (ConnectionError, OSError):
+          time.sleep(0.05)
+      self.assertIsInstance(response, t.DemoOuter)
+      self.assertNotIn(response.oInt, [0, os.getpid()] + supervisor.pids)
+    finally:
+      supervisor.shutdown()
+      supervisor_thread.join()
+
+  def testConnected(self):
+    def errorPacket(ex):
+      if str(ex) == "failed crash":
+        raise Exception("error handler failed")
+      return t.DemoOuter(oInt=-1, oString=str(ex))
+    server = ConnectedServer(self._BP_REGISTRY, heartbeat_interval=0.05) \
+        .onConnect(lambda session: session.sendNowait(t.DemoOuter(oInt=0, oString="welcome"))) \
+        .onReceive(t.DemoOuter, lambda session, packet: _increment(packet)) \
+        .onReceive(t.DemoPacket, lambda session, packet: _fail(packet)) \
+        .onError(errorPacket)
+    async def push(session, packet):
+      # a packet from one client is pushed to every client
+      for s in server.sessions:
+        await s.send(packet)
+    server.onReceive(t.DemoPacket3, push)
+    port = _runServer(server)
+
+    async def run():
+      received = asyncio.Queue()
+      client = ConnectedClient("127.0.0.1", self._BP_REGISTRY, port=port, heartbeat_interval=0.05) \
+          .onReceive(t.DemoOuter, lambda session, packet: received.put_nowait(packet.oString or packet.oInt)) \
+          .onReceive(t.DemoPacket3, lambda session, packet: received.put_nowait(session))
+      other = ConnectedClient("127.0.0.1", self._BP_REGISTRY, port=port) \
+          .onReceive(t.DemoOuter, lambda session, packet: None) \
+          .onReceive(t.DemoPacket3, lambda session, packet: received.put_nowait(session))
+      async with client, other:
+        self.assertEqual("welcome", await received.get())
+        for i in range(10):
+          client.sendNowait(t.DemoOuter(oInt=i))
+        self.assertEqual(list(range(1, 11)), [await received.get() for _ in range(10)])
+        await client.send(_TEST_PACKET)
+        self.assertEqual("failed x", await received.get())
+        # a failing error handler is logged, the session goes on
+        with redirect_stderr(io.StringIO()) as log:
+          await client.send(t.DemoPacket(fByte=1, fShort=2, fInt=3, fLong=4, fFloat=5.0, fDouble=6.0, fString="crash"))
+          await client.send(t.DemoOuter(oInt=20))
+          self.assertEqual(21, await received.get())
+        self.assertIn("error handler failed", log.getvalue())
+        await client.send(t.DemoPacket3())
+        self.assertEqual({client.session, other.session}, {await received.get(), await received.get()})
+        self.assertEqual(2, len(server.sessions))
+
+        # the heartbeats keep an idle session open
+        await asyncio.sleep(0.3)
+        self.assertFalse(client.closed)
+
+      self.assertTrue(client.closed)
+      self.assertIsNone(client.session.error)
+
+      # the outbound queue is bounded
+      async with ConnectedClient("127.0.0.1", self._BP_REGISTRY, port=port, max_queue=2) as small:
+        small.sendNowait(t.DemoOuter(oInt=0))
+        small.sendNowait(t.DemoOuter(oInt=0))
+        with self.assertRaises(asyncio.QueueFull):
+          small.sendNowait(t.DemoOuter(oInt=0))
+        self.assertEqual(2, small.session.queued)
+    try:
+      asyncio.run(run())
+
+      # a peer sending nothing after its handshake, not even heartbeats, is disconnected
+      with socket.create_connection(("127.0.0.1", port)) as s:
+        s.settimeout(5)
+        sendFrame(s, encodeHello({}), FLAG_HELLO)
+        frames = []
+        while True:
+          frame = receiveFrame(s)
+          if frame is None:
+            break
+          frames.append(frame)
+        self.assertEqual((FLAG_HELLO, {"api": ""}), (frames[0][0], decodeHello(frames[0][1])))
+        self.assertEqual({(FLAG_HEARTBEAT, b'')}, set((f, bytes(p)) for f, p in frames[2:]))
+      for _ in range(100):
+        if not server.sessions:
+          break
+        time.sleep(0.01)
+      self.assertEqual(set(), server.sessions)
+    finally:
+      server.shutdown()
+
+  def testConnectedPeerGone(self):
+    # send() waiting for room in the queue of a peer that stops reading, then disconnects
+    stopped = Future()
+    async def flood(session):
+      try:
+        while True:
+          await session.send(t.DemoOuter(oInt=0, oString="x" * 100000))
+      except Exception as ex:
+        stopped.set_result(ex)
+    async def connect(session):
+      asyncio.create_task(flood(session))
+    server = ConnectedServer(self._BP_REGISTRY, max_queue=2, heartbeat_interval=None).onConnect(connect)
+    port = _runServer(server)
+    try:
+      with socket.create_connection(("127.0.0.1", port)) as s:
+        sendFrame(s, encodeHello({}), FLAG_HELLO)
+        for _ in range(500):
+          if server.sessions and next(iter(server.sessions)).queued == 2:
+            break
+          time.sleep(0.01)
+        self.assertEqual(2, next(iter(server.sessions)).queued)
+      self.assertIsInstance(stopped.result(timeout=5), ConnectionError)
+    finally:
+      server.shutdown()
+
+  def testBroadcast(self):
+    server = ConnectedServer(self._BP_REGISTRY, max_queue=3, heartbeat_interval=None)
+    def setPolicy(session, packet):
+      session.slow_consumer = packet.oString
+      return packet
+    # coalescing key of the i-th broadcast, the packet class by default
+    key = [lambda i: None]
+    def burst(session, packet):
+      # the sessions can't write anything before the end of the handler
+      return t.DemoOuter(oInt=sum(server.broadcast(t.DemoOuter(oInt=i), key=key[0](i)) for i in range(10)))
+    server.onReceive(t.DemoOuter, setPolicy).onReceive(t.DemoPacket3, burst)
+    port = _runServer(server)
+
+    async def run():
+      received = {policy: asyncio.Queue() for policy in (DROP, COALESCE, DISCONNECT)}
+      clients = {}
+      for policy in received:
+        clients[policy] = ConnectedClient("127.0.0.1", self._BP_REGISTRY, port=port, heartbeat_interval=None) \
+            .onReceive(t.DemoOuter, lambda session, packet, q=received[policy]: q.put_nowait(packet.oInt))
+        await clients[policy].connect()
+        await clients[policy].send(t.DemoOuter(oInt=0, oString=policy))
+        self.assertEqual(0, await received[policy].get())
+      await clients[DROP].send(t.DemoPacket3())
+      # queued: 3 times 3 packets, then the 7 packets coalesced in one session
+      self.assertEqual([0, 1, 2, 16], [await received[DROP].get() for _ in range(4)])
+      self.assertEqual([0, 1, 9], [await received[COALESCE].get() for _ in range(3)])
+      await clients[DISCONNECT].session.waitClosed()
+      self.assertTrue(received[DISCONNECT].empty())
+      # the last packet of each key is kept
+      key[0] = lambda i: i % 2
+      await clients[DROP].send(t.DemoPacket3())
+      self.assertEqual([0, 1, 2, 13], [await received[DROP].get() for _ in range(4)])
+      self.assertEqual([0, 9, 8], [await received[COALESCE].get() for _ in range(3)])
+      for client in clients.values():
+        await client.close()
+    try:
+      asyncio.run(run())
+    finally:
+      server.shutdown()
+
+
+_TEST_PACKET = t.DemoPacket(fByte=1, fShort=2, fInt=3, fLong=4, fFloat=5.0, fDouble=6.0, fString="x")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+
+class BinaryTreeNode(BluePacket):
+  """node doc:BinaryTreeNode."""
+
+  packetHash = -7291972582254546107
+  packetHex = "0x9ACDB5922AD47345"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "data": ("string", False),
+    "left": ("BinaryTreeNode", False),
+    "right": ("BinaryTreeNode", False),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      data = None,  # string
+      left = None,  # BinaryTreeNode
+      right = None,  # BinaryTreeNode
+  ):
+    self.data = data
+    self.left = left
+    self.right = right
+
+  def __setattr__(self, name, value):
+    assertType(value, *BinaryTreeNode.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # Non-boolean fields
+    bpw.writeString(self.data)
+    if (self.left is None):
+      bpw.writeByte(0)
+    else:
+      bpw.writeByte(1)
+      self.left.serializeData(bpw)
+    if (self.right is None):
+      bpw.writeByte(0)
+    else:
+      bpw.writeByte(1)
+      self.right.serializeData(bpw)
+
+  def populateData(self, registry, bpr):
+    # Non-boolean fields
+    self.data = bpr.readString()
+    if bpr.readUnsignedByte() > 0:
+      self.left = BinaryTreeNode()
+      self.left.populateData(registry, bpr)
+    if bpr.readUnsignedByte() > 0:
+      self.right = BinaryTreeNode()
+      self.right.populateData(registry, bpr)
+
+  def fieldsStr(self):
+      if self.data: yield " data=" + toQuotedString(self.data)
+      if self.left: yield " left=" + str(self.left)
+      if self.right: yield " right=" + str(self.right)
+
+  def __str__(self):
+      return "{BinaryTreeNode " + self.packetHex + "".join(self.fieldsStr()) + "}"
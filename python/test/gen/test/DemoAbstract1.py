@@ -0,0 +1,7 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+
+class DemoAbstract1():
+    pass
@@ -0,0 +1,9 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+
+class DemoAbstract2():
+    """Abstract also have docstring doc:DemoAbstract2."""
+
+    pass
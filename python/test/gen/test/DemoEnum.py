@@ -0,0 +1,17 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+class DemoEnum(enum.Enum):
+    """Enum also have docstring doc:DemoEnum."""
+
+
+    # local shown as code comment
+
+    YES = 0
+    SURE = 1
+    ABSOLUTELY = 2
+
+    # enum label doc:NO_DOUBT
+    NO_DOUBT = 3
+
+DemoEnum._MEMBERS = tuple(DemoEnum)
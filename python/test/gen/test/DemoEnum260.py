@@ -0,0 +1,266 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+class DemoEnum260(enum.Enum):
+    a0 = 0
+    a1 = 1
+    a2 = 2
+    a3 = 3
+    a4 = 4
+    a5 = 5
+    a6 = 6
+    a7 = 7
+    a8 = 8
+    a9 = 9
+    b0 = 10
+    b1 = 11
+    b2 = 12
+    b3 = 13
+    b4 = 14
+    b5 = 15
+    b6 = 16
+    b7 = 17
+    b8 = 18
+    b9 = 19
+    c0 = 20
+    c1 = 21
+    c2 = 22
+    c3 = 23
+    c4 = 24
+    c5 = 25
+    c6 = 26
+    c7 = 27
+    c8 = 28
+    c9 = 29
+    d0 = 30
+    d1 = 31
+    d2 = 32
+    d3 = 33
+    d4 = 34
+    d5 = 35
+    d6 = 36
+    d7 = 37
+    d8 = 38
+    d9 = 39
+    e0 = 40
+    e1 = 41
+    e2 = 42
+    e3 = 43
+    e4 = 44
+    e5 = 45
+    e6 = 46
+    e7 = 47
+    e8 = 48
+    e9 = 49
+    f0 = 50
+    f1 = 51
+    f2 = 52
+    f3 = 53
+    f4 = 54
+    f5 = 55
+    f6 = 56
+    f7 = 57
+    f8 = 58
+    f9 = 59
+    g0 = 60
+    g1 = 61
+    g2 = 62
+    g3 = 63
+    g4 = 64
+    g5 = 65
+    g6 = 66
+    g7 = 67
+    g8 = 68
+    g9 = 69
+    h0 = 70
+    h1 = 71
+    h2 = 72
+    h3 = 73
+    h4 = 74
+    h5 = 75
+    h6 = 76
+    h7 = 77
+    h8 = 78
+    h9 = 79
+    i0 = 80
+    i1 = 81
+    i2 = 82
+    i3 = 83
+    i4 = 84
+    i5 = 85
+    i6 = 86
+    i7 = 87
+    i8 = 88
+    i9 = 89
+    j0 = 90
+    j1 = 91
+    j2 = 92
+    j3 = 93
+    j4 = 94
+    j5 = 95
+    j6 = 96
+    j7 = 97
+    j8 = 98
+    j9 = 99
+    k0 = 100
+    k1 = 101
+    k2 = 102
+    k3 = 103
+    k4 = 104
+    k5 = 105
+    k6 = 106
+    k7 = 107
+    k8 = 108
+    k9 = 109
+    l0 = 110
+    l1 = 111
+    l2 = 112
+    l3 = 113
+    l4 = 114
+    l5 = 115
+    l6 = 116
+    l7 = 117
+    l8 = 118
+    l9 = 119
+    m0 = 120
+    m1 = 121
+    m2 = 122
+    m3 = 123
+    m4 = 124
+    m5 = 125
+    m6 = 126
+    m7 = 127
+    m8 = 128
+    m9 = 129
+    n0 = 130
+    n1 = 131
+    n2 = 132
+    n3 = 133
+    n4 = 134
+    n5 = 135
+    n6 = 136
+    n7 = 137
+    n8 = 138
+    n9 = 139
+    o0 = 140
+    o1 = 141
+    o2 = 142
+    o3 = 143
+    o4 = 144
+    o5 = 145
+    o6 = 146
+    o7 = 147
+    o8 = 148
+    o9 = 149
+    p0 = 150
+    p1 = 151
+    p2 = 152
+    p3 = 153
+    p4 = 154
+    p5 = 155
+    p6 = 156
+    p7 = 157
+    p8 = 158
+    p9 = 159
+    q0 = 160
+    q1 = 161
+    q2 = 162
+    q3 = 163
+    q4 = 164
+    q5 = 165
+    q6 = 166
+    q7 = 167
+    q8 = 168
+    q9 = 169
+    r0 = 170
+    r1 = 171
+    r2 = 172
+    r3 = 173
+    r4 = 174
+    r5 = 175
+    r6 = 176
+    r7 = 177
+    r8 = 178
+    r9 = 179
+    s0 = 180
+    s1 = 181
+    s2 = 182
+    s3 = 183
+    s4 = 184
+    s5 = 185
+    s6 = 186
+    s7 = 187
+    s8 = 188
+    s9 = 189
+    t0 = 190
+    t1 = 191
+    t2 = 192
+    t3 = 193
+    t4 = 194
+    t5 = 195
+    t6 = 196
+    t7 = 197
+    t8 = 198
+    t9 = 199
+    u0 = 200
+    u1 = 201
+    u2 = 202
+    u3 = 203
+    u4 = 204
+    u5 = 205
+    u6 = 206
+    u7 = 207
+    u8 = 208
+    u9 = 209
+    v0 = 210
+    v1 = 211
+    v2 = 212
+    v3 = 213
+    v4 = 214
+    v5 = 215
+    v6 = 216
+    v7 = 217
+    v8 = 218
+    v9 = 219
+    w0 = 220
+    w1 = 221
+    w2 = 222
+    w3 = 223
+    w4 = 224
+    w5 = 225
+    w6 = 226
+    w7 = 227
+    w8 = 228
+    w9 = 229
+    x0 = 230
+    x1 = 231
+    x2 = 232
+    x3 = 233
+    x4 = 234
+    x5 = 235
+    x6 = 236
+    x7 = 237
+    x8 = 238
+    x9 = 239
+    y0 = 240
+    y1 = 241
+    y2 = 242
+    y3 = 243
+    y4 = 244
+    y5 = 245
+    y6 = 246
+    y7 = 247
+    y8 = 248
+    y9 = 249
+    z0 = 250
+    z1 = 251
+    z2 = 252
+    z3 = 253
+    z4 = 254
+    z5 = 255
+    z6 = 256
+    z7 = 257
+    z8 = 258
+    z9 = 259
+
+DemoEnum260._MEMBERS = tuple(DemoEnum260)
@@ -0,0 +1,51 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+
+class DemoFirst(BluePacket):
+  packetHash = 628961389297438537
+  packetHex = "0x8BA850D1A828F49"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "id": ("int", False),
+    "text": ("string", True),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      id = None,  # int
+      text = None,  # string[]
+  ):
+    self.id = id
+    self.text = text
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoFirst.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # Non-boolean fields
+    bpw.writeInt(self.id)
+    bpw.writeArrayNative(self.text, bpw.writeString)
+
+  def populateData(self, registry, bpr):
+    # Non-boolean fields
+    self.id = bpr.readInt()
+    self.text = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readString()
+      self.text.append(x)
+
+  def fieldsStr(self):
+      if self.id: yield " id=" + str(self.id)
+      if self.text:
+        yield " text={string *" + str(len(self.text)) + "|"
+        yield "|".join(toQuotedString(x) for x in self.text) + "}"
+
+  def __str__(self):
+      return "{DemoFirst " + self.packetHex + "".join(self.fieldsStr()) + "}"
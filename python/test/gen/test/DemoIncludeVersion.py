@@ -0,0 +1,47 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+from .DemoVersion import DemoVersion
+
+class DemoIncludeVersion(BluePacket):
+  packetHash = -4044184110803273943
+  packetHex = "0xC7E02BFA6D4AB729"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "version": ("DemoVersion", False),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      version = None,  # DemoVersion
+  ):
+    self.version = version
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoIncludeVersion.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # Non-boolean fields
+    if (self.version is None):
+      bpw.writeByte(0)
+    else:
+      bpw.writeByte(1)
+      self.version.serializeData(bpw)
+
+  def populateData(self, registry, bpr):
+    # Non-boolean fields
+    if bpr.readUnsignedByte() > 0:
+      self.version = DemoVersion()
+      self.version.populateData(registry, bpr)
+
+  def fieldsStr(self):
+      if self.version: yield " version=" + str(self.version)
+
+  def __str__(self):
+      return "{DemoIncludeVersion " + self.packetHex + "".join(self.fieldsStr()) + "}"
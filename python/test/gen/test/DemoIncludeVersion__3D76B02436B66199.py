@@ -0,0 +1,47 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+from .DemoVersion__3FC7F86674610139 import DemoVersion__3FC7F86674610139
+
+class DemoIncludeVersion__3D76B02436B66199(BluePacket):
+  packetHash = 4428920953148694937
+  packetHex = "0x3D76B02436B66199"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "version": ("DemoVersion__3FC7F86674610139", False),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      version = None,  # DemoVersion__3FC7F86674610139
+  ):
+    self.version = version
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoIncludeVersion__3D76B02436B66199.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # Non-boolean fields
+    if (self.version is None):
+      bpw.writeByte(0)
+    else:
+      bpw.writeByte(1)
+      self.version.serializeData(bpw)
+
+  def populateData(self, registry, bpr):
+    # Non-boolean fields
+    if bpr.readUnsignedByte() > 0:
+      self.version = DemoVersion__3FC7F86674610139()
+      self.version.populateData(registry, bpr)
+
+  def fieldsStr(self):
+      if self.version: yield " version=" + str(self.version)
+
+  def __str__(self):
+      return "{DemoIncludeVersion__3D76B02436B66199 " + self.packetHex + "".join(self.fieldsStr()) + "}"
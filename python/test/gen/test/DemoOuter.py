@@ -0,0 +1,49 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+
+class DemoOuter(BluePacket):
+  packetHash = -5737330595390180863
+  packetHex = "0xB060E8389EC9B201"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "oInt": ("int", False),
+    "oString": ("string", False),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      oInt = None,  # int
+      oString = None,  # string
+  ):
+    self.oInt = oInt
+    self.oString = oString
+
+    # last line show as code comment
+
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoOuter.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # Non-boolean fields
+    bpw.writeInt(self.oInt)
+    bpw.writeString(self.oString)
+
+  def populateData(self, registry, bpr):
+    # Non-boolean fields
+    self.oInt = bpr.readInt()
+    self.oString = bpr.readString()
+
+  def fieldsStr(self):
+      if self.oInt: yield " oInt=" + str(self.oInt)
+      if self.oString: yield " oString=" + toQuotedString(self.oString)
+
+  def __str__(self):
+      return "{DemoOuter " + self.packetHex + "".join(self.fieldsStr()) + "}"
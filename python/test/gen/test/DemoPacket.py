@@ -0,0 +1,247 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+from .DemoOuter import DemoOuter
+from .DemoEnum import DemoEnum
+
+class DemoPacket(BluePacket):
+  """This is a docstring for this packet doc:DemoPacket.
+
+  Multi-line, for doc:DemoPacket
+  """
+
+  packetHash = -777183301505584489
+  packetHex = "0xF536E3E7AC64F297"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "fBoolean": ("bool", False),
+    "fByte": ("byte", False),
+    "fShort": ("short", False),
+    "fInt": ("int", False),
+    "fLong": ("long", False),
+    "fFloat": ("float", False),
+    "fDouble": ("double", False),
+    "fString": ("string", False),
+    "fLongstring": ("string", False),
+    "xPacket": ("packet", False),
+    "emptyPacket": ("packet", False),
+    "fInner": ("MyInner", False),
+    "aInner": ("MyInner", True),
+    "fOuter": ("DemoOuter", False),
+    "aOuter": ("DemoOuter", True),
+    "fEnum": ("MyEnum", False),
+    "oEnum": ("DemoEnum", False),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      fBoolean = None,  # bool
+      fByte = None,  # byte
+      fShort = None,  # short
+      fInt = None,  # int
+      fLong = None,  # long
+      fFloat = None,  # float
+      fDouble = None,  # double
+      fString = None,  # string
+      fLongstring = None,  # string
+      xPacket = None,  # packet
+      emptyPacket = None,  # packet
+      fInner = None,  # MyInner
+      aInner = None,  # MyInner[]
+      fOuter = None,  # DemoOuter
+      aOuter = None,  # DemoOuter[]
+      fEnum = None,  # MyEnum
+      oEnum = None,  # DemoEnum
+  ):
+    self.fBoolean = fBoolean
+    self.fByte = fByte
+    self.fShort = fShort
+    self.fInt = fInt
+    self.fLong = fLong
+    self.fFloat = fFloat
+    self.fDouble = fDouble
+    self.fString = fString
+    self.fLongstring = fLongstring
+    self.xPacket = xPacket
+    self.emptyPacket = emptyPacket
+
+    # Inner field with just one int doc:fInner
+    self.fInner = fInner
+    self.aInner = aInner
+
+    # External class and enum, show in code comment
+
+    self.fOuter = fOuter
+    self.aOuter = aOuter
+
+    # Enum test labels doc:fEnum
+    # Multi-line inner doc:fEnum
+    self.fEnum = fEnum or self.MyEnum(0)
+    self.oEnum = oEnum or DemoEnum(0)
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoPacket.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # boolean fields are packed into bytes
+    bin = 0
+    if self.fBoolean: bin |= 1
+    bpw.writeUnsignedByte(bin)
+    # Non-boolean fields
+    bpw.writeArray(self.aInner)
+    bpw.writeArray(self.aOuter)
+    bpw.writeBluePacket(self.emptyPacket)
+    bpw.writeByte(self.fByte)
+    bpw.writeDouble(self.fDouble)
+    bpw.writeUnsignedByte(0 if self.fEnum is None else self.fEnum.value)
+    bpw.writeFloat(self.fFloat)
+    if (self.fInner is None):
+      bpw.writeByte(0)
+    else:
+      bpw.writeByte(1)
+      self.fInner.serializeData(bpw)
+    bpw.writeInt(self.fInt)
+    bpw.writeLong(self.fLong)
+    bpw.writeString(self.fLongstring)
+    if (self.fOuter is None):
+      bpw.writeByte(0)
+    else:
+      bpw.writeByte(1)
+      self.fOuter.serializeData(bpw)
+    bpw.writeShort(self.fShort)
+    bpw.writeString(self.fString)
+    bpw.writeUnsignedByte(0 if self.oEnum is None else self.oEnum.value)
+    bpw.writeBluePacket(self.xPacket)
+
+  def populateData(self, registry, bpr):
+    # boolean fields are packed into bytes
+    bin = bpr.readByte()
+    self.fBoolean = (bin & 1) != 0
+    # Non-boolean fields
+    self.aInner = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = self.MyInner()
+      x.populateData(registry, bpr)
+      self.aInner.append(x)
+    self.aOuter = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = DemoOuter()
+      x.populateData(registry, bpr)
+      self.aOuter.append(x)
+    self.emptyPacket = registry.deserialize_internal(bpr)
+    self.fByte = bpr.readByte()
+    self.fDouble = bpr.readDouble()
+    self.fEnum = self.MyEnum._MEMBERS[bpr.readUnsignedByte()]
+    self.fFloat = bpr.readFloat()
+    if bpr.readUnsignedByte() > 0:
+      self.fInner = self.MyInner()
+      self.fInner.populateData(registry, bpr)
+    self.fInt = bpr.readInt()
+    self.fLong = bpr.readLong()
+    self.fLongstring = bpr.readString()
+    if bpr.readUnsignedByte() > 0:
+      self.fOuter = DemoOuter()
+      self.fOuter.populateData(registry, bpr)
+    self.fShort = bpr.readShort()
+    self.fString = bpr.readString()
+    self.oEnum = DemoEnum._MEMBERS[bpr.readUnsignedByte()]
+    self.xPacket = registry.deserialize_internal(bpr)
+
+  def fieldsStr(self):
+      if self.aInner:
+        yield " aInner={MyInner *" + str(len(self.aInner)) + "|"
+        yield "|".join("".join(x.fieldsStr()) for x in self.aInner) + "}"
+      if self.aOuter:
+        yield " aOuter={DemoOuter *" + str(len(self.aOuter)) + "|"
+        yield "|".join("".join(x.fieldsStr()) for x in self.aOuter) + "}"
+      if self.emptyPacket: yield " emptyPacket=" + str(self.emptyPacket)
+      if self.fBoolean: yield " fBoolean=1"
+      if self.fByte: yield " fByte=" + str(self.fByte)
+      if self.fDouble: yield " fDouble=" + str(self.fDouble)
+      if self.fEnum.value: yield " fEnum=" + self.fEnum.name
+      if self.fFloat: yield " fFloat=" + str(self.fFloat)
+      if self.fInner: yield " fInner=" + str(self.fInner)
+      if self.fInt: yield " fInt=" + str(self.fInt)
+      if self.fLong: yield " fLong=" + str(self.fLong)
+      if self.fLongstring: yield " fLongstring=" + toQuotedString(self.fLongstring)
+      if self.fOuter: yield " fOuter=" + str(self.fOuter)
+      if self.fShort: yield " fShort=" + str(self.fShort)
+      if self.fString: yield " fString=" + toQuotedString(self.fString)
+      if self.oEnum.value: yield " oEnum=" + self.oEnum.name
+      if self.xPacket: yield " xPacket=" + str(self.xPacket)
+
+  def __str__(self):
+      return "{DemoPacket " + self.packetHex + "".join(self.fieldsStr()) + "}"
+
+  ### INNER CLASSES ###
+
+  class MyInner(BluePacket):
+    """Docstring for inner class doc:MyInner."""
+
+    TYPE_INFO = {
+      # name: (type, is_list)
+      "aEnum": ("MyEnum", True),
+      "iEnum": ("MyEnum", False),
+      "iInteger": ("int", False),
+    }
+
+    ### CONSTRUCTOR ###
+
+    def __init__(
+        self, *,
+        iInteger = None,  # int
+        iEnum = None,  # MyEnum
+        aEnum = None,  # MyEnum[]
+    ):
+
+      # field comment inner class
+      self.iInteger = iInteger
+      self.iEnum = iEnum or DemoPacket.MyEnum(0)
+      self.aEnum = aEnum
+
+    def __setattr__(self, name, value):
+      assertType(value, *DemoPacket.MyInner.TYPE_INFO[name])
+      self.__dict__[name] = value
+
+    ### HELPER FUNCTIONS ###
+
+    def serializeData(self, bpw):
+      # Non-boolean fields
+      bpw.writeArrayEnum(self.aEnum)
+      bpw.writeUnsignedByte(0 if self.iEnum is None else self.iEnum.value)
+      bpw.writeInt(self.iInteger)
+
+    def populateData(self, registry, bpr):
+      # Non-boolean fields
+      self.aEnum = bpr.readArrayEnum(DemoPacket.MyEnum._MEMBERS)
+      self.iEnum = DemoPacket.MyEnum._MEMBERS[bpr.readUnsignedByte()]
+      self.iInteger = bpr.readInt()
+
+    def fieldsStr(self):
+        if self.aEnum:
+          yield " aEnum={MyEnum *" + str(len(self.aEnum)) + "|"
+          yield "|".join(x.name for x in self.aEnum) + "}"
+        if self.iEnum.value: yield " iEnum=" + self.iEnum.name
+        if self.iInteger: yield " iInteger=" + str(self.iInteger)
+
+    def __str__(self):
+        return "{MyInner" + "".join(self.fieldsStr()) + "}"
+
+  ### INNER ENUMS ###
+  class MyEnum(enum.Enum):
+      DUNNO = 0
+      MAYBE = 1
+      POSSIBLE = 2
+      WHOKNOWS = 3
+
+      # Another local comment
+      # Will not show in code
+
+
+  MyEnum._MEMBERS = tuple(MyEnum)
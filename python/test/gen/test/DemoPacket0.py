@@ -0,0 +1,27 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+
+class DemoPacket0(BluePacket):
+  packetHash = -5693327742438229220
+  packetHex = "0xB0FD3C953217BB1C"
+  TYPE_INFO = {
+    # name: (type, is_list)
+  }
+
+  ### CONSTRUCTOR ###
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+      pass
+
+  def populateData(self, registry, bpr):
+      pass
+
+  def fieldsStr(self):
+      pass
+
+  def __str__(self):
+      return "{DemoPacket0 " + self.packetHex + "}"
@@ -0,0 +1,175 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+from .DemoOuter import DemoOuter
+from .DemoEnum260 import DemoEnum260
+
+class DemoPacket2(BluePacket):
+  packetHash = -4035910894404497038
+  packetHex = "0xC7FD906CB9E41172"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "aBoolean": ("bool", True),
+    "aByte": ("byte", True),
+    "aShort": ("short", True),
+    "aInt": ("int", True),
+    "aLong": ("long", True),
+    "aFloat": ("float", True),
+    "aDouble": ("double", True),
+    "aString": ("string", True),
+    "aZero": ("int", True),
+    "aEmpty": ("string", True),
+    "aNull": ("DemoOuter", True),
+    "largeEnum1": ("DemoEnum260", False),
+    "largeEnum2": ("DemoEnum260", False),
+    "aLargeEnum": ("DemoEnum260", True),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      aBoolean = None,  # bool[]
+      aByte = None,  # byte[]
+      aShort = None,  # short[]
+      aInt = None,  # int[]
+      aLong = None,  # long[]
+      aFloat = None,  # float[]
+      aDouble = None,  # double[]
+      aString = None,  # string[]
+      aZero = None,  # int[]
+      aEmpty = None,  # string[]
+      aNull = None,  # DemoOuter[]
+      largeEnum1 = None,  # DemoEnum260
+      largeEnum2 = None,  # DemoEnum260
+      aLargeEnum = None,  # DemoEnum260[]
+  ):
+    self.aBoolean = aBoolean
+    self.aByte = aByte
+    self.aShort = aShort
+    self.aInt = aInt
+    self.aLong = aLong
+    self.aFloat = aFloat
+    self.aDouble = aDouble
+    self.aString = aString
+    self.aZero = aZero
+    self.aEmpty = aEmpty
+    self.aNull = aNull
+    self.largeEnum1 = largeEnum1 or DemoEnum260(0)
+    self.largeEnum2 = largeEnum2 or DemoEnum260(0)
+    self.aLargeEnum = aLargeEnum
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoPacket2.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # Non-boolean fields
+    bpw.writeListBool(self.aBoolean)
+    bpw.writeArrayNative(self.aByte, bpw.writeByte)
+    bpw.writeArrayNative(self.aDouble, bpw.writeDouble)
+    bpw.writeArrayNative(self.aEmpty, bpw.writeString)
+    bpw.writeArrayNative(self.aFloat, bpw.writeFloat)
+    bpw.writeArrayNative(self.aInt, bpw.writeInt)
+    bpw.writeArrayLargeEnum(self.aLargeEnum)
+    bpw.writeArrayNative(self.aLong, bpw.writeLong)
+    bpw.writeArray(self.aNull)
+    bpw.writeArrayNative(self.aShort, bpw.writeShort)
+    bpw.writeArrayNative(self.aString, bpw.writeString)
+    bpw.writeArrayNative(self.aZero, bpw.writeInt)
+    bpw.writeUnsignedShort(0 if self.largeEnum1 is None else self.largeEnum1.value)
+    bpw.writeUnsignedShort(0 if self.largeEnum2 is None else self.largeEnum2.value)
+
+  def populateData(self, registry, bpr):
+    # Non-boolean fields
+    self.aBoolean = bpr.readListBool();
+    self.aByte = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readByte()
+      self.aByte.append(x)
+    self.aDouble = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readDouble()
+      self.aDouble.append(x)
+    self.aEmpty = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readString()
+      self.aEmpty.append(x)
+    self.aFloat = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readFloat()
+      self.aFloat.append(x)
+    self.aInt = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readInt()
+      self.aInt.append(x)
+    self.aLargeEnum = bpr.readArrayLargeEnum(DemoEnum260._MEMBERS)
+    self.aLong = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readLong()
+      self.aLong.append(x)
+    self.aNull = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = DemoOuter()
+      x.populateData(registry, bpr)
+      self.aNull.append(x)
+    self.aShort = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readShort()
+      self.aShort.append(x)
+    self.aString = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readString()
+      self.aString.append(x)
+    self.aZero = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readInt()
+      self.aZero.append(x)
+    self.largeEnum1 = DemoEnum260._MEMBERS[bpr.readUnsignedShort()]
+    self.largeEnum2 = DemoEnum260._MEMBERS[bpr.readUnsignedShort()]
+
+  def fieldsStr(self):
+      if self.aBoolean:
+        yield " aBoolean={bool *" + str(len(self.aBoolean)) + "|"
+        yield "|".join("1" if x else "0" for x in self.aBoolean) + "}"
+      if self.aByte:
+        yield " aByte={byte *" + str(len(self.aByte)) + "|"
+        yield "|".join(str(x) for x in self.aByte) + "}"
+      if self.aDouble:
+        yield " aDouble={double *" + str(len(self.aDouble)) + "|"
+        yield "|".join(str(x) for x in self.aDouble) + "}"
+      if self.aEmpty:
+        yield " aEmpty={string *" + str(len(self.aEmpty)) + "|"
+        yield "|".join(toQuotedString(x) for x in self.aEmpty) + "}"
+      if self.aFloat:
+        yield " aFloat={float *" + str(len(self.aFloat)) + "|"
+        yield "|".join(str(x) for x in self.aFloat) + "}"
+      if self.aInt:
+        yield " aInt={int *" + str(len(self.aInt)) + "|"
+        yield "|".join(str(x) for x in self.aInt) + "}"
+      if self.aLargeEnum:
+        yield " aLargeEnum={DemoEnum260 *" + str(len(self.aLargeEnum)) + "|"
+        yield "|".join(x.name for x in self.aLargeEnum) + "}"
+      if self.aLong:
+        yield " aLong={long *" + str(len(self.aLong)) + "|"
+        yield "|".join(str(x) for x in self.aLong) + "}"
+      if self.aNull:
+        yield " aNull={DemoOuter *" + str(len(self.aNull)) + "|"
+        yield "|".join("".join(x.fieldsStr()) for x in self.aNull) + "}"
+      if self.aShort:
+        yield " aShort={short *" + str(len(self.aShort)) + "|"
+        yield "|".join(str(x) for x in self.aShort) + "}"
+      if self.aString:
+        yield " aString={string *" + str(len(self.aString)) + "|"
+        yield "|".join(toQuotedString(x) for x in self.aString) + "}"
+      if self.aZero:
+        yield " aZero={int *" + str(len(self.aZero)) + "|"
+        yield "|".join(str(x) for x in self.aZero) + "}"
+      if self.largeEnum1.value: yield " largeEnum1=" + self.largeEnum1.name
+      if self.largeEnum2.value: yield " largeEnum2=" + self.largeEnum2.name
+
+  def __str__(self):
+      return "{DemoPacket2 " + self.packetHex + "".join(self.fieldsStr()) + "}"
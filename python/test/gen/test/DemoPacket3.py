@@ -0,0 +1,43 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+from .DemoEnum import DemoEnum
+
+class DemoPacket3(BluePacket):
+  packetHash = 3706623474888074790
+  packetHex = "0x3370926970D3E626"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "possible": ("DemoEnum", True),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      possible = None,  # DemoEnum[]
+  ):
+    self.possible = possible
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoPacket3.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # Non-boolean fields
+    bpw.writeArrayEnum(self.possible)
+
+  def populateData(self, registry, bpr):
+    # Non-boolean fields
+    self.possible = bpr.readArrayEnum(DemoEnum._MEMBERS)
+
+  def fieldsStr(self):
+      if self.possible:
+        yield " possible={DemoEnum *" + str(len(self.possible)) + "|"
+        yield "|".join(x.name for x in self.possible) + "}"
+
+  def __str__(self):
+      return "{DemoPacket3 " + self.packetHex + "".join(self.fieldsStr()) + "}"
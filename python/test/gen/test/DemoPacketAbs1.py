@@ -0,0 +1,28 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+from .DemoAbstract1 import DemoAbstract1
+
+class DemoPacketAbs1(BluePacket, DemoAbstract1):
+  packetHash = 3438895385741716791
+  packetHex = "0x2FB969221EDD6D37"
+  TYPE_INFO = {
+    # name: (type, is_list)
+  }
+
+  ### CONSTRUCTOR ###
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+      pass
+
+  def populateData(self, registry, bpr):
+      pass
+
+  def fieldsStr(self):
+      pass
+
+  def __str__(self):
+      return "{DemoPacketAbs1 " + self.packetHex + "}"
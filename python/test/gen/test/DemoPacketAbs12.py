@@ -0,0 +1,29 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+from .DemoAbstract1 import DemoAbstract1
+from .DemoAbstract2 import DemoAbstract2
+
+class DemoPacketAbs12(BluePacket, DemoAbstract1, DemoAbstract2):
+  packetHash = 7137313653103464500
+  packetHex = "0x630CD4F3CFC71034"
+  TYPE_INFO = {
+    # name: (type, is_list)
+  }
+
+  ### CONSTRUCTOR ###
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+      pass
+
+  def populateData(self, registry, bpr):
+      pass
+
+  def fieldsStr(self):
+      pass
+
+  def __str__(self):
+      return "{DemoPacketAbs12 " + self.packetHex + "}"
@@ -0,0 +1,28 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+from .DemoAbstract2 import DemoAbstract2
+
+class DemoPacketAbs2(BluePacket, DemoAbstract2):
+  packetHash = 4772161707595727023
+  packetHex = "0x423A1FC9FFF700AF"
+  TYPE_INFO = {
+    # name: (type, is_list)
+  }
+
+  ### CONSTRUCTOR ###
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+      pass
+
+  def populateData(self, registry, bpr):
+      pass
+
+  def fieldsStr(self):
+      pass
+
+  def __str__(self):
+      return "{DemoPacketAbs2 " + self.packetHex + "}"
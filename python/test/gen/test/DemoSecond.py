@@ -0,0 +1,91 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+from .DemoFirst import DemoFirst
+
+class DemoSecond(BluePacket):
+  packetHash = 6063881636193840158
+  packetHex = "0x54273C3865592C1E"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "id": ("int", False),
+    "text": ("string", True),
+    "enabled": ("bool", False),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      id = None,  # int
+      text = None,  # string[]
+      enabled = None,  # bool
+  ):
+    self.id = id
+    self.text = text
+    self.enabled = enabled
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoSecond.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # boolean fields are packed into bytes
+    bin = 0
+    if self.enabled: bin |= 1
+    bpw.writeUnsignedByte(bin)
+    # Non-boolean fields
+    bpw.writeInt(self.id)
+    bpw.writeArrayNative(self.text, bpw.writeString)
+
+  def populateData(self, registry, bpr):
+    # boolean fields are packed into bytes
+    bin = bpr.readByte()
+    self.enabled = (bin & 1) != 0
+    # Non-boolean fields
+    self.id = bpr.readInt()
+    self.text = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readString()
+      self.text.append(x)
+
+  def fieldsStr(self):
+      if self.enabled: yield " enabled=1"
+      if self.id: yield " id=" + str(self.id)
+      if self.text:
+        yield " text={string *" + str(len(self.text)) + "|"
+        yield "|".join(toQuotedString(x) for x in self.text) + "}"
+
+  def __str__(self):
+      return "{DemoSecond " + self.packetHex + "".join(self.fieldsStr()) + "}"
+
+  """Get all the convertible BluePackets.
+
+  Returns:
+      List of BluePacket instances
+  """
+
+  @staticmethod
+  def convert():
+    return [
+      DemoFirst()
+    ]
+
+  @staticmethod
+  def convertDemoFirst(other):
+    """Converter method to build a DemoSecond from an instance of DemoFirst.
+
+    Args:
+        other: populated instance of DemoFirst
+    Returns:
+        new instance of DemoSecond populated with data from other
+    """
+
+    assertType(other, DemoFirst, False)
+    return DemoSecond(
+        id=other.id,
+        text=other.text,
+    )
@@ -0,0 +1,193 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+
+class DemoUnsigned(BluePacket):
+  packetHash = 4436886959950420991
+  packetHex = "0x3D92FD2EB4685BFF"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "ub": ("ubyte", False),
+    "us": ("ushort", False),
+    "lub": ("ubyte", True),
+    "lus": ("ushort", True),
+    "a0": ("bool", False),
+    "a1": ("bool", False),
+    "a2": ("bool", False),
+    "a3": ("bool", False),
+    "a4": ("bool", False),
+    "a5": ("bool", False),
+    "a6": ("bool", False),
+    "a7": ("bool", False),
+    "b0": ("bool", False),
+    "b1": ("bool", False),
+    "b2": ("bool", False),
+    "b3": ("bool", False),
+    "b4": ("bool", False),
+    "b5": ("bool", False),
+    "b6": ("bool", False),
+    "b7": ("bool", False),
+    "c0": ("bool", False),
+    "c1": ("bool", False),
+    "c2": ("bool", False),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      ub = None,  # ubyte
+      us = None,  # ushort
+      lub = None,  # ubyte[]
+      lus = None,  # ushort[]
+      a0 = None,  # bool
+      a1 = None,  # bool
+      a2 = None,  # bool
+      a3 = None,  # bool
+      a4 = None,  # bool
+      a5 = None,  # bool
+      a6 = None,  # bool
+      a7 = None,  # bool
+      b0 = None,  # bool
+      b1 = None,  # bool
+      b2 = None,  # bool
+      b3 = None,  # bool
+      b4 = None,  # bool
+      b5 = None,  # bool
+      b6 = None,  # bool
+      b7 = None,  # bool
+      c0 = None,  # bool
+      c1 = None,  # bool
+      c2 = None,  # bool
+  ):
+    self.ub = ub
+    self.us = us
+    self.lub = lub
+    self.lus = lus
+    self.a0 = a0
+    self.a1 = a1
+    self.a2 = a2
+    self.a3 = a3
+    self.a4 = a4
+    self.a5 = a5
+    self.a6 = a6
+    self.a7 = a7
+    self.b0 = b0
+    self.b1 = b1
+    self.b2 = b2
+    self.b3 = b3
+    self.b4 = b4
+    self.b5 = b5
+    self.b6 = b6
+    self.b7 = b7
+    self.c0 = c0
+    self.c1 = c1
+    self.c2 = c2
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoUnsigned.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # boolean fields are packed into bytes
+    bin = 0
+    if self.a0: bin |= 1
+    if self.a1: bin |= 2
+    if self.a2: bin |= 4
+    if self.a3: bin |= 8
+    if self.a4: bin |= 16
+    if self.a5: bin |= 32
+    if self.a6: bin |= 64
+    if self.a7: bin |= 128
+    bpw.writeUnsignedByte(bin)
+    bin = 0
+    if self.b0: bin |= 1
+    if self.b1: bin |= 2
+    if self.b2: bin |= 4
+    if self.b3: bin |= 8
+    if self.b4: bin |= 16
+    if self.b5: bin |= 32
+    if self.b6: bin |= 64
+    if self.b7: bin |= 128
+    bpw.writeUnsignedByte(bin)
+    bin = 0
+    if self.c0: bin |= 1
+    if self.c1: bin |= 2
+    if self.c2: bin |= 4
+    bpw.writeUnsignedByte(bin)
+    # Non-boolean fields
+    bpw.writeArrayNative(self.lub, bpw.writeUnsignedByte)
+    bpw.writeArrayNative(self.lus, bpw.writeUnsignedShort)
+    bpw.writeUnsignedByte(self.ub)
+    bpw.writeUnsignedShort(self.us)
+
+  def populateData(self, registry, bpr):
+    # boolean fields are packed into bytes
+    bin = bpr.readByte()
+    self.a0 = (bin & 1) != 0
+    self.a1 = (bin & 2) != 0
+    self.a2 = (bin & 4) != 0
+    self.a3 = (bin & 8) != 0
+    self.a4 = (bin & 16) != 0
+    self.a5 = (bin & 32) != 0
+    self.a6 = (bin & 64) != 0
+    self.a7 = (bin & 128) != 0
+    bin = bpr.readByte()
+    self.b0 = (bin & 1) != 0
+    self.b1 = (bin & 2) != 0
+    self.b2 = (bin & 4) != 0
+    self.b3 = (bin & 8) != 0
+    self.b4 = (bin & 16) != 0
+    self.b5 = (bin & 32) != 0
+    self.b6 = (bin & 64) != 0
+    self.b7 = (bin & 128) != 0
+    bin = bpr.readByte()
+    self.c0 = (bin & 1) != 0
+    self.c1 = (bin & 2) != 0
+    self.c2 = (bin & 4) != 0
+    # Non-boolean fields
+    self.lub = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readUnsignedByte()
+      self.lub.append(x)
+    self.lus = []
+    for _ in range(bpr.readUnsignedByte()):
+      x = bpr.readUnsignedShort()
+      self.lus.append(x)
+    self.ub = bpr.readUnsignedByte()
+    self.us = bpr.readUnsignedShort()
+
+  def fieldsStr(self):
+      if self.a0: yield " a0=1"
+      if self.a1: yield " a1=1"
+      if self.a2: yield " a2=1"
+      if self.a3: yield " a3=1"
+      if self.a4: yield " a4=1"
+      if self.a5: yield " a5=1"
+      if self.a6: yield " a6=1"
+      if self.a7: yield " a7=1"
+      if self.b0: yield " b0=1"
+      if self.b1: yield " b1=1"
+      if self.b2: yield " b2=1"
+      if self.b3: yield " b3=1"
+      if self.b4: yield " b4=1"
+      if self.b5: yield " b5=1"
+      if self.b6: yield " b6=1"
+      if self.b7: yield " b7=1"
+      if self.c0: yield " c0=1"
+      if self.c1: yield " c1=1"
+      if self.c2: yield " c2=1"
+      if self.lub:
+        yield " lub={ubyte *" + str(len(self.lub)) + "|"
+        yield "|".join(str(x) for x in self.lub) + "}"
+      if self.lus:
+        yield " lus={ushort *" + str(len(self.lus)) + "|"
+        yield "|".join(str(x) for x in self.lus) + "}"
+      if self.ub: yield " ub=" + str(self.ub)
+      if self.us: yield " us=" + str(self.us)
+
+  def __str__(self):
+      return "{DemoUnsigned " + self.packetHex + "".join(self.fieldsStr()) + "}"
@@ -0,0 +1,52 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+
+class DemoVersion(BluePacket):
+  packetHash = 7260826007793545337
+  packetHex = "0x64C3A2C8DA73B079"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "major": ("int", False),
+    "minor": ("int", False),
+    "patch": ("int", False),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      major = None,  # int
+      minor = None,  # int
+      patch = None,  # int
+  ):
+    self.major = major
+    self.minor = minor
+    self.patch = patch
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoVersion.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # Non-boolean fields
+    bpw.writeInt(self.major)
+    bpw.writeInt(self.minor)
+    bpw.writeInt(self.patch)
+
+  def populateData(self, registry, bpr):
+    # Non-boolean fields
+    self.major = bpr.readInt()
+    self.minor = bpr.readInt()
+    self.patch = bpr.readInt()
+
+  def fieldsStr(self):
+      if self.major: yield " major=" + str(self.major)
+      if self.minor: yield " minor=" + str(self.minor)
+      if self.patch: yield " patch=" + str(self.patch)
+
+  def __str__(self):
+      return "{DemoVersion " + self.packetHex + "".join(self.fieldsStr()) + "}"
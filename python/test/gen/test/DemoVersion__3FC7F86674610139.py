@@ -0,0 +1,40 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+import enum
+
+from blue_packet import BluePacket, assertType, toQuotedString
+
+class DemoVersion__3FC7F86674610139(BluePacket):
+  packetHash = 4595915063677747513
+  packetHex = "0x3FC7F86674610139"
+  TYPE_INFO = {
+    # name: (type, is_list)
+    "version": ("int", False),
+  }
+
+  ### CONSTRUCTOR ###
+
+  def __init__(
+      self, *,
+      version = None,  # int
+  ):
+    self.version = version
+
+  def __setattr__(self, name, value):
+    assertType(value, *DemoVersion__3FC7F86674610139.TYPE_INFO[name])
+    self.__dict__[name] = value
+
+  ### HELPER FUNCTIONS ###
+
+  def serializeData(self, bpw):
+    # Non-boolean fields
+    bpw.writeInt(self.version)
+
+  def populateData(self, registry, bpr):
+    # Non-boolean fields
+    self.version = bpr.readInt()
+
+  def fieldsStr(self):
+      if self.version: yield " version=" + str(self.version)
+
+  def __str__(self):
+      return "{DemoVersion__3FC7F86674610139 " + self.packetHex + "".join(self.fieldsStr()) + "}"
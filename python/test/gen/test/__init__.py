@@ -0,0 +1,22 @@
+from .DemoPacket import DemoPacket
+from .DemoEnum import DemoEnum
+from .DemoEnum260 import DemoEnum260
+from .DemoOuter import DemoOuter
+from .BinaryTreeNode import BinaryTreeNode
+from .DemoPacket2 import DemoPacket2
+from .DemoPacket3 import DemoPacket3
+from .DemoUnsigned import DemoUnsigned
+from .DemoPacket0 import DemoPacket0
+from .DemoAbstract1 import DemoAbstract1
+from .DemoAbstract2 import DemoAbstract2
+from .DemoPacketAbs1 import DemoPacketAbs1
+from .DemoPacketAbs2 import DemoPacketAbs2
+from .DemoPacketAbs12 import DemoPacketAbs12
+from .DemoVersion__3FC7F86674610139 import DemoVersion__3FC7F86674610139
+from .DemoVersion import DemoVersion
+from .DemoIncludeVersion__3D76B02436B66199 import DemoIncludeVersion__3D76B02436B66199
+from .DemoIncludeVersion import DemoIncludeVersion
+from .DemoFirst import DemoFirst
+from .DemoSecond import DemoSecond
+from .blue_packet_api import BluePacketAPI
+from .blue_packet_service import BluePacketServiceClient, BluePacketServiceHandlers
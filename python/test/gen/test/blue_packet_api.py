@@ -0,0 +1,9 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+
+"""API information for this package."""
+
+class BluePacketAPI:
+  """API Version calculated for all the packets in this package."""
+
+  VERSION = 6289540679487913423
+  VERSION_HEX = "0x5748EFECB13EFDCF"
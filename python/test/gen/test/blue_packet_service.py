@@ -0,0 +1,76 @@
+# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost
+
+"""Service stubs for this package, see blue_packet_rpc_client and blue_packet_rpc_server."""
+
+from typing import List
+
+from blue_packet_rpc_client import RpcClient, serviceResponse
+from .DemoOuter import DemoOuter
+from .DemoPacket import DemoPacket
+from .DemoPacket2 import DemoPacket2
+from .DemoPacket3 import DemoPacket3
+
+# error packet hashes of each rpc
+_ERRORS_DemoOuter = frozenset([DemoPacket.packetHash])
+_ERRORS_DemoPacket3 = frozenset([])
+
+
+class BluePacketServiceClient(RpcClient):
+  """Typed client stubs of the service declarations.
+
+  Responses are checked by packet hash: error packets raise RpcServiceError.
+  Messages of handlers are one-way, sent in batches, see RpcClient._executeOneWay().
+  """
+
+  def callDemoOuter(self, request: DemoOuter, timeout=None) -> DemoOuter:
+    """Answers the same packet with oInt incremented."""
+
+    response = self._execute(request, timeout)
+    return serviceResponse(response, DemoOuter.packetHash, _ERRORS_DemoOuter)
+
+  def callDemoOuterBatch(self, requests: List[DemoOuter], timeout=None) -> List[DemoOuter]:
+    """Send the requests in a single frame, raises RpcServiceError on the first error."""
+
+    responses = self._executeBatch(requests, timeout)
+    return [serviceResponse(r, DemoOuter.packetHash, _ERRORS_DemoOuter) for r in responses]
+
+  def callDemoPacket3(self, request: DemoPacket3, timeout=None) -> DemoPacket3:
+    response = self._execute(request, timeout)
+    return serviceResponse(response, DemoPacket3.packetHash, _ERRORS_DemoPacket3)
+
+  def callDemoPacket3Batch(self, requests: List[DemoPacket3], timeout=None) -> List[DemoPacket3]:
+    """Send the requests in a single frame, raises RpcServiceError on the first error."""
+
+    responses = self._executeBatch(requests, timeout)
+    return [serviceResponse(r, DemoPacket3.packetHash, _ERRORS_DemoPacket3) for r in responses]
+
+  def sendDemoPacket2(self, message: DemoPacket2) -> None:
+    self._executeOneWay(message)
+
+
+class BluePacketServiceHandlers:
+  """Server side of the service declarations.
+
+  Override the methods of the requests the server handles, then bind() them to an RpcServer or an AsyncRpcServer;
+  the other requests get no handler.
+  """
+
+  def onDemoOuter(self, request: DemoOuter) -> DemoOuter:
+    """Answers the same packet with oInt incremented."""
+
+  def onDemoPacket3(self, request: DemoPacket3) -> DemoPacket3:
+    pass
+
+  def onDemoPacket2(self, request: DemoPacket2) -> None:
+    pass
+
+  def bind(self, server):
+    """Declare every overridden method as the handler of its request, returns the server."""
+
+    if type(self).onDemoOuter is not BluePacketServiceHandlers.onDemoOuter:
+      server.onReceive(DemoOuter, self.onDemoOuter)
+    if type(self).onDemoPacket3 is not BluePacketServiceHandlers.onDemoPacket3:
+      server.onReceive(DemoPacket3, self.onDemoPacket3)
+    if type(self).onDemoPacket2 is not BluePacketServiceHandlers.onDemoPacket2:
+      server.onReceive(DemoPacket2, self.onDemoPacket2)
+    return server
@@ -7,7 +7,7 @@ rm -rf gen doc > /dev/null
 
 echo "=== EXPORTING ==="
 mkdir -p gen/test
-../../scripts/export-python.py --output_dir gen/test ../../testdata/Demo.bp ../../testdata/DemoDeprecated.bp ../../testdata/DemoConvert.bp
+../../scripts/export-python.py --output_dir gen/test ../../testdata/Demo.bp ../../testdata/DemoDeprecated.bp ../../testdata/DemoConvert.bp ../../testdata/DemoService.bp
 
 echo "=== DOCUMENTATION ==="
 if [[ $(type -P doxygen) ]]
@@ -19,3 +19,4 @@ fi
 
 echo "=== TESTING ==="
 python3 TestBluePacket.py
+python3 TestBluePacketRpc.py
@@ -2,7 +2,7 @@
 import argparse
 import os, sys
 
-from libexport import Parser, println, versionHash
+from libexport import HANDLER_LABEL, Parser, println, versionHash
 
 DEFAULT_INDENT = "  "
 INNER_INDENT = DEFAULT_INDENT + "  "
@@ -208,32 +208,29 @@ def produceDeserializer(out, data, fields, indent, field_is_enum, parent_name):
     if (not pf.is_list and pf.type == 'bool') or not pf.name:
       continue
     ftype = "self." + pf.type if pf.type in data.inner or pf.type in data.enums else pf.type
+    if pf.type in field_is_enum:
+      # enums are decoded by indexing the tuple of their members
+      members = f"{parent_name}.{ftype}._MEMBERS" if parent_name else f"{ftype}._MEMBERS"
+      is_large = field_is_enum.get(pf.type, 0) > 256
     if pf.is_list:
       if pf.type == 'bool':
         println(out, f"{indent}  self.{pf.name} = bpr.readListBool();")
         continue
+      if pf.type in field_is_enum:
+        read_list = "readArrayLargeEnum" if is_large else "readArrayEnum"
+        println(out, f"{indent}  self.{pf.name} = bpr.{read_list}({members})")
+        continue
       println(out, f"{indent}  self.{pf.name} = []")
       println(out, f"{indent}  for _ in range(bpr.readUnsignedByte()):")
       if pf.type in PYTHON_READER:
         println(out, f"{indent}    x = {PYTHON_READER[pf.type]}")
-      elif pf.type in field_is_enum:
-        if field_is_enum.get(pf.type, 0) <= 256:
-          println(out, f"{indent}    x = {ftype}(bpr.readUnsignedByte())")
-        else:
-          println(out, f"{indent}    x = {ftype}(bpr.readUnsignedShort())")
       else:
         println(out, f"{indent}    x = {ftype}()")
         println(out, f"{indent}    x.populateData(registry, bpr)")
       println(out, f"{indent}    self.{pf.name}.append(x)")
     elif pf.type in field_is_enum:
-      if parent_name:
-        prefix = parent_name + "."
-      elif ftype in data.enums:
-        prefix = "self."
-      else:
-        prefix = ""
-      read_size = "readUnsignedByte" if field_is_enum.get(pf.type, 0) <= 256 else "readUnsignedShort"
-      println(out, f"{indent}  self.{pf.name} = {prefix}{ftype}(bpr.{read_size}())")
+      read_size = "readUnsignedShort" if is_large else "readUnsignedByte"
+      println(out, f"{indent}  self.{pf.name} = {members}[bpr.{read_size}()]")
     elif ftype in PYTHON_READER:
       println(out, f"{indent}  self.{pf.name} = {PYTHON_READER[pf.type]}")
     else:
@@ -339,6 +336,8 @@ def exportInnerEnum(out, data, indent0):
       i += 1
     elif pf.docstring:
       println(out)
+  println(out)
+  println(out, f"{indent0}{data.name}._MEMBERS = tuple({data.name})")
 
 
 def exportInnerClass(out, data, field_is_enum, parentName):
@@ -436,13 +435,87 @@ def exportApiVersion(out_dir, api_version):
     println(out, f'  VERSION_HEX = "0x{api_version & 0xFFFFFFFFFFFFFFFF:0X}"')
 
 
-def exportInit(out_dir, all_data):
+def exportServices(out_dir, services):
+  path = os.path.join(out_dir, "blue_packet_service.py")
+  print("[ExporterPython] Services", path, file=sys.stderr)
+  with open(path, "w") as out:
+    println(out, "# WARNING: Auto-generated class - do not edit - any change will be overwritten and lost")
+    println(out)
+    produceDocstring(out, "", ["Service stubs for this package, see blue_packet_rpc_client and blue_packet_rpc_server."])
+    println(out, "from typing import List")
+    println(out)
+    println(out, "from blue_packet_rpc_client import RpcClient, serviceResponse")
+    for name in sorted({name for service in services.values() for name in service.packets()}):
+      println(out, f"from .{name} import {name}")
+
+    rpcs = [service for service in services.values() if service.kind != HANDLER_LABEL]
+    handlers = [service for service in services.values() if service.kind == HANDLER_LABEL]
+    println(out)
+    println(out, "# error packet hashes of each rpc")
+    for service in rpcs:
+      hashes = ", ".join(f"{error}.packetHash" for error in service.errors)
+      println(out, f"_ERRORS_{service.request} = frozenset([{hashes}])")
+
+    println(out)
+    println(out)
+    println(out, "class BluePacketServiceClient(RpcClient):")
+    produceDocstring(out, DEFAULT_INDENT, [
+      "Typed client stubs of the service declarations.",
+      "Responses are checked by packet hash: error packets raise RpcServiceError.",
+      "Messages of handlers are one-way, sent in batches, see RpcClient._executeOneWay().",
+    ])
+    for service in rpcs:
+      request, response = service.request, service.response
+      println(out, f"{DEFAULT_INDENT}def call{request}(self, request: {request}, timeout=None) -> {response}:")
+      produceDocstring(out, INNER_INDENT, service.docstring)
+      println(out, f"{INNER_INDENT}response = self._execute(request, timeout)")
+      println(out, f"{INNER_INDENT}return serviceResponse(response, {response}.packetHash, _ERRORS_{request})")
+      println(out)
+      println(out, f"{DEFAULT_INDENT}def call{request}Batch(self, requests: List[{request}], timeout=None) -> List[{response}]:")
+      produceDocstring(out, INNER_INDENT, ["Send the requests in a single frame, raises RpcServiceError on the first error."])
+      println(out, f"{INNER_INDENT}responses = self._executeBatch(requests, timeout)")
+      println(out, f"{INNER_INDENT}return [serviceResponse(r, {response}.packetHash, _ERRORS_{request}) for r in responses]")
+      println(out)
+    for service in handlers:
+      println(out, f"{DEFAULT_INDENT}def send{service.request}(self, message: {service.request}) -> None:")
+      produceDocstring(out, INNER_INDENT, service.docstring)
+      println(out, f"{INNER_INDENT}self._executeOneWay(message)")
+      println(out)
+
+    println(out)
+    println(out, "class BluePacketServiceHandlers:")
+    produceDocstring(out, DEFAULT_INDENT, [
+      "Server side of the service declarations.",
+      "Override the methods of the requests the server handles, then bind() them to an RpcServer or an AsyncRpcServer;",
+      "the other requests get no handler.",
+    ])
+    for service in services.values():
+      request = service.request
+      response = "None" if service.kind == HANDLER_LABEL else service.response
+      println(out, f"{DEFAULT_INDENT}def on{request}(self, request: {request}) -> {response}:")
+      produceDocstring(out, INNER_INDENT, service.docstring)
+      if not service.docstring:
+        # produceDocstring() ends with an empty line
+        println(out, f"{INNER_INDENT}pass")
+        println(out)
+    println(out, f"{DEFAULT_INDENT}def bind(self, server):")
+    produceDocstring(out, INNER_INDENT, ["Declare every overridden method as the handler of its request, returns the server"])
+    for service in services.values():
+      method = f"on{service.request}"
+      println(out, f"{INNER_INDENT}if type(self).{method} is not BluePacketServiceHandlers.{method}:")
+      println(out, f"{INNER_INDENT}  server.onReceive({service.request}, self.{method})")
+    println(out, f"{INNER_INDENT}return server")
+
+
+def exportInit(out_dir, all_data, services):
   path = os.path.join(out_dir, "__init__.py")
   print("[ExporterPython] __init__", path, file=sys.stderr)
   with open(path, "w") as out:
     for _, data in all_data.items():
       println(out, f"from .{data.name} import {data.name}")
     println(out, f"from .blue_packet_api import BluePacketAPI")
+    if services:
+      println(out, f"from .blue_packet_service import BluePacketServiceClient, BluePacketServiceHandlers")
 
 
 def get_args():
@@ -461,7 +534,7 @@ if __name__ == "__main__":
     for cl, lf in all_data.items():
       print(cl, lf)
 
-  exportInit(args.output_dir, all_data)
+  exportInit(args.output_dir, all_data, p.services)
   for _, data in all_data.items():
     if data.is_enum:
       exportEnum(args.output_dir, data)
@@ -471,3 +544,5 @@ if __name__ == "__main__":
       version = versionHash(data, all_data)
       exportClass(args.output_dir, data, version, all_data)
   exportApiVersion(args.output_dir, p.api_version)
+  if p.services:
+    exportServices(args.output_dir, p.services)
@@ -10,6 +10,9 @@ PRIMITIVE_TYPES = {
 
 LIST_LABEL = "list"
 CONVERT_LABEL = "convert"
+RPC_LABEL = "rpc"
+HANDLER_LABEL = "handler"
+SERVICE_LABELS = {RPC_LABEL, HANDLER_LABEL}
 
 FORBIDDEN_NAMES = {
   LIST_LABEL, CONVERT_LABEL,
@@ -100,6 +103,29 @@ class PacketData:
       return f"{{{self.origin_name}/C{abstracts_str} F={self.fields} C{list(self.inner.values())} E{list(self.enums.values())}{converts_str} D{self.docstring}}}"
 
 
+class ServiceData:
+  """Service declaration, not a packet: it doesn't change the API version.
+
+  rpc RequestPacket -> ResponsePacket | ErrorPacket1 | ErrorPacket2
+  handler MessagePacket
+  """
+
+  def __init__(self, kind, request, response=None, errors=None, docstring=None):
+    self.kind = kind
+    self.request = request
+    self.response = response
+    self.errors = errors or []
+    self.docstring = docstring or []
+
+  def packets(self):
+    return [self.request] + ([self.response] if self.response else []) + self.errors
+
+  def __repr__(self):
+    if self.kind == HANDLER_LABEL:
+      return f"{{{self.request}/H D{self.docstring}}}"
+    return f"{{{self.request}/R R={self.response} E={self.errors} D{self.docstring}}}"
+
+
 def println(out, line=''):
   out.write(line)
   out.write(os.linesep)
@@ -189,6 +215,34 @@ class Parser:
     self.state = None
     self.top = None
     self.api_version = None
+    self.services = {}
+
+  def read_service(self, line, indent, docstring):
+    if indent > 0:
+      raise SourceException("Unexpected indented line after a service declaration", what=line.strip())
+    self.read_class(line, indent, docstring)
+
+  def read_service_declaration(self, line, docstring):
+    declaration = line.strip()
+    kind, _, rest = declaration.partition(' ')
+    request, arrow, responses = (x.strip() for x in rest.partition('->'))
+    if kind == HANDLER_LABEL:
+      if arrow:
+        raise SourceException(f"A {HANDLER_LABEL} has no response", what=declaration)
+      response, errors = None, []
+    elif not arrow:
+      raise SourceException(f"An {RPC_LABEL} needs a response", what=declaration)
+    else:
+      response, *errors = (x.strip() for x in responses.split('|'))
+    if not all(name.isidentifier() for name in [request, response or request, *errors]):
+      raise SourceException("Invalid service declaration", what=declaration)
+    if request in self.services:
+      raise SourceException("Duplicate service request", what=request)
+    self.services[request] = ServiceData(kind, request, response, errors, docstring)
+    # a service is never followed by fields
+    self.data = None
+    self.top = None
+    self.state = self.read_service
 
   def read_enums(self, line, indent, docstring):
     if indent == 0 or ':' in line:
@@ -248,6 +302,10 @@ class Parser:
     self.data.field_names.add(pf.name)
 
   def read_class(self, line, indent, docstring):
+    if indent == 0 and line.split(None, 1)[0] in SERVICE_LABELS:
+      self.read_service_declaration(line, docstring)
+      return
+
     current = self.data
     self.data = PacketData()
     self.data.docstring = docstring
@@ -361,6 +419,12 @@ class Parser:
       if not data.is_enum and not data.is_abstract:
         data.version = versionHash(data, self.packet_list)
 
+    for service in self.services.values():
+      for name in service.packets():
+        data = self.packet_list.get(name)
+        if data is None or data.is_enum or data.is_abstract:
+          raise SourceException("Service packet has unknown type", what=f"{service.kind} {name}", filename=path)
+
     self.api_version = 0
     for pk_name, pk in self.packet_list.items():
       if pk.name == pk.origin_name:
@@ -65,6 +65,21 @@ class TestLibExport(unittest.TestCase):
         expected = self.intermediateRepresentation[data.name]
         self.assertEqual(expected, repr(data), cl)
 
+  def test_services(self):
+    p = Parser()
+    _ = p.parse(os.path.join(TESTDATA_DIR, "example_rpc.bp"))
+    self.assertEqual(
+      "[{CalcSum/R R=RpcResult E=['RpcError'] D['Calculator service']}, {CalcMean/R R=RpcResult E=['RpcError'] D[]}]",
+      repr(list(p.services.values())),
+    )
+    p = Parser()
+    _ = p.parse([os.path.join(TESTDATA_DIR, f) for f in ("Demo.bp", "DemoService.bp")])
+    self.assertEqual(
+      "[{DemoOuter/R R=DemoOuter E=['DemoPacket'] D['Answers the same packet with oInt incremented']},"
+      " {DemoPacket3/R R=DemoPacket3 E=[] D[]}, {DemoPacket2/H D[]}]",
+      repr(list(p.services.values())),
+    )
+
   def test_negatives(self):
     path = os.path.join(TESTDATA_DIR, "Negative*.bp")
     for filepath in glob.glob(path):